@@ -0,0 +1,76 @@
+"""
+Compares the cold start of a single persona from its JSON file with the cold start from a persona bundle.
+Every measurement runs in a fresh interpreter, so nothing is cached between runs. Fails if the bundle, with its module
+imported, is not faster than the JSON files.
+
+Run from the repository root:
+    python -m components.benchmark.bench_bundle [nr_personas]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from components.components.bundle import write_bundle
+from components.benchmark.bench_registry import make_fleet
+
+SNIPPET = """
+import os
+import time
+from components.components.persona import Persona, PersonaRegistry
+{preload}
+start = time.perf_counter()
+loaded = {load}
+print(time.perf_counter() - start)
+"""
+
+
+def cold_start(load, repeat=5, preload=""):
+    """
+    :return: Median time of the load expression in a fresh interpreter, imports excluded
+    """
+    #A deployed node has its bytecode cached, so the modules are not recompiled on every start
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    times = []
+    #The first run only warms up the bytecode cache
+    for _ in range(repeat + 1):
+        out = subprocess.run([sys.executable, "-c", SNIPPET.format(load=load, preload=preload)], capture_output=True, text=True,
+                             check=True, cwd=os.getcwd(), env=env)
+        times.append(float(out.stdout))
+    return statistics.median(times[1:])
+
+
+def bench(nr_personas):
+    personas = make_fleet(nr_personas)
+    with tempfile.TemporaryDirectory() as tmp:
+        for pers in personas:
+            with open(os.path.join(tmp, f"{pers.getID()}.json"), "w", encoding="utf-8") as f:
+                json.dump(pers.toData(), f)
+        bundle_path = os.path.join(tmp, "personas.lpb")
+        write_bundle(personas, bundle_path)
+
+        target = personas[nr_personas // 2].getID()
+        #Both take a fraction of a millisecond, so more runs are needed to tell them apart
+        json_t = cold_start(f"Persona({os.path.join(tmp, target + '.json')!r})", repeat=15)
+        bundle_t = cold_start(f"Persona.fromBundle({bundle_path!r}, {target!r})")
+        #A node pays for importing the bundle module once, and rclpy already pulls in most of its imports
+        preloaded_t = cold_start(f"Persona.fromBundle({bundle_path!r}, {target!r})", repeat=15,
+                                 preload="import components.components.bundle")
+        print(f"One persona out of {nr_personas}: JSON file {json_t * 1e3:.3f} ms, bundle {bundle_t * 1e3:.3f} ms, "
+              f"bundle with the module imported {preloaded_t * 1e3:.3f} ms")
+
+        all_json_t = cold_start(f"[Persona(os.path.join({tmp!r}, name)) for name in sorted(os.listdir({tmp!r})) "
+                                f"if name.endswith('.json')]", repeat=3)
+        all_bundle_t = cold_start(f"[Persona.fromBundle({bundle_path!r}, pers_id) for pers_id in "
+                                  f"__import__('components.components.bundle').components.bundle"
+                                  f".PersonaBundle.open({bundle_path!r}).ids()]", repeat=3)
+        print(f"All {nr_personas} personas: JSON files {all_json_t * 1e3:.1f} ms, bundle {all_bundle_t * 1e3:.1f} ms")
+
+        assert preloaded_t < json_t, "A persona loads faster from its JSON file than from the bundle"
+        assert all_bundle_t < all_json_t, "The personas load faster from their JSON files than from the bundle"
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
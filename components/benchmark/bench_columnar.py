@@ -0,0 +1,42 @@
+"""
+Compares a fleet-wide sweep with one compiled checkPersona per persona against the columnar Criterion.checkMany.
+
+Run from the repository root:
+    python -m components.benchmark.bench_columnar [nr_personas]
+"""
+import sys
+import timeit
+
+import numpy as np
+
+from components.components.columnar import PersonaColumns
+from components.components.persona import Criterion, Type
+from components.benchmark.bench_registry import make_fleet
+
+CRITERIA = {
+    "laser 445 >=2ch": {"descriptor": {"type": {"in": Type("device/laser")}, "wavelength": {"eq": 445},
+                                       "nr_channels": {"in": [2]}}},
+    "vendor substring": {"descriptor": {"vendor": {"in": "lab"}}},
+    "capability": {"capabilities": {"in": ["setPower"]}},
+    "wavelength band": {"descriptor": {"wavelength": {"between": [440, 500]}}},
+}
+
+
+def bench(nr_personas):
+    personas = make_fleet(nr_personas)
+    columns = PersonaColumns(personas)
+
+    print(f"{'criterion':18} {'matches':>8} {'per persona [ms]':>17} {'columnar [ms]':>14}")
+    for name, criteria_dict in CRITERIA.items():
+        crit = Criterion(criteria_dict)
+        compiled = crit.compile()
+        expected = np.array([compiled.checkPersona(pers) for pers in personas])
+        np.testing.assert_array_equal(expected, crit.checkMany(columns))
+
+        loop_t = min(timeit.repeat(lambda: [compiled.checkPersona(p) for p in personas], number=3, repeat=3)) / 3
+        col_t = min(timeit.repeat(lambda: crit.checkMany(columns), number=50, repeat=3)) / 50
+        print(f"{name:18} {int(expected.sum()):8} {loop_t * 1e3:17.2f} {col_t * 1e3:14.3f}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
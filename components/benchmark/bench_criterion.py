@@ -0,0 +1,48 @@
+"""
+Compares the per-check cost of Criterion.checkPersona with its compiled plan, and with a CriterionCache in front of
+the plan - which only caches the plans whose estimated cost is at least CriterionCache.MIN_COST. "hit" times a cache
+that caches every plan, so it shows which plans a lookup is worth it for.
+
+Run from the repository root:
+    python -m components.benchmark.bench_criterion [persona.json]
+"""
+import sys
+import timeit
+
+from components.components.persona import Persona, Criterion, CriterionCache, Type
+
+DEFAULT_PERSONA = "interfaces/profiles/test/testpersona_persona.json"
+
+CRITERIA = {
+    "type eq": {"descriptor": {"type": {"eq": Type("base/device/test")}}},
+    "type in": {"descriptor": {"type": {"in": Type("device/test")}}},
+    "string in": {"descriptor": {"vendor": {"in": "on"}}},
+    "list in": {"descriptor": {"dummy2_list": {"in": [82, 85, 66]}}},
+    "capabilities in": {"capabilities": {"in": ["testService1"]}},
+    "mixed": {"descriptor": {"type": {"in": Type("base/device")}, "dummy3": {"eq": "CAESAR"}},
+              "capabilities": {"in": ["testService1", "testService2"]}},
+}
+
+
+def bench(pers, number):
+    print(f"{'criterion':18} {'cost':>5} {'raw [us]':>10} {'compiled [us]':>14} {'speedup':>8} {'cached [us]':>12} "
+          f"{'hit [us]':>9}")
+    cache = CriterionCache()
+    every_plan = CriterionCache(min_cost=0)
+    for name, criteria_dict in CRITERIA.items():
+        crit = Criterion(criteria_dict)
+        compiled = crit.compile()
+        assert crit.checkPersona(pers) == compiled.checkPersona(pers) == cache.checkPersona(crit, pers) \
+            == every_plan.checkPersona(crit, pers)
+
+        raw_t = min(timeit.repeat(lambda: crit.checkPersona(pers), number=number, repeat=5)) / number
+        comp_t = min(timeit.repeat(lambda: compiled.checkPersona(pers), number=number, repeat=5)) / number
+        cached_t = min(timeit.repeat(lambda: cache.checkPersona(crit, pers), number=number, repeat=5)) / number
+        hit_t = min(timeit.repeat(lambda: every_plan.checkPersona(crit, pers), number=number, repeat=5)) / number
+        print(f"{name:18} {compiled.cost:5.1f} {raw_t * 1e6:10.3f} {comp_t * 1e6:14.3f} {raw_t / comp_t:7.2f}x "
+              f"{cached_t * 1e6:12.3f} {hit_t * 1e6:9.3f}")
+
+
+if __name__ == "__main__":
+    persona_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PERSONA
+    bench(Persona(persona_path), number=20000)
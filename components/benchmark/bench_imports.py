@@ -0,0 +1,87 @@
+"""
+Import time of the ROS-free modules, each measured in a fresh interpreter with python -X importtime.
+
+Also checks that none of them pulls in rclpy or the generated interfaces. With --budget-ms the exit code is 1 when a
+module is slower than the budget or imports ROS, so CI can gate regressions.
+
+Run from the repository root:
+    python -m components.benchmark.bench_imports [--repeat 5] [--budget-ms 150]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+MODULES = [
+    "components.components",
+    "components.components.persona",
+    "components.components.discovery",
+    "components.components.router",
+    "components.components.loader",
+    "components.components.bundle",
+    "components.components.columnar",
+    "components.components.metrics",
+    "lasers.lasers.telemetry",
+]
+
+#Top level packages that must not be imported by the modules above
+ROS_PACKAGES = ("rclpy", "rosidl_runtime_py", "interfaces.srv", "interfaces.msg")
+
+
+def import_time(module: str) -> tuple:
+    """
+    :return: (cumulative import time of module in ms, names of all modules it imported)
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                            text=True, env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    cumulative_ms = None
+    imported = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        imported.append(name)
+        if name == module:
+            cumulative_ms = int(cumulative) / 1000
+    return cumulative_ms, imported
+
+
+def bench(modules: list, repeat: int) -> list:
+    results = []
+    print(f"{'module':36} {'best [ms]':>10} {'modules':>8} {'ROS':>4}")
+    for module in modules:
+        times = []
+        for _ in range(repeat):
+            cumulative_ms, imported = import_time(module)
+            times.append(cumulative_ms)
+        ros = sorted(name for name in imported if name.startswith(ROS_PACKAGES))
+        results.append({"module": module, "best_ms": min(times), "modules": len(imported), "ros": ros})
+        print(f"{module:36} {min(times):10.2f} {len(imported):8} {'yes' if ros else 'no':>4}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of the ROS-free modules")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module, the best run counts")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if a module takes longer than this")
+    parsed = parser.parse_args()
+
+    failures = []
+    for result in bench(parsed.modules, parsed.repeat):
+        if result["ros"]:
+            failures.append(f"{result['module']} imports {', '.join(result['ros'])}")
+        if parsed.budget_ms is not None and result["best_ms"] > parsed.budget_ms:
+            failures.append(f"{result['module']} takes {result['best_ms']:.1f} ms, the budget is {parsed.budget_ms} ms")
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Overhead of the instrumentation of components.metrics on the criteria checks.
+
+Times a fleet-wide sweep of the raw and compiled checkPersona never instrumented, instrumented, and again after
+disable. The last has to match the first, since disable puts the original functions back.
+
+Run from the repository root:
+    python -m components.benchmark.bench_metrics [nr_personas]
+"""
+import sys
+import timeit
+
+from components.components import metrics
+from components.components.persona import Criterion, Type
+from components.benchmark.bench_registry import make_fleet
+
+CRITERIA = {"laser 445 >=2ch": {"descriptor": {"type": {"in": Type("device/laser")}, "wavelength": {"eq": 445},
+                                               "nr_channels": {"in": [2]}}},
+            "capability": {"capabilities": {"in": ["setPower"]}}}
+
+
+def sweep_time(check, personas):
+    return min(timeit.repeat(lambda: [check(pers) for pers in personas], number=3, repeat=5)) / 3
+
+
+def bench(nr_personas):
+    personas = make_fleet(nr_personas)
+
+    print(f"{'criterion':16} {'check':9} {'off [ms]':>9} {'on [ms]':>9} {'disabled [ms]':>14} {'on/off':>7}")
+    for name, criteria_dict in CRITERIA.items():
+        for kind in ("raw", "compiled"):
+            crit = Criterion(criteria_dict)
+            if kind == "compiled":
+                crit = crit.compile()
+
+            #Warms the caches of the criterion, e.g. the interned types, before the first timed sweep
+            [crit.checkPersona(pers) for pers in personas]
+            #Looked up on every sweep, so the swapped in wrappers are picked up
+            times = [sweep_time(lambda pers: crit.checkPersona(pers), personas)]
+            metrics.enable()
+            times.append(sweep_time(lambda pers: crit.checkPersona(pers), personas))
+            metrics.disable()
+            times.append(sweep_time(lambda pers: crit.checkPersona(pers), personas))
+
+            off_t, on_t, disabled_t = times
+            print(f"{name:16} {kind:9} {off_t * 1e3:9.2f} {on_t * 1e3:9.2f} {disabled_t * 1e3:14.2f} "
+                  f"{on_t / off_t:7.2f}")
+
+    metrics.reset()
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
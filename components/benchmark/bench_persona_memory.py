@@ -0,0 +1,40 @@
+"""
+Measures the memory per persona and the allocations made while matching.
+
+Run from the repository root:
+    python -m components.benchmark.bench_persona_memory [nr_personas]
+"""
+import sys
+import tracemalloc
+
+from components.components.persona import Persona, Criterion, Type
+from components.benchmark.bench_registry import make_fleet
+
+
+def bench(nr_personas):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    personas = make_fleet(nr_personas)
+    after = tracemalloc.get_traced_memory()[0]
+    print(f"{nr_personas} personas: {(after - before) / nr_personas:.0f} bytes per persona")
+
+    compiled = Criterion({"descriptor": {"type": {"in": Type("device/laser")}, "wavelength": {"eq": 445}},
+                          "capabilities": {"in": ["setPower"]}}).compile()
+    for pers in personas:
+        compiled.checkPersona(pers)
+
+    #Everything the accessors return is kept alive, so copies show up as traced memory
+    views = [None] * nr_personas
+    base = tracemalloc.get_traced_memory()[0]
+    for i, pers in enumerate(personas):
+        views[i] = (pers.getDescriptor(), pers.getCapabilitiesNames(), compiled.checkPersona(pers))
+    kept = tracemalloc.get_traced_memory()[0]
+    #The tuple holding the three views is the only allocation of the loop itself
+    loop_overhead = sys.getsizeof((None, None, None))
+    print(f"Allocated by getDescriptor/getCapabilitiesNames/checkPersona: "
+          f"{max(0, round((kept - base) / nr_personas - loop_overhead))} bytes per persona")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,53 @@
+"""
+Compares criteria checked in the order they are written with the same criteria ordered by the planner,
+see CompiledCriterion.reorder. Reports the early-exit counters and the time of a sweep over a synthetic fleet.
+
+Run from the repository root:
+    python -m components.benchmark.bench_planner [nr_personas]
+"""
+import random
+import sys
+import timeit
+
+from components.components.persona import Persona, PersonaRegistry, Criterion, Type
+from interfaces.profiles.test.personagenerator import make_persona
+
+CRITERIA = {
+    "type before id": {"descriptor": {"type": {"in": Type("device/laser")}, "id": {"eq": "diode42"}}},
+    "vendor before wavelength": {"descriptor": {"vendor": {"in": "o"}, "wavelength": {"eq": 785}}},
+    "laser with telemetry": {"descriptor": {"type": {"in": Type("base/device/laser")}, "TEM_modes": {"in": ["01"]}},
+                             "capabilities": {"in": ["telemetry"]}},
+    "camera trigger": {"descriptor": {"type": {"in": Type("camera")}}, "capabilities": {"in": ["trigger"]}},
+}
+
+
+def sweep(compiled, personas):
+    compiled.trackExits()
+    matches = [pers.getID() for pers in personas if compiled.checkPersona(pers)]
+    stats = compiled.exitStats()
+    #The timed sweeps run untracked
+    compiled.trackExits(False)
+    return matches, stats
+
+
+def bench(nr_personas):
+    rng = random.Random(0)
+    personas = [Persona.fromData(make_persona(rng, i)) for i in range(nr_personas)]
+    registry = PersonaRegistry(personas)
+
+    print(f"{'criterion':26} {'plan':8} {'early exit':>10} {'mean steps':>10} {'sweep [ms]':>11}")
+    for name, criteria_dict in CRITERIA.items():
+        crit = Criterion(criteria_dict)
+        written = crit.compile()
+        planned = registry.plan(crit)
+
+        for label, compiled in (("written", written), ("planned", planned)):
+            matches, stats = sweep(compiled, personas)
+            assert matches == sweep(written, personas)[0]
+            t = min(timeit.repeat(lambda: [compiled.checkPersona(pers) for pers in personas], number=3, repeat=3)) / 3
+            print(f"{name:26} {label:8} {stats['early_exit_rate']:10.1%} {stats['mean_steps']:10.2f} {t * 1e3:11.2f}")
+        print(f"{'':26} order    {[rule for rule, _, _ in planned.estimates]}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
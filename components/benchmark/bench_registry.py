@@ -0,0 +1,65 @@
+"""
+Compares PersonaRegistry.queryIDs with a linear scan of Criterion.checkPersona over a synthetic fleet.
+
+Run from the repository root:
+    python -m components.benchmark.bench_registry [nr_personas]
+"""
+import sys
+import time
+import timeit
+
+from components.components.persona import Persona, PersonaRegistry, Criterion, Type
+
+TYPES = ["base/device/laser", "base/device/camera", "base/device/stage", "base/static_component/table"]
+
+
+def make_fleet(nr_personas):
+    personas = []
+    for i in range(nr_personas):
+        personas.append(Persona.fromData({
+            "descriptor": {
+                "id": f"dev{i}",
+                "vendor": ["Toptica", "Thorlabs", "Coherent", "Hamamatsu"][i % 4],
+                "product": f"Product {i % 17}",
+                "description": "Synthetic persona",
+                "type": TYPES[i % len(TYPES)],
+                "wavelength": [405, 445, 488, 532, 561, 640][i // 4 % 6],
+                "nr_channels": 1 + i // 24 % 4,
+            },
+            "capabilities": {"setPower": {"type": "service"}} if i % 4 == 0 else {},
+        }))
+    return personas
+
+
+CRITERIA = {
+    "id eq": {"descriptor": {"id": {"eq": "dev42"}}},
+    "type in": {"descriptor": {"type": {"in": Type("device/laser")}}},
+    "laser 445 2ch": {"descriptor": {"type": {"in": Type("base/device/laser")}, "wavelength": {"eq": 445},
+                                     "nr_channels": {"eq": 2}}},
+    "capability": {"descriptor": {"vendor": {"eq": "Toptica"}}, "capabilities": {"in": ["setPower"]}},
+    "wavelength band": {"descriptor": {"wavelength": {"between": [440, 500]}}},
+    ">= 3 channels": {"descriptor": {"type": {"in": Type("laser")}, "nr_channels": {"ge": 3}}},
+}
+
+
+def bench(nr_personas):
+    personas = make_fleet(nr_personas)
+
+    start = time.perf_counter()
+    registry = PersonaRegistry(personas)
+    print(f"Registered {nr_personas} personas in {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    print(f"{'criterion':16} {'matches':>8} {'scan [us]':>12} {'registry [us]':>14}")
+    for name, criteria_dict in CRITERIA.items():
+        crit = Criterion(criteria_dict)
+        compiled = crit.compile()
+        expected = {pers.getID() for pers in personas if compiled.checkPersona(pers)}
+        assert expected == registry.queryIDs(crit)
+
+        scan_t = min(timeit.repeat(lambda: [p for p in personas if compiled.checkPersona(p)], number=5, repeat=3)) / 5
+        reg_t = min(timeit.repeat(lambda: registry.queryIDs(crit), number=200, repeat=3)) / 200
+        print(f"{name:16} {len(expected):8} {scan_t * 1e6:12.1f} {reg_t * 1e6:14.1f}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
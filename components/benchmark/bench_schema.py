@@ -0,0 +1,54 @@
+"""
+Measures what strict schema validation adds to loading a persona corpus.
+
+Compares load_personas with and without a SchemaValidator, cold and from the cache, and times validate_directory on
+its own, cold and cached. The schema itself is timed once evaluated from the jsonnet profiles and once from its cache.
+
+Run from the repository root:
+    python -m components.benchmark.bench_schema [nr_personas]
+"""
+import sys
+import tempfile
+import time
+import timeit
+
+from components.components.loader import load_personas
+from components.components.schema import SchemaValidator, build_schema, validate_directory
+from interfaces.profiles.test.personagenerator import write_corpus
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def bench(nr_personas):
+    evaluate_t, schema = timed(lambda: build_schema(use_cache=False))
+    build_schema()
+    cached_t, _ = timed(build_schema)
+    validator = SchemaValidator(schema)
+    print(f"Schema: evaluated from the profiles {evaluate_t * 1e3:.1f} ms, from its cache {cached_t * 1e3:.2f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_corpus(tmp, nr_personas)
+        for name, kwargs in [("without schema", {}), ("with schema", {"schema": validator})]:
+            cold_t, (personas, stats) = timed(lambda: load_personas(tmp, recursive=True, use_cache=False, **kwargs))
+            assert not stats.errors, stats
+            load_personas(tmp, recursive=True, **kwargs)
+            cached_load_t, _ = timed(lambda: load_personas(tmp, recursive=True, **kwargs))
+            print(f"load_personas {name}: cold {cold_t * 1e3:.1f} ms, cached {cached_load_t * 1e3:.1f} ms")
+
+        cold_t, results = timed(lambda: validate_directory(tmp, validator, recursive=True, use_cache=False))
+        assert not any(results.values())
+        validate_directory(tmp, validator, recursive=True)
+        cached_t, _ = timed(lambda: validate_directory(tmp, validator, recursive=True))
+        print(f"validate_directory of {nr_personas} personas: cold {cold_t * 1e3:.1f} ms, cached {cached_t * 1e3:.1f} ms")
+
+        data = [pers.toData() for pers in personas]
+        per_persona_t = min(timeit.repeat(lambda: [validator.errors(d) for d in data], number=1, repeat=5)) / len(data)
+        print(f"SchemaValidator.errors: {per_persona_t * 1e6:.2f} us per persona")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,157 @@
+"""
+Benchmark suite over a synthetic persona corpus, written by interfaces/profiles/test/personagenerator.py.
+
+Times loading the corpus, Type validation, checkDescriptor/checkCapabilities and whole-fleet queries, and writes the
+results together with the git commit to a JSON file, so runs can be compared across commits.
+
+Run from the repository root:
+    python -m components.benchmark.bench_suite [--sizes 1000 10000 100000] [--out results.json] [--compare old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from components.components.loader import load_personas
+from components.components.persona import Criterion, PersonaRegistry, Type
+from interfaces.profiles.test.personagenerator import write_corpus
+
+CRITERIA = {
+    "id eq": {"descriptor": {"id": {"eq": "mirror42"}}},
+    "type in": {"descriptor": {"type": {"in": Type("device/laser")}}},
+    "laser 488 1ch": {"descriptor": {"type": {"in": Type("device/laser")}, "wavelength": {"eq": 488},
+                                     "nr_channels": {"eq": 1}}},
+    "vendor substring": {"descriptor": {"vendor": {"in": "lab"}}},
+    "capabilities in": {"capabilities": {"in": ["setPower", "telemetry"]}},
+    "camera trigger": {"descriptor": {"type": {"in": Type("camera")}}, "capabilities": {"in": ["trigger"]}},
+}
+
+
+def git_commit():
+    """
+    :return: (commit hash or None, whether the work tree has uncommitted changes)
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                    text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, dirty
+
+
+def corpus(corpus_dir, nr_personas, seed):
+    """
+    :return: Directory of the corpus, written on the first run only
+    """
+    path = os.path.join(corpus_dir, f"corpus_{nr_personas}_{seed}")
+    marker = os.path.join(path, ".complete")
+    if not os.path.exists(marker):
+        write_corpus(path, nr_personas, seed)
+        open(marker, "w").close()
+    return path
+
+
+def best(stmt, number, repeat=3):
+    """
+    :return: Best time of one call of stmt in seconds
+    """
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+
+
+def bench_size(path, nr_personas):
+    results = {}
+
+    #Loading - once cold without the cache, then again from the cache the first load left behind
+    personas, stats = load_personas(path, recursive=True, use_cache=False)
+    results["load cold"] = stats.total_s
+    load_personas(path, recursive=True)
+    personas, stats = load_personas(path, recursive=True)
+    results["load cached"] = stats.total_s
+    assert len(personas) == nr_personas, stats
+
+    types = [pers.getDescriptor()["type"] for pers in personas]
+    type_strs = [pers_type.type_str for pers_type in types]
+    results["type intern"] = best(lambda: [Type(type_str) for type_str in type_strs], 3)
+    results["type validate"] = best(lambda: [pers_type._validateType() for pers_type in types], 3)
+
+    registry_start = time.perf_counter()
+    registry = PersonaRegistry(personas)
+    results["registry build"] = time.perf_counter() - registry_start
+
+    for name, criteria_dict in CRITERIA.items():
+        crit = Criterion(criteria_dict)
+        compiled = crit.compile()
+        descriptor_criteria = criteria_dict.get("descriptor", {})
+        capabilities_criteria = criteria_dict.get("capabilities", {})
+
+        expected = {pers.getID() for pers in personas if compiled.checkPersona(pers)}
+        assert expected == registry.queryIDs(crit), name
+
+        if descriptor_criteria:
+            results[f"{name} / checkDescriptor"] = best(
+                lambda: [crit.checkDescriptor(descriptor_criteria, pers) for pers in personas], 1)
+        if capabilities_criteria:
+            results[f"{name} / checkCapabilities"] = best(
+                lambda: [crit.checkCapabilities(capabilities_criteria, pers) for pers in personas], 1)
+        results[f"{name} / compiled scan"] = best(lambda: [compiled.checkPersona(pers) for pers in personas], 1)
+        results[f"{name} / registry query"] = best(lambda: registry.queryIDs(crit), 20)
+        results[f"{name} / columnar"] = best(lambda: registry.evaluate(crit), 5)
+
+    return results
+
+
+def compare(results, old_path):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    print(f"\nCompared with {old.get('commit')} ({old_path}), ratio new / old:")
+    for size, timings in results.items():
+        old_timings = old["results"].get(size, {})
+        for name, seconds in timings.items():
+            if name in old_timings and old_timings[name] > 0:
+                print(f"{size:>7} {name:40} {seconds / old_timings[name]:7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark personas and criteria over a synthetic corpus")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "lidaros_corpus"),
+                        help="Where the corpora are written and reused")
+    parser.add_argument("--out", default=None, help="Result file, bench_suite_<commit>.json by default")
+    parser.add_argument("--compare", default=None, help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    results = {}
+    for nr_personas in args.sizes:
+        path = corpus(args.corpus_dir, nr_personas, args.seed)
+        results[str(nr_personas)] = bench_size(path, nr_personas)
+        for name, seconds in results[str(nr_personas)].items():
+            print(f"{nr_personas:>7} {name:40} {seconds * 1e3:12.3f} ms")
+
+    out_path = args.out or f"bench_suite_{(commit or 'unknown')[:10]}{'-dirty' if dirty else ''}.json"
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "unit": "s",
+            "results": results,
+        }, f, indent=1)
+    print(f"Wrote {out_path}")
+
+    if args.compare is not None:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
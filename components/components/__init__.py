@@ -0,0 +1,63 @@
+"""
+Personas, criteria and the ROS components built on them.
+
+Nothing is imported with the package. Every name below is imported from its module on first access (PEP 562), so
+tools that only use Persona and Criterion never import rclpy. The ROS pieces - ComponentProfile, CapabilityRouter's
+endpoints, the container and the discovery node - need a sourced workspace once they are used.
+"""
+import importlib
+
+#name -> module it lives in
+_LAZY = {
+    #ROS-free
+    "Persona": "persona",
+    "PersonaRegistry": "persona",
+    "PersonaStatistics": "persona",
+    "PersonaDiff": "persona",
+    "Criterion": "persona",
+    "CompiledCriterion": "persona",
+    "CriterionCache": "persona",
+    "CriteriaOperator": "persona",
+    "Type": "persona",
+    "TypeTrie": "persona",
+    "PersonaColumns": "columnar",
+    "load_personas": "loader",
+    "SchemaValidator": "schema",
+    "build_schema": "schema",
+    "validate_directory": "schema",
+    "write_bundle": "bundle",
+    "DiscoveryIndex": "discovery",
+    "encode_criteria": "discovery",
+    "decode_criteria": "discovery",
+    "PersonaWatcher": "watcher",
+    "apply_changes": "watcher",
+    "AsyncDeviceIO": "async_io",
+    "MetricsRegistry": "metrics",
+    "CapabilityRouter": "router",
+    "ClientPool": "router",
+    "routing_table": "router",
+    #rclpy
+    "ComponentProfile": "component",
+    "DeviceProfile": "component",
+    "AsyncDeviceProfile": "component",
+    "spin_multithreaded": "component",
+    "ComponentContainer": "container",
+    "DiscoveryNode": "discovery_node",
+    "DiscoveryClient": "discovery_node",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    module_name = _LAZY.get(name, None)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    #Later lookups find the name directly and skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -0,0 +1,164 @@
+"""
+Non-blocking device I/O for device nodes.
+
+A device node spins in a MultiThreadedExecutor, and every slow serial/USB operation is written as a coroutine that
+runs on one asyncio loop owned by the node. An executor thread handling a callback waits for its own operation only,
+while the loop keeps the other operations in flight - a slow read no longer stalls the timers and services of the node.
+
+Nothing here depends on ROS, so drivers can be tested without it.
+"""
+import asyncio
+import concurrent.futures
+import random
+import threading
+
+
+class AsyncDeviceIO:
+
+    """
+    An asyncio event loop running on its own daemon thread.
+    """
+
+    def __init__(self, name: str = "device-io"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+
+    @property
+    def closed(self) -> bool:
+        return not self._thread.is_alive()
+
+    def submit(self, coro):
+        """
+        Schedules coro on the loop without waiting for it.
+
+        :return: A concurrent.futures.Future of the result
+        """
+        if self.closed:
+            coro.close()
+            raise RuntimeError("The device I/O loop is closed")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float = None):
+        """
+        Runs coro on the loop and blocks the calling thread until it is done - call it from executor threads, never
+        from a coroutine on the loop itself.
+
+        :param timeout: Seconds to wait before cancelling the operation, wait forever if None
+        :return: The result of coro
+        """
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("AsyncDeviceIO.run would deadlock when called from the device I/O loop")
+
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        #Only an alias of the builtin TimeoutError from Python 3.11 on
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def close(self, timeout: float = 1.0):
+        """
+        Cancels the pending operations and stops the loop.
+        """
+        if self.closed:
+            return
+
+        async def cancelPending():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancelPending(), self.loop).result(timeout)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeDevice:
+
+    """
+    Stand-in for a serial/USB device - every operation takes latency_s plus up to jitter_s seconds.
+
+    :param serialize: If True only one operation is in flight at a time, like on a single serial line
+    """
+
+    def __init__(self, latency_s: float = 0.01, jitter_s: float = 0.0, serialize: bool = False, seed=None):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.serialize = serialize
+        self._random = random.Random(seed)
+        self._registers = {}
+        self._connected = False
+        self._is_on = False
+
+        #Created on first use, so it belongs to the loop the device is used from
+        self._line = None
+        self.operations = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _io(self):
+        if self.serialize:
+            if self._line is None:
+                self._line = asyncio.Lock()
+            async with self._line:
+                await self._wait()
+        else:
+            await self._wait()
+
+    async def _wait(self):
+        self.operations += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency_s + self._random.uniform(0, self.jitter_s))
+        finally:
+            self.in_flight -= 1
+
+    async def connect(self) -> bool:
+        await self._io()
+        self._connected = True
+        return True
+
+    async def isConnected(self) -> bool:
+        await self._io()
+        return self._connected
+
+    async def turnOn(self) -> bool:
+        await self._io()
+        if not self._connected:
+            return False
+        self._is_on = True
+        return True
+
+    async def read(self, register):
+        """
+        :return: The last value written to register, None if it was never written
+        """
+        await self._io()
+        if not self._connected:
+            raise ConnectionError("FakeDevice is not connected")
+        return self._registers.get(register, None)
+
+    async def write(self, register, value) -> bool:
+        await self._io()
+        if not self._connected:
+            raise ConnectionError("FakeDevice is not connected")
+        self._registers[register] = value
+        return True
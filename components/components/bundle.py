@@ -0,0 +1,250 @@
+"""
+Persona bundle - many compiled personas in one file, read through mmap.
+
+Layout (little endian):
+    header  : magic, format version, flags, number of personas, id width and offset of the index
+    records : one marshal record of the plain persona dict per persona, already validated when the bundle was written
+    index   : per persona, sorted by id, the UTF-8 id padded with NUL bytes to the id width, followed by the offset,
+              size and CRC-32 of its record
+
+Opening a bundle only reads the header. A persona is found by a binary search over the fixed width index entries inside
+the map, and its record is decoded the first time it is requested - marshal decodes the plain data in C, with no JSON
+to parse again. Records are written with the marshal format of the Python that builds the bundle, so build it with the
+Python of the nodes.
+
+Build a bundle from the repository root with:
+    python -m components.components.bundle <bundle> <persona directory>...
+"""
+import binascii
+import marshal
+import mmap
+import os
+import struct
+import threading
+
+from .persona import Persona
+
+MAGIC = b"LPBN"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sHHIIQ")
+#Follows the padded id of every index entry
+INDEX_ENTRY = struct.Struct("<QII")
+ID_PADDING = b"\0"
+
+
+def write_bundle(personas, bundle_path):
+    """
+    :param personas: Iterable of personas
+    :param bundle_path: File to write, it is replaced atomically
+    :return: Number of personas written
+    """
+    records = []
+    ids = []
+
+    for pers in personas:
+        pers_id = pers.getID()
+        if not isinstance(pers_id, str) or "\0" in pers_id:
+            raise ValueError(f"Persona id {pers_id!r} can't be stored in a bundle")
+        records.append(marshal.dumps(pers.toData()))
+        ids.append(pers_id.encode("utf-8"))
+
+    if len(set(ids)) != len(ids):
+        raise ValueError("A persona id appears twice in the bundle")
+
+    id_width = max(map(len, ids), default=0)
+    entries = []
+    offset = HEADER.size
+    for encoded_id, record in zip(ids, records):
+        entries.append((encoded_id.ljust(id_width, ID_PADDING), offset, record))
+        offset += len(record)
+    #Padding with NUL keeps the order of the ids, so the index can be searched as bytes
+    entries.sort(key=lambda entry: entry[0])
+
+    tmp_path = f"{bundle_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(records), id_width, offset))
+        f.writelines(records)
+        f.writelines(padded_id + INDEX_ENTRY.pack(record_offset, len(record), binascii.crc32(record))
+                     for padded_id, record_offset, record in entries)
+    os.replace(tmp_path, bundle_path)
+
+    return len(records)
+
+
+def _identity(stat):
+    #write_bundle replaces the file, which gives it a new inode, an in-place rewrite changes its mtime or size
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class PersonaBundle:
+
+    """
+    Read access to a bundle written by write_bundle - personas are decoded lazily and only once.
+
+    The map is closed by close, or else once the bundle is garbage collected - decoded personas don't keep their bundle
+    alive.
+    """
+
+    _open_bundles = {}
+    _open_lock = threading.Lock()
+
+    def __init__(self, bundle_path):
+        self.path = bundle_path
+        #The map keeps its own handle of the file, and a raw descriptor skips building a buffered file object
+        fd = os.open(bundle_path, os.O_RDONLY)
+        try:
+            self._identity = _identity(os.fstat(fd))
+            self._map = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            #An empty file can't be mapped
+            raise ValueError(f"{bundle_path} is not a persona bundle") from None
+        finally:
+            os.close(fd)
+
+        try:
+            self._readHeader()
+        except ValueError:
+            self.close()
+            raise
+
+        #persona id -> decoded persona
+        self._personas = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, bundle_path):
+        """
+        :return: The shared PersonaBundle of bundle_path, so a process maps every bundle once - reopened when the file
+            was replaced or rewritten since. The replaced bundle stays readable for whoever holds it, and is closed
+            once nobody does
+        """
+        key = os.path.abspath(bundle_path)
+        with cls._open_lock:
+            bundle = cls._open_bundles.get(key, None)
+            if bundle is None or bundle.closed or bundle._identity != _identity(os.stat(key)):
+                bundle = cls._open_bundles[key] = cls(bundle_path)
+        return bundle
+
+    def _readHeader(self):
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{self.path} is not a persona bundle")
+
+        magic, version, _, count, id_width, index_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a persona bundle")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{self.path} has bundle format version {version}, but only {FORMAT_VERSION} is supported")
+
+        self._count = count
+        self._id_width = id_width
+        self._index_offset = index_offset
+        self._entry_size = id_width + INDEX_ENTRY.size
+        if index_offset + count * self._entry_size > len(self._map):
+            raise ValueError(f"{self.path} is truncated")
+
+    def _find(self, pers_id):
+        """
+        :return: Position of the offset, size and CRC-32 of the persona's record, None if the bundle has no such persona
+        """
+        if not isinstance(pers_id, str) or "\0" in pers_id:
+            return None
+        encoded_id = pers_id.encode("utf-8")
+        id_width = self._id_width
+        if len(encoded_id) > id_width:
+            return None
+        padded_id = encoded_id.ljust(id_width, ID_PADDING)
+
+        bundle_map = self._map
+        index_offset = self._index_offset
+        entry_size = self._entry_size
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            position = index_offset + middle * entry_size
+            entry_id = bundle_map[position:position + id_width]
+            if entry_id < padded_id:
+                low = middle + 1
+            elif entry_id > padded_id:
+                high = middle
+            else:
+                return position + id_width
+        return None
+
+    @property
+    def closed(self):
+        return self._map.closed
+
+    def close(self):
+        self._map.close()
+
+    def __del__(self):
+        #Also closes a bundle replaced in open, once the last one holding it drops it
+        bundle_map = getattr(self, "_map", None)
+        if bundle_map is not None:
+            bundle_map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, pers_id):
+        return pers_id in self._personas or self._find(pers_id) is not None
+
+    def ids(self):
+        """
+        :return: Ids of all personas of the bundle, sorted
+        """
+        id_width = self._id_width
+        positions = range(self._index_offset, self._index_offset + self._count * self._entry_size, self._entry_size)
+        return [self._map[position:position + id_width].rstrip(ID_PADDING).decode("utf-8") for position in positions]
+
+    def decodedCount(self):
+        """
+        :return: Number of personas decoded so far
+        """
+        return len(self._personas)
+
+    def get(self, pers_id):
+        """
+        :return: The persona with the id, decoded on the first request
+        """
+        pers = self._personas.get(pers_id, None)
+        if pers is not None:
+            return pers
+
+        position = self._find(pers_id)
+        if position is None:
+            raise KeyError(pers_id)
+        offset, size, crc = INDEX_ENTRY.unpack_from(self._map, position)
+        record = self._map[offset:offset + size]
+        if binascii.crc32(record) != crc:
+            raise ValueError(f"The record of {pers_id} in {self.path} is corrupt")
+
+        #Records were validated when the bundle was written
+        pers = Persona.fromData(marshal.loads(record), validate=False)
+        with self._lock:
+            return self._personas.setdefault(pers_id, pers)
+
+    def __getitem__(self, pers_id):
+        return self.get(pers_id)
+
+
+if __name__ == "__main__":
+    import sys
+    from .loader import load_personas
+
+    if len(sys.argv) < 3:
+        print("Usage: python -m components.components.bundle <bundle> <persona directory>...")
+        sys.exit(1)
+
+    bundled = []
+    for directory in sys.argv[2:]:
+        dir_personas, load_stats = load_personas(directory, recursive=True, use_cache=False)
+        print(load_stats)
+        bundled.extend(dir_personas)
+    print(f"Wrote {write_bundle(bundled, sys.argv[1])} personas to {sys.argv[1]}")
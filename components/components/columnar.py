@@ -0,0 +1,203 @@
+import numpy as np
+
+from .persona import Criterion, CriteriaOperator, PersonaRegistry, RANGE_OPERATORS, _isNumber, _rangeBounds
+
+#Integers above this can't be compared exactly as float64
+_MAX_EXACT_FLOAT_INT = 2 ** 53
+
+
+class PersonaColumns:
+
+    """
+    Columnar view of the descriptors and capabilities of a population of personas.
+
+    Every descriptor key becomes a dictionary encoded column: an array of codes into the distinct values of that key.
+    A rule is evaluated once per distinct value, and then spread over the whole population with a single NumPy gather.
+    Columns are built lazily, so only the keys used by a criterion are ever encoded.
+    """
+
+    def __init__(self, personas):
+        self.personas = list(personas)
+        self.ids = np.array([pers.getID() for pers in self.personas], dtype=object)
+
+        #descriptor key -> (codes, distinct values, index key -> code)
+        self._columns = {}
+        #capability name -> boolean column
+        self._capability_columns = {}
+        #Same as _columns, but for the ordered list of capability names
+        self._capability_names_column = None
+        #descriptor key -> float64 array of the uniques of its column, NaN where not a number
+        self._numeric_uniques = {}
+        #descriptor key -> boolean column, True where the value is a bool
+        self._bool_columns = {}
+        #persona id -> position, built on the first replace()
+        self._positions = None
+
+    def __len__(self):
+        return len(self.personas)
+
+    def replace(self, pers, diff):
+        """
+        Swaps in the edited version of a persona in place - only the cached columns of what changed are dropped.
+
+        :param diff: PersonaDiff from the current version of the persona to pers
+        """
+        if self._positions is None:
+            self._positions = {pers_id: position for position, pers_id in enumerate(self.ids)}
+        self.personas[self._positions[pers.getID()]] = pers
+
+        for key in diff.descriptor:
+            self._columns.pop(key, None)
+            self._numeric_uniques.pop(key, None)
+            self._bool_columns.pop(key, None)
+        for name in diff.capabilities:
+            self._capability_columns.pop(name, None)
+        if diff.names_changed:
+            self._capability_names_column = None
+
+    def column(self, key):
+        """
+        :return: (codes, uniques, lookup) - codes[i] indexes uniques for persona i and is -1 if the key is missing.
+        lookup maps the index key of each hashable unique to its code.
+        """
+        column = self._columns.get(key, None)
+        if column is None:
+            column = self._encode(pers.descriptor.get(key, None) for pers in self.personas)
+            self._columns[key] = column
+        return column
+
+    def _encode(self, values):
+        codes = np.full(len(self.personas), -1, dtype=np.int64)
+        uniques = []
+        lookup = {}
+
+        for i, value in enumerate(values):
+            #Criteria treat None as a missing key
+            if value is None:
+                continue
+
+            index_key = PersonaRegistry._indexKey(value)
+            code = lookup.get(index_key, None) if index_key is not None else None
+            if code is None:
+                code = len(uniques)
+                uniques.append(value)
+                if index_key is not None:
+                    lookup[index_key] = code
+            codes[i] = code
+
+        return codes, uniques, lookup
+
+    def numericUniques(self, key):
+        """
+        :return: The uniques of the column of key as float64, NaN where they are not numbers.
+            None if some integer is too large to be compared exactly as a float
+        """
+        if key not in self._numeric_uniques:
+            uniques = self.column(key)[1]
+            numbers = None
+            if not any(isinstance(value, int) and abs(value) > _MAX_EXACT_FLOAT_INT for value in uniques):
+                #True shares its code with 1, boolColumn removes the bools themselves
+                numbers = np.fromiter((value if _isNumber(value) or isinstance(value, bool) else np.nan
+                                       for value in uniques), dtype=np.float64, count=len(uniques))
+            self._numeric_uniques[key] = numbers
+        return self._numeric_uniques[key]
+
+    def boolColumn(self, key):
+        """
+        :return: Boolean column, True for the personas whose value of key is a bool
+        """
+        column = self._bool_columns.get(key, None)
+        if column is None:
+            column = np.fromiter((isinstance(pers.descriptor.get(key, None), bool) for pers in self.personas),
+                                 dtype=bool, count=len(self.personas))
+            self._bool_columns[key] = column
+        return column
+
+    def capabilityColumn(self, name):
+        """
+        :return: Boolean column, True for the personas that have the capability
+        """
+        column = self._capability_columns.get(name, None)
+        if column is None:
+            column = np.fromiter((name in pers.capabilities for pers in self.personas),
+                                 dtype=bool, count=len(self.personas))
+            self._capability_columns[name] = column
+        return column
+
+    def capabilityNamesColumn(self):
+        if self._capability_names_column is None:
+            #Encoded as lists, the same way checkCapabilities compares them
+            self._capability_names_column = self._encode(pers.getCapabilitiesNames() for pers in self.personas)
+        return self._capability_names_column
+
+    @staticmethod
+    def _gather(results, codes):
+        #The extra False at the end is picked up by the code -1 of missing values
+        return np.append(results, False)[codes]
+
+    def _codesMask(self, column, variable_crd, operator, predicate):
+        codes, uniques, lookup = column
+
+        #Equality on a fully hashable column is a single lookup, the rest is vectorized
+        if operator == CriteriaOperator.EQ and len(lookup) == len(uniques):
+            index_key = PersonaRegistry._indexKey(variable_crd)
+            if index_key is not None:
+                code = lookup.get(index_key, None)
+                if code is None:
+                    return np.zeros(len(self.personas), dtype=bool)
+                return codes == code
+
+        results = np.fromiter((predicate(value) for value in uniques), dtype=bool, count=len(uniques))
+        return self._gather(results, codes)
+
+    def _rangeMask(self, key_crd, operator, variable_crd, predicate):
+        numbers = self.numericUniques(key_crd)
+        if numbers is None:
+            return self._codesMask(self.column(key_crd), variable_crd, operator, predicate)
+
+        #Comparisons with NaN are False, so values that are not numbers never match
+        low, low_inclusive, high, high_inclusive = _rangeBounds(operator, variable_crd)
+        results = np.ones(len(numbers), dtype=bool)
+        if low is not None:
+            results &= numbers >= low if low_inclusive else numbers > low
+        if high is not None:
+            results &= numbers <= high if high_inclusive else numbers < high
+        return self._gather(results, self.column(key_crd)[0]) & ~self.boolColumn(key_crd)
+
+    def descriptorMask(self, key_crd, operator, variable_crd, predicate):
+        if operator in RANGE_OPERATORS:
+            return self._rangeMask(key_crd, operator, variable_crd, predicate)
+        return self._codesMask(self.column(key_crd), variable_crd, operator, predicate)
+
+    def capabilitiesMask(self, operator, crit_cap_names, predicate):
+        if operator == CriteriaOperator.IN:
+            mask = np.ones(len(self.personas), dtype=bool)
+            for name in crit_cap_names:
+                mask &= self.capabilityColumn(name)
+            return mask
+
+        return self._codesMask(self.capabilityNamesColumn(), crit_cap_names, operator, predicate)
+
+    def evaluate(self, criterion):
+        """
+        :param criterion: Criterion or CompiledCriterion
+        :return: Boolean mask over the personas - True where checkPersona returns True
+        """
+        compiled = criterion.compile() if isinstance(criterion, Criterion) else criterion
+        mask = np.ones(len(self.personas), dtype=bool)
+
+        for rule in compiled.descriptor_rules:
+            mask &= self.descriptorMask(*rule)
+            if not mask.any():
+                return mask
+
+        for operator, crit_cap_names, predicate in compiled.capabilities_rules:
+            mask &= self.capabilitiesMask(operator, crit_cap_names, predicate)
+
+        return mask
+
+    def evaluateIDs(self, criterion):
+        """
+        :return: NumPy array of the ids of the personas matching the criterion
+        """
+        return self.ids[self.evaluate(criterion)]
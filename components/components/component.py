@@ -1,9 +1,13 @@
 from abc import ABC,abstractmethod
 
 import rclpy
-from rclpy.executors import ExternalShutdownException
+from rclpy.callback_groups import ReentrantCallbackGroup
+from rclpy.executors import ExternalShutdownException, MultiThreadedExecutor
 from rclpy.node import Node
+from components import metrics
+from components.async_io import AsyncDeviceIO
 from components.persona import Persona
+from components.router import CapabilityRouter, import_interface
 
 
 
@@ -19,10 +23,17 @@ class ComponentProfile(Node,ABC):
 
         super().__init__(self.id)
 
+        #Opt-in, see components.metrics - while disabled nothing is instrumented
+        self.declare_parameter("metrics_enabled", False)
+        self.declare_parameter("diagnostics_period_s", 1.0)
+        self.metrics_enabled = self.get_parameter("metrics_enabled").value
+        if self.metrics_enabled:
+            self.enableMetrics(self.get_parameter("diagnostics_period_s").value)
+
     @property
     def id(self) -> str:
         #We use persona.getID() to ensure a single source of truth
-        return self._persona.getID()
+        return self.persona.getID()
 
     def getID(self):
         return self.persona.getID()
@@ -30,6 +41,89 @@ class ComponentProfile(Node,ABC):
     def getPersona(self):
         return self.persona
 
+    def reloadPersona(self, persona: Persona):
+        """
+        Swaps in an edited version of the persona without restarting the node. Endpoints are only recreated for the
+        capabilities whose route changed, and the new persona replaces the old one in a single assignment once they
+        exist - callbacks see either the old or the new persona, never a mix.
+
+        :return: PersonaDiff from the old to the new persona
+        """
+        if persona.getID() != self.id:
+            raise ValueError(f"The id names the node and can't change - {self.id} can't become {persona.getID()}")
+
+        diff = self.persona.diff(persona)
+        if not diff:
+            return diff
+
+        changed_routes = set()
+        router = getattr(self, "router", None)
+        if router is not None and (diff.capabilities or diff.names_changed):
+            changed_routes = router.reroute(persona)
+        self.persona = persona
+        self.onPersonaReloaded(diff, changed_routes)
+        return diff
+
+    def onPersonaReloaded(self, diff, changed_routes: set):
+        """
+        Called after reloadPersona swapped in the new persona - override to refresh state derived from the persona,
+        e.g. publishers of changed routes fetched before the reload.
+
+        :param diff: PersonaDiff from the old to the new persona
+        :param changed_routes: Names of the capabilities whose endpoints were recreated
+        """
+        pass
+
+    def wireCapabilities(self, handlers: dict = None, callback_group=None, strict: bool = False) -> CapabilityRouter:
+        """
+        Creates the services and publishers declared by the capabilities of the persona, see CapabilityRouter.wire
+
+        :param handlers: Dict of service capability name -> callback, on<Name> methods are used otherwise
+        :return: The router, also kept as self.router
+        """
+        wrap = self._timedHandler if self.metrics_enabled else None
+        self.router = CapabilityRouter(self).wire(handlers, callback_group, strict=strict, wrap=wrap)
+        return self.router
+
+    def _timedHandler(self, name: str, handler):
+        def rejection(response):
+            #Responses with an is_success field report failed requests
+            return "failed" if getattr(response, "is_success", True) is False else None
+
+        return metrics.timed(handler, f"{self.id}.{name}", rejection=rejection)
+
+    def enableMetrics(self, period_s: float = 1.0):
+        """
+        Instruments the criteria checks and persona loading of the process and publishes all metrics as a
+        diagnostic_msgs/DiagnosticArray on /diagnostics every period_s. The service handlers are only timed if this
+        is called before wireCapabilities - set the metrics_enabled parameter to have it called on construction.
+        """
+        metrics.enable()
+        self.metrics_enabled = True
+        self._diagnostic_types = (import_interface("diagnostic_msgs/DiagnosticArray", "msg"),
+                                  import_interface("diagnostic_msgs/DiagnosticStatus", "msg"),
+                                  import_interface("diagnostic_msgs/KeyValue", "msg"))
+        self.diagnostics_pub = self.create_publisher(self._diagnostic_types[0], "/diagnostics", 10)
+        self.diagnostics_timer = self.create_timer(period_s, self.publishDiagnostics)
+
+    def publishDiagnostics(self):
+        """
+        Timer callback - one DiagnosticStatus per instrumented function, WARN if any of its calls raised.
+        """
+        array_type, status_type, key_value_type = self._diagnostic_types
+        array = array_type()
+        array.header.stamp = self.get_clock().now().to_msg()
+        for name, snapshot in sorted(metrics.snapshot().items()):
+            latency = snapshot["latency"]
+            values = {"calls": snapshot["calls"], "errors": snapshot["errors"],
+                      **{f"latency_{key}": value for key, value in latency.items() if key != "count"},
+                      **{f"rejected_{reason}": count for reason, count in snapshot["rejections"].items()}}
+            array.status.append(status_type(
+                level=status_type.WARN if snapshot["errors"] else status_type.OK, name=f"{self.id}: {name}",
+                message=f"{snapshot['calls']} calls", hardware_id=self.id,
+                values=[key_value_type(key=key, value=str(value)) for key, value in values.items()]))
+        self.diagnostics_pub.publish(array)
+
 class DeviceProfile(ComponentProfile,ABC):
     def __init__(self,persona:Persona):
         super().__init__(persona)
@@ -57,3 +151,87 @@ class DeviceProfile(ComponentProfile,ABC):
         pass
 
 
+class AsyncDeviceProfile(DeviceProfile,ABC):
+
+    """
+    A device whose I/O is written as coroutines running on the AsyncDeviceIO loop of the node.
+
+    Callbacks belong to the reentrant callback_group, so when the node spins in a MultiThreadedExecutor (see
+    spin_multithreaded) a callback waiting for the device only occupies its own executor thread.
+    """
+
+    def __init__(self,persona:Persona, device_io: AsyncDeviceIO = None, io_timeout_s: float = None):
+        """
+        :param device_io: Loop to run the device I/O on, a new one owned by the node if None
+        :param io_timeout_s: Default timeout of runIO, wait forever if None
+        """
+        self._owns_device_io = device_io is None
+        self.device_io = AsyncDeviceIO(f"{persona.getID()}-io") if device_io is None else device_io
+        self.io_timeout_s = io_timeout_s
+        self.callback_group = ReentrantCallbackGroup()
+        super().__init__(persona)
+
+    @abstractmethod
+    async def isConnectedAsync(self) -> bool:
+        """
+        Check if the device is properly connected, without blocking the executor
+
+        :return: True if the device is properly connected, false otherwise
+        """
+        pass
+
+    @abstractmethod
+    async def turnOnAsync(self) -> bool:
+        """
+        Turn on the connected device, without blocking the executor
+
+        :return: True if device is turned on and properly connected
+        """
+        pass
+
+    def runIO(self, coro, timeout: float = None):
+        """
+        Runs a device coroutine and waits for it - meant for callbacks in callback_group.
+
+        :param timeout: Seconds before the operation is cancelled, io_timeout_s if None
+        :return: The result of coro
+        """
+        return self.device_io.run(coro, self.io_timeout_s if timeout is None else timeout)
+
+    def submitIO(self, coro):
+        """
+        :return: A concurrent.futures.Future of the device coroutine, which is started without waiting for it
+        """
+        return self.device_io.submit(coro)
+
+    def isConnected(self) -> bool:
+        return self.runIO(self.isConnectedAsync())
+
+    def turnOn(self) -> bool:
+        if not (self.isConnected()):
+            raise RuntimeWarning(f"Device {self.id} is not connected!")
+        return self.runIO(self.turnOnAsync())
+
+    def destroy_node(self):
+        if self._owns_device_io:
+            self.device_io.close()
+        return super().destroy_node()
+
+
+def spin_multithreaded(*nodes, num_threads: int = None):
+    """
+    Spins the nodes in one MultiThreadedExecutor until shutdown, so callbacks in reentrant groups run concurrently.
+
+    :param num_threads: Number of executor threads, rclpy picks one per CPU if None
+    """
+    executor = MultiThreadedExecutor(num_threads=num_threads)
+    for node in nodes:
+        executor.add_node(node)
+    try:
+        executor.spin()
+    except (KeyboardInterrupt, ExternalShutdownException):
+        pass
+    finally:
+        executor.shutdown()
+        for node in nodes:
+            node.destroy_node()
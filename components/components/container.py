@@ -0,0 +1,199 @@
+"""
+Hosts many ComponentProfiles in one process, spun by one shared MultiThreadedExecutor.
+
+Every entry is a persona file and the ComponentProfile subclass to construct it with, "module:Class". Entries without
+a class use the class registered for the longest matching type prefix with --class-for. All nodes share one
+interpreter, one rclpy context and one executor thread pool, instead of one of each per node.
+
+rclpy has no intra-process communication - rclcpp's use_intra_process_comms has no Python counterpart - so messages
+between the hosted nodes still pass through the middleware. The savings are in processes, interpreters and executors.
+
+With --watch, the directories of the persona files are polled from a timer of the shared executor, and hosted nodes
+whose persona file changed reload it in place, see ComponentProfile.reloadPersona.
+
+Run in a sourced workspace:
+    python3 -m components.container lasers/IBeam455_persona.json=lasers.simulated_laser:SimulatedLaser ...
+        [--class-for base/device/laser=lasers.simulated_laser:SimulatedLaser] [--threads N] [--watch 1.0]
+"""
+import argparse
+import importlib
+import os
+import time
+
+import rclpy
+from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
+from rclpy.executors import ExternalShutdownException, MultiThreadedExecutor
+
+from components.persona import Persona, Type
+from components.watcher import PersonaWatcher, apply_changes
+
+
+def load_class(class_path: str):
+    """
+    :param class_path: "package.module:Class"
+    :return: The class
+    """
+    module_name, _, class_name = class_path.partition(":")
+    if not module_name or not class_name:
+        raise ValueError(f"{class_path} is not of the form package.module:Class")
+    cls = getattr(importlib.import_module(module_name), class_name, None)
+    if cls is None:
+        raise ValueError(f"{module_name} has no class {class_name}")
+    return cls
+
+
+def resolve_class(pers: Persona, class_path: str = None, type_classes: dict = None):
+    """
+    :param class_path: Class given for this persona, if any
+    :param type_classes: Dict of type string -> class path, the longest prefix of the persona's type wins
+    :return: The class to construct the persona's node with
+    """
+    if class_path:
+        return load_class(class_path)
+
+    type_tree = pers.getTypeTree()
+    for length in range(len(type_tree), 0, -1):
+        class_path = (type_classes or {}).get(Type(type_tree[:length]).type_str, None)
+        if class_path is not None:
+            return load_class(class_path)
+    raise ValueError(f"No class for {pers.getID()} of type {pers.getTypeString()} - give one with =module:Class")
+
+
+class ComponentContainer:
+
+    def __init__(self, num_threads: int = None):
+        """
+        :param num_threads: Threads of the shared executor, rclpy picks one per CPU if None
+        """
+        self.executor = MultiThreadedExecutor(num_threads=num_threads)
+        self.nodes = {}
+        #persona id -> seconds it took to construct its node
+        self.startup_s = {}
+        self.watchers = []
+        #Owns the timers polling the watchers, created by watch
+        self._watch_node = None
+        self._watch_group = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, node):
+        """
+        Hosts an already constructed node.
+        """
+        node_id = node.getID() if hasattr(node, "getID") else node.get_name()
+        if node_id in self.nodes:
+            raise ValueError(f"A component with the id {node_id} is already hosted")
+        self.nodes[node_id] = node
+        self.executor.add_node(node)
+        return node
+
+    def load(self, pers: Persona, cls):
+        """
+        Constructs the node of the persona and hosts it.
+
+        :return: The node
+        """
+        start = time.perf_counter()
+        node = cls(pers)
+        self.startup_s[pers.getID()] = time.perf_counter() - start
+        return self.add(node)
+
+    def remove(self, node_id: str):
+        node = self.nodes.pop(node_id)
+        self.executor.remove_node(node)
+        node.destroy_node()
+
+    def watch(self, directories, period_s: float = 1.0):
+        """
+        Polls the persona files of the directories every period_s and reloads the hosted nodes whose persona changed.
+        Files of personas that aren't hosted are ignored.
+
+        The polls run on a timer of the shared executor, in one mutually exclusive group, so reloads never overlap
+        and run like any other callback of the hosted nodes.
+        """
+        if self._watch_node is None:
+            self._watch_node = rclpy.create_node("component_container_watcher")
+            self._watch_group = MutuallyExclusiveCallbackGroup()
+            self.executor.add_node(self._watch_node)
+
+        for directory in sorted(set(directories)):
+            watcher = PersonaWatcher(directory)
+            #The personas as they are now are the ones the nodes were constructed with
+            watcher.poll()
+            self._watch_node.create_timer(period_s, lambda watcher=watcher: self._pollWatcher(watcher),
+                                          callback_group=self._watch_group)
+            self.watchers.append(watcher)
+
+    def _pollWatcher(self, watcher: PersonaWatcher):
+        changes = watcher.poll()
+        if not changes:
+            return
+        try:
+            apply_changes(changes, components=self.nodes)
+        except ValueError as err:
+            #The node keeps its old persona, e.g. when a capability of the new one has no handler
+            self._watch_node.get_logger().error(f"Could not reload a persona: {err}")
+
+    def spin(self):
+        """
+        Spins all hosted nodes until shutdown.
+        """
+        try:
+            self.executor.spin()
+        except (KeyboardInterrupt, ExternalShutdownException):
+            pass
+
+    def shutdown(self):
+        self.executor.shutdown()
+        if self._watch_node is not None:
+            self._watch_node.destroy_node()
+            self._watch_node = None
+        self.watchers.clear()
+        for node_id in list(self.nodes):
+            self.remove(node_id)
+
+
+def parse_entry(entry: str):
+    """
+    :return: (persona path, class path or None) of "persona.json" or "persona.json=module:Class"
+    """
+    persona_path, _, class_path = entry.partition("=")
+    return persona_path, class_path or None
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Host many components in one process")
+    parser.add_argument("entries", nargs="+", help="persona.json or persona.json=package.module:Class")
+    parser.add_argument("--class-for", action="append", default=[], metavar="TYPE=module:Class",
+                        help="Class for the personas whose type starts with TYPE")
+    parser.add_argument("--threads", type=int, default=None, help="Threads of the shared executor")
+    parser.add_argument("--watch", type=float, default=None, metavar="PERIOD_S",
+                        help="Reload the personas whose files change, polling every PERIOD_S seconds")
+    parsed, ros_args = parser.parse_known_args(args)
+
+    type_classes = dict(parse_entry(mapping) for mapping in parsed.class_for)
+    start = time.perf_counter()
+
+    rclpy.init(args=ros_args)
+    container = ComponentContainer(parsed.threads)
+    try:
+        for entry in parsed.entries:
+            persona_path, class_path = parse_entry(entry)
+            pers = Persona(persona_path)
+            container.load(pers, resolve_class(pers, class_path, type_classes))
+
+        if parsed.watch is not None:
+            container.watch([os.path.dirname(os.path.abspath(parse_entry(entry)[0])) for entry in parsed.entries],
+                            parsed.watch)
+
+        #Benchmarks wait for this line
+        print(f"Hosting {len(container)} components, started in {time.perf_counter() - start:.3f} s", flush=True)
+        container.spin()
+    finally:
+        container.shutdown()
+        rclpy.try_shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Discovery of live components by Criterion.
+
+DiscoveryIndex holds the personas of all live components and answers criteria queries. Results are memoized per
+criterion. When a component joins, leaves or changes persona, only that component is checked against the memoized
+criteria - nothing is queried again.
+
+Criteria travel as JSON, see encode_criteria. Nothing here depends on ROS, the node lives in discovery_node.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from .persona import CriteriaOperator, Criterion, PersonaRegistry, Type
+
+TYPE_TAG = "__type__"
+
+
+def _encodeValue(value):
+    if isinstance(value, Type):
+        return {TYPE_TAG: value.type_str}
+    raise TypeError(f"{type(value)} can't be part of serialized criteria")
+
+
+def _decodeObject(obj):
+    if len(obj) == 1 and TYPE_TAG in obj:
+        return Type(obj[TYPE_TAG])
+    return obj
+
+
+def _operatorKeys(value):
+    #JSON keys are strings, and sort_keys can't order a CriteriaOperator among them
+    if isinstance(value, dict):
+        return {key.value if isinstance(key, CriteriaOperator) else key: _operatorKeys(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_operatorKeys(item) for item in value]
+    return value
+
+
+def encode_criteria(criteria_dict: dict) -> str:
+    """
+    :return: Canonical JSON of the criteria dict - a Type is encoded as {"__type__": "base/device/laser"}, and a
+        CriteriaOperator as its string. Equal criteria give equal strings. JSON has no tuples, so they decode as
+        lists - which is what a persona's list values equal
+    """
+    return json.dumps(_operatorKeys(criteria_dict), default=_encodeValue, sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False)
+
+
+def decode_criteria(criteria_json: str) -> dict:
+    """
+    :return: The criteria dict encoded by encode_criteria
+    """
+    criteria_dict = json.loads(criteria_json, object_hook=_decodeObject)
+    if not isinstance(criteria_dict, dict):
+        raise ValueError("Serialized criteria must be a JSON object")
+    return criteria_dict
+
+
+class DiscoveryIndex:
+
+    """
+    The personas of the live components and the memoized results of the criteria asked for.
+    """
+
+    JOINED = "joined"
+    CHANGED = "changed"
+    RENEWED = "renewed"
+
+    def __init__(self, max_cached: int = 1024):
+        """
+        :param max_cached: Number of memoized criteria - the least recently asked is dropped first
+        """
+        self.max_cached = max_cached
+        self._registry = PersonaRegistry()
+        #persona id -> monotonic deadline of its lease, None if it never expires
+        self._deadlines = {}
+        #Criterion.key() -> [CompiledCriterion, ids of the matching personas]
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        #Memoized results patched by joins, leaves and changes
+        self.updates = 0
+
+    def __len__(self):
+        return len(self._registry)
+
+    def __contains__(self, pers_id):
+        return pers_id in self._registry
+
+    def get(self, pers_id):
+        with self._lock:
+            return self._registry.get(pers_id)
+
+    def join(self, pers, lease_s: float = None) -> str:
+        """
+        Registers the persona of a component, or replaces it if the component is already known.
+
+        :param lease_s: The component leaves unless it joins again within lease_s seconds, never if None or 0
+        :return: JOINED, CHANGED, or RENEWED if only the lease was renewed
+        """
+        pers_id = pers.getID()
+        with self._lock:
+            self._deadlines[pers_id] = time.monotonic() + lease_s if lease_s else None
+
+            old = self._registry.get(pers_id)
+            if old is None:
+                self._registry.register(pers)
+            #Only the index entries of what changed are touched
+            elif old is pers or not self._registry.update(pers):
+                return self.RENEWED
+
+            for entry in self._cache.values():
+                entry[1].discard(pers_id)
+                if entry[0].checkPersona(pers):
+                    entry[1].add(pers_id)
+                self.updates += 1
+
+            return self.JOINED if old is None else self.CHANGED
+
+    def leave(self, pers_id) -> bool:
+        """
+        :return: True if the component was known
+        """
+        with self._lock:
+            if pers_id not in self._registry:
+                return False
+            self._registry.unregister(pers_id)
+            del self._deadlines[pers_id]
+
+            for entry in self._cache.values():
+                entry[1].discard(pers_id)
+                self.updates += 1
+            return True
+
+    def expire(self, now: float = None) -> list:
+        """
+        Removes the components whose lease ran out.
+
+        :param now: time.monotonic() if None
+        :return: The ids of the removed components
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [pers_id for pers_id, deadline in self._deadlines.items() if deadline is not None and deadline < now]
+            for pers_id in expired:
+                self.leave(pers_id)
+        return expired
+
+    def find(self, criteria) -> list:
+        """
+        :param criteria: Criteria dict, or its JSON as encoded by encode_criteria
+        :return: Sorted ids of the components matching the criteria
+        """
+        if isinstance(criteria, str):
+            criteria = decode_criteria(criteria)
+        #Keyed like the criterion that is compiled, so criteria that only look alike in JSON stay apart
+        criterion = Criterion(criteria)
+        key = criterion.key()
+
+        with self._lock:
+            entry = self._cache.get(key, None)
+            if entry is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return sorted(entry[1])
+
+            self.misses += 1
+            #Ordered for the current components - the memoized rule is re-checked on every join and change
+            compiled = self._registry.plan(criterion)
+            ids = set(self._registry.queryIDs(compiled))
+            if self.max_cached > 0:
+                self._cache[key] = [compiled, ids]
+                if len(self._cache) > self.max_cached:
+                    self._cache.popitem(last=False)
+            return sorted(ids)
+
+    def clearCache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"components": len(self._registry), "cached_criteria": len(self._cache), "hits": self.hits,
+                    "misses": self.misses, "updates": self.updates}
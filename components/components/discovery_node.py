@@ -0,0 +1,143 @@
+"""
+ROS 2 node answering "which components match this criterion" for the whole system, see DiscoveryIndex.
+
+Components register their persona - with a lease they renew, so crashed components disappear - and clients send
+criteria as JSON (see encode_criteria) instead of each loading and scanning every persona themselves.
+Everything runs in this process, no outside services are needed.
+
+Run in a sourced workspace:
+    python3 -m components.discovery_node
+"""
+import json
+
+import rclpy
+from rclpy.callback_groups import ReentrantCallbackGroup
+from rclpy.node import Node
+
+from components.component import spin_multithreaded
+from components.discovery import DiscoveryIndex, encode_criteria
+from components.persona import Persona
+from components.router import call_service
+from interfaces.srv import FindComponents, RegisterPersona, UnregisterPersona
+
+FIND_SERVICE = "discovery/find"
+REGISTER_SERVICE = "discovery/register"
+UNREGISTER_SERVICE = "discovery/unregister"
+
+
+class DiscoveryNode(Node):
+
+    def __init__(self, name: str = "discovery"):
+        super().__init__(name)
+
+        self.declare_parameter("max_cached_criteria", 1024)
+        self.declare_parameter("expire_period_s", 1.0)
+        self.index = DiscoveryIndex(self.get_parameter("max_cached_criteria").value)
+
+        #The index has its own lock, so queries are answered concurrently
+        self.service_group = ReentrantCallbackGroup()
+        self.find_srv = self.create_service(FindComponents, FIND_SERVICE, self.onFind,
+                                            callback_group=self.service_group)
+        self.register_srv = self.create_service(RegisterPersona, REGISTER_SERVICE, self.onRegister,
+                                                callback_group=self.service_group)
+        self.unregister_srv = self.create_service(UnregisterPersona, UNREGISTER_SERVICE, self.onUnregister,
+                                                  callback_group=self.service_group)
+        self.expire_timer = self.create_timer(self.get_parameter("expire_period_s").value, self.expireLeases)
+
+    def onFind(self, request: FindComponents.Request, response: FindComponents.Response):
+        try:
+            ids = self.index.find(request.criteria_json)
+        except (ValueError, TypeError) as err:
+            response.is_success = False
+            response.error = f"Invalid criteria: {err}"
+            return response
+
+        if request.include_personas:
+            #A component may leave between the query and here
+            personas = [(pers_id, self.index.get(pers_id)) for pers_id in ids]
+            personas = [(pers_id, pers) for pers_id, pers in personas if pers is not None]
+            ids = [pers_id for pers_id, _ in personas]
+            response.personas_json = [json.dumps(pers.toData(), separators=(",", ":")) for _, pers in personas]
+
+        response.ids = ids
+        response.is_success = True
+        return response
+
+    def onRegister(self, request: RegisterPersona.Request, response: RegisterPersona.Response):
+        try:
+            pers = Persona.fromData(json.loads(request.persona_json))
+        except (ValueError, TypeError, KeyError) as err:
+            response.is_success = False
+            response.error = f"Invalid persona: {err}"
+            return response
+
+        outcome = self.index.join(pers, request.lease_s)
+        if outcome != DiscoveryIndex.RENEWED:
+            self.get_logger().info(f"{pers.getID()} {outcome}")
+        response.is_success = True
+        return response
+
+    def onUnregister(self, request: UnregisterPersona.Request, response: UnregisterPersona.Response):
+        response.is_success = self.index.leave(request.id)
+        if response.is_success:
+            self.get_logger().info(f"{request.id} left")
+        return response
+
+    def expireLeases(self):
+        for pers_id in self.index.expire():
+            self.get_logger().info(f"{pers_id} expired")
+
+
+class DiscoveryClient:
+
+    """
+    Blocking calls to the discovery node - the given node must be spun by an executor on another thread.
+    """
+
+    def __init__(self, node, timeout_s: float = 5.0):
+        self.node = node
+        self.timeout_s = timeout_s
+        #Created once and reused, so discovery of the discovery node is waited for once
+        self.find_client = node.create_client(FindComponents, FIND_SERVICE)
+        self.register_client = node.create_client(RegisterPersona, REGISTER_SERVICE)
+        self.unregister_client = node.create_client(UnregisterPersona, UNREGISTER_SERVICE)
+
+    def waitForService(self) -> bool:
+        return all(client.wait_for_service(timeout_sec=self.timeout_s)
+                   for client in (self.find_client, self.register_client, self.unregister_client))
+
+    def find(self, criteria_dict: dict, include_personas: bool = False):
+        """
+        :return: Sorted ids of the matching components - and their personas if include_personas
+        """
+        request = FindComponents.Request(criteria_json=encode_criteria(criteria_dict), include_personas=include_personas)
+        response = call_service(self.find_client, request, self.timeout_s)
+        if not response.is_success:
+            raise ValueError(response.error)
+
+        ids = list(response.ids)
+        if include_personas:
+            return ids, [Persona.fromData(json.loads(pers_json), validate=False) for pers_json in response.personas_json]
+        return ids
+
+    def register(self, pers: Persona, lease_s: float = 0.0) -> bool:
+        request = RegisterPersona.Request(persona_json=json.dumps(pers.toData()), lease_s=lease_s)
+        response = call_service(self.register_client, request, self.timeout_s)
+        if not response.is_success:
+            raise ValueError(response.error)
+        return True
+
+    def unregister(self, pers_id: str) -> bool:
+        return call_service(self.unregister_client, UnregisterPersona.Request(id=pers_id), self.timeout_s).is_success
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    try:
+        spin_multithreaded(DiscoveryNode())
+    finally:
+        rclpy.try_shutdown()
+
+
+if __name__ == "__main__":
+    main()
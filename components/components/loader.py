@@ -0,0 +1,171 @@
+import hashlib
+import json
+import marshal
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from .persona import Persona
+
+CACHE_FILE_NAME = ".persona_cache.marshal"
+#Bumped whenever the cached data or the validation changes, so old caches are ignored
+CACHE_VERSION = 2
+#Below this many files to parse, a pool costs more than it saves
+MIN_PARALLEL_FILES = 32
+
+
+class LoadStats:
+
+    """
+    Statistics of a single load_personas call - times are in seconds.
+    """
+
+    __slots__ = ("files", "cache_hits", "parsed", "errors", "read_s", "parse_s", "build_s", "total_s")
+
+    def __init__(self):
+        self.files = 0
+        self.cache_hits = 0
+        self.parsed = 0
+        #path -> error message of the files that could not be loaded
+        self.errors = {}
+        self.read_s = 0.0
+        self.parse_s = 0.0
+        self.build_s = 0.0
+        self.total_s = 0.0
+
+    def __repr__(self):
+        return (f"Loaded {self.files - len(self.errors)}/{self.files} personas in {self.total_s * 1e3:.1f} ms "
+                f"({self.cache_hits} cached, {self.parsed} parsed, {len(self.errors)} failed) - "
+                f"read {self.read_s * 1e3:.1f} ms, parse {self.parse_s * 1e3:.1f} ms, build {self.build_s * 1e3:.1f} ms")
+
+
+def _readFile(path):
+    with open(path, "rb") as f:
+        content = f.read()
+    return path, hashlib.sha256(content).hexdigest(), content
+
+
+def _parsePersona(content, schema=None):
+    """
+    Parses and validates a single persona - runs in the worker pool.
+
+    :param schema: SchemaValidator the persona must also pass, see components.schema
+    :return: (persona data, None) or (None, error message)
+    """
+    try:
+        data = json.loads(content)
+        if schema is not None:
+            schema.validate(data)
+        #Building the persona runs the whole validation
+        Persona.fromData(data)
+        return data, None
+    except Exception as err:
+        return None, f"{type(err).__name__}: {err}"
+
+
+def _loadCache(cache_path):
+    #The cache sits in the persona directory, which others may be able to write. It only holds plain data, so it is
+    #stored with marshal - unlike pickle, loading it never runs code
+    try:
+        with open(cache_path, "rb") as f:
+            version, cache = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+    return cache if version == CACHE_VERSION and isinstance(cache, dict) else {}
+
+
+def _saveCache(cache_path, cache):
+    #Written next to the cache and then swapped in, so a crash never leaves half a cache behind
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        marshal.dump((CACHE_VERSION, cache), f)
+    os.replace(tmp_path, cache_path)
+
+
+def load_personas(directory, recursive=False, cache_path=None, use_cache=True, executor="process",
+                  max_workers=None, strict=True, schema=None):
+    """
+    Loads all persona JSON files of a directory.
+
+    Files are parsed and validated in a pool. Parsed personas are cached on disk keyed by the SHA-256 of the file content,
+    so on a restart unchanged personas skip both parsing and validation. With a schema the cache is also keyed by the
+    fingerprint of the schema, so editing a profile validates every file again.
+
+    :param directory: Directory of compiled persona JSON files
+    :param recursive: Also load the JSON files of sub-directories
+    :param cache_path: Cache file, defaults to CACHE_FILE_NAME inside directory
+    :param use_cache: Set to False to neither read nor write the cache
+    :param executor: "process" or "thread" - the pool used for parsing
+    :param max_workers: Size of the pool, defaults to the executor's default
+    :param strict: Raise a ValueError if any file fails to load, otherwise the failures are only reported in the stats
+    :param schema: SchemaValidator every persona must pass, e.g. SchemaValidator(build_schema()) of components.schema
+    :return: (list of personas sorted by file path, LoadStats)
+    """
+    start = time.perf_counter()
+    stats = LoadStats()
+
+    if recursive:
+        paths = [os.path.join(root, name) for root, _, names in os.walk(directory)
+                 for name in names if name.endswith(".json")]
+    else:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")]
+    paths.sort()
+    stats.files = len(paths)
+
+    if cache_path is None:
+        cache_path = os.path.join(directory, CACHE_FILE_NAME)
+    cache = _loadCache(cache_path) if use_cache else {}
+
+    #Reading is I/O bound, so threads are enough
+    t = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        files = list(pool.map(_readFile, paths))
+    if schema is not None:
+        files = [(path, (digest, schema.fingerprint), content) for path, digest, content in files]
+    stats.read_s = time.perf_counter() - t
+
+    t = time.perf_counter()
+    misses = [(path, digest, content) for path, digest, content in files if digest not in cache]
+    stats.cache_hits = len(files) - len(misses)
+
+    parse = _parsePersona if schema is None else partial(_parsePersona, schema=schema)
+    if len(misses) < MIN_PARALLEL_FILES:
+        results = [parse(content) for _, _, content in misses]
+    else:
+        pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        with pool_class(max_workers=max_workers) as pool:
+            results = list(pool.map(parse, [content for _, _, content in misses], chunksize=16))
+
+    for (path, digest, _), (data, error) in zip(misses, results):
+        if error is None:
+            cache[digest] = data
+        else:
+            stats.errors[path] = error
+    stats.parsed = len(misses) - len(stats.errors)
+    stats.parse_s = time.perf_counter() - t
+
+    if stats.errors and strict:
+        path, error = next(iter(stats.errors.items()))
+        raise ValueError(f"Could not load {len(stats.errors)} persona(s), first was {path} - {error}")
+
+    #Everything in the cache has been validated already
+    t = time.perf_counter()
+    personas = [Persona.fromData(cache[digest], validate=False) for path, digest, _ in files if path not in stats.errors]
+    stats.build_s = time.perf_counter() - t
+
+    if use_cache:
+        #Only the current files are kept, so the cache doesn't grow with every edit
+        _saveCache(cache_path, {digest: cache[digest] for path, digest, _ in files if path not in stats.errors})
+
+    stats.total_s = time.perf_counter() - start
+    return personas, stats
+
+
+if __name__ == "__main__":
+    import sys
+
+    _, load_stats = load_personas(sys.argv[1] if len(sys.argv) > 1 else ".", strict=False)
+    print(load_stats)
+    for failed_path, message in load_stats.errors.items():
+        print(f"  {failed_path}: {message}")
@@ -0,0 +1,242 @@
+"""
+Opt-in instrumentation of the hot paths - criteria checks, persona loading and the service handlers of components.
+
+enable() swaps the instrumented functions for timed wrappers and disable() puts the originals back, so while
+disabled only the original code runs. Every wrapper records into a CallMetrics of the registry: the number of calls
+and errors, a latency histogram and the reasons of the rejections - the failing descriptor key of a compiled
+criterion, or why a service handler failed.
+
+Nothing here depends on ROS. ComponentProfile wraps its service handlers with timed and publishes the registry as
+diagnostics when its metrics_enabled parameter is set.
+"""
+import bisect
+import functools
+import threading
+import time
+from collections import Counter
+
+REJECTED = "rejected"
+
+
+class Histogram:
+
+    """
+    Latency histogram with logarithmic buckets - bucket i counts the latencies up to BOUNDS_S[i], the last one the rest.
+    """
+
+    #1 us to 16.8 s, doubling
+    BOUNDS_S = tuple(1e-6 * 2 ** i for i in range(25))
+
+    __slots__ = ("counts", "count", "total_s", "max_s")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_S) + 1)
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(self.BOUNDS_S, seconds)] += 1
+        self.count += 1
+        self.total_s += seconds
+        if seconds > self.max_s:
+            self.max_s = seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        :param q: Between 0 and 1
+        :return: Upper bound of the bucket holding the q-quantile, never above the largest latency. nan if empty
+        """
+        if self.count == 0:
+            return float("nan")
+        rank = max(1, -(-self.count * q // 1))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        return min(self.BOUNDS_S[i], self.max_s) if i < len(self.BOUNDS_S) else self.max_s
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "mean_s": self.total_s / self.count if self.count else float("nan"),
+                "p50_s": self.quantile(0.5), "p90_s": self.quantile(0.9), "p99_s": self.quantile(0.99),
+                "max_s": self.max_s}
+
+
+class CallMetrics:
+
+    """
+    Counters and latencies of one instrumented function.
+    """
+
+    __slots__ = ("name", "calls", "errors", "rejections", "latency", "_lock")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        #Calls that raised
+        self.errors = 0
+        #reason -> number of calls that rejected for it
+        self.rejections = Counter()
+        self.latency = Histogram()
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_s: float, rejection: str = None, error: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.latency.record(elapsed_s)
+            if error:
+                self.errors += 1
+            elif rejection is not None:
+                self.rejections[rejection] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors, "rejections": dict(self.rejections),
+                    "latency": self.latency.snapshot()}
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CallMetrics:
+        """
+        :return: The metrics of name, created on first use
+        """
+        with self._lock:
+            metrics = self._metrics.get(name, None)
+            if metrics is None:
+                metrics = self._metrics[name] = CallMetrics(name)
+            return metrics
+
+    def snapshot(self) -> dict:
+        """
+        :return: Dict of name -> CallMetrics.snapshot()
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {call_metrics.name: call_metrics.snapshot() for call_metrics in metrics}
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+
+#Process-wide registry used unless another one is given
+REGISTRY = MetricsRegistry()
+
+#(owner, attribute) -> original, while enabled
+_originals = {}
+_enabled_lock = threading.Lock()
+
+
+def rejected_if_false(result):
+    return REJECTED if not result else None
+
+
+def timed(func, name: str, registry: MetricsRegistry = None, rejection=None):
+    """
+    :param rejection: Callable (result) -> reason the call rejected, or None if it didn't
+    :return: func wrapped to record every call into the metrics of name
+    """
+    metrics = (REGISTRY if registry is None else registry).get(name)
+    perf_counter = time.perf_counter
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            metrics.record(perf_counter() - start, error=True)
+            raise
+        metrics.record(perf_counter() - start, None if rejection is None else rejection(result))
+        return result
+
+    return wrapper
+
+
+def _timedCompiledCheck(func, name: str, registry: MetricsRegistry = None):
+    """
+    Like timed, but the rejection reason is the descriptor key - or "capabilities" - of the step that rejected.
+    """
+    metrics = (REGISTRY if registry is None else registry).get(name)
+    perf_counter = time.perf_counter
+
+    @functools.wraps(func)
+    def wrapper(self, pers):
+        #Walks the same plan as func, but tells which step rejected
+        start = perf_counter()
+        step = self._rejectingStep(pers)
+        elapsed_s = perf_counter() - start
+
+        reason = None
+        if step is not None:
+            key_crd = self._plan[step][0]
+            reason = "capabilities" if key_crd is None else key_crd
+        metrics.record(elapsed_s, reason)
+        return step is None
+
+    return wrapper
+
+
+def _targets():
+    """
+    :return: List of (owner, attribute, metrics name, wrap) of everything enable instruments, where
+        wrap(original, name, registry) returns the wrapper
+    """
+    from . import loader, persona
+
+    def load_rejection(result):
+        return "invalid" if result[1].errors else None
+
+    checked = functools.partial(timed, rejection=rejected_if_false)
+    return [
+        (persona.Criterion, "checkPersona", "criterion.checkPersona", checked),
+        (persona.Criterion, "checkDescriptor", "criterion.checkDescriptor", checked),
+        (persona.Criterion, "checkCapabilities", "criterion.checkCapabilities", checked),
+        (persona.CompiledCriterion, "checkPersona", "compiled.checkPersona", _timedCompiledCheck),
+        (persona.CompiledCriterion, "checkDescriptor", "compiled.checkDescriptor", checked),
+        (persona.CompiledCriterion, "checkCapabilities", "compiled.checkCapabilities", checked),
+        (persona.Persona, "_initFromData", "persona.build", timed),
+        #Callers that imported load_personas by name before enable keep the original
+        (loader, "load_personas", "persona.load_personas", functools.partial(timed, rejection=load_rejection)),
+    ]
+
+
+def enable(registry: MetricsRegistry = None):
+    """
+    Instruments the criteria checks and persona loading - does nothing if they are instrumented already.
+    """
+    with _enabled_lock:
+        if _originals:
+            return
+        for owner, attribute, name, wrap in _targets():
+            original = vars(owner)[attribute]
+            _originals[(owner, attribute)] = original
+            setattr(owner, attribute, wrap(original, name, registry))
+
+
+def disable():
+    """
+    Puts the original functions back - the recorded metrics are kept.
+    """
+    with _enabled_lock:
+        for (owner, attribute), original in _originals.items():
+            setattr(owner, attribute, original)
+        _originals.clear()
+
+
+def is_enabled() -> bool:
+    return bool(_originals)
+
+
+def snapshot() -> dict:
+    return REGISTRY.snapshot()
+
+
+def reset():
+    REGISTRY.reset()
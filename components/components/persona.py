@@ -1,90 +1,392 @@
 import json
 from argparse import ArgumentTypeError
-from collections import deque
+from collections import OrderedDict, deque
 from enum import Enum
-import copy
+import bisect
+import itertools
+import sys
+import threading
+import weakref
+from collections.abc import Mapping
+from types import MappingProxyType
+
+def _kmpTable(pattern):
+    """
+    :return: Knuth-Morris-Pratt failure table - table[i] is the length of the longest proper prefix of pattern[:i+1] which is also a suffix
+    """
+    table = [0] * len(pattern)
+    k = 0
+    for i in range(1, len(pattern)):
+        while k and pattern[i] != pattern[k]:
+            k = table[k - 1]
+        if pattern[i] == pattern[k]:
+            k += 1
+        table[i] = k
+    return table
+
+
+def _kmpContains(pattern, sequence, table=None):
+    """
+    :return: True if pattern is a contiguous (ordered) sub-sequence of sequence - in O(len(pattern) + len(sequence))
+    """
+    n = len(pattern)
+    if n == 0:
+        return True
+    if table is None:
+        table = _kmpTable(pattern)
+
+    k = 0
+    for item in sequence:
+        while k and item != pattern[k]:
+            k = table[k - 1]
+        if item == pattern[k]:
+            k += 1
+            if k == n:
+                return True
+    return False
+
 
 class Type:
 
+    """
+    Immutable and interned - all Types with the same type tree are the same object.
+    The type tree is stored as a tuple, so reading it requires no copy.
+    """
+
+    __slots__ = ("_type_tree", "_type_str", "_hash", "__weakref__")
 
-    def __init__(self,type_data):
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, type_data):
 
         """
         :param type_data: Type string or type tree.
         """
 
-        if(isinstance(type_data,list)):
-            self._type_tree = type_data
-            self._type_str = self._createTypeString()
+        if(isinstance(type_data,Type)):
+            return type_data
+
+        if(isinstance(type_data,(list,tuple))):
+            type_tree = tuple(type_data)
 
         elif(isinstance(type_data,str)):
-            self._type_str = type_data
-            self._type_tree = self._createTypeTree()
+            type_tree = tuple(type_data.split("/"))
 
-        self._validateType()
+        else:
+            raise TypeError(f"A type can only be created from a type string or type tree, not {type(type_data)}")
+
+        interned = cls._interned.get(type_tree, None)
+        if interned is not None:
+            return interned
 
-    def _createTypeTree(self):
-        return self.type_str.split("/")
+        self = super().__new__(cls)
+        object.__setattr__(self, "_type_tree", type_tree)
+        object.__setattr__(self, "_type_str", "/".join(type_tree))
+        object.__setattr__(self, "_hash", hash(type_tree))
+        self._validateType()
 
-    def _createTypeString(self):
-        return "/".join(self._type_tree)
+        return cls._interned.setdefault(type_tree, self)
 
     @property
-    def type_str(self):
-        return copy.copy(self._type_str)
+    def type_str(self) -> str:
+        return self._type_str
 
     @property
-    def type_tree(self):
-        return copy.copy(self._type_tree)
+    def type_tree(self) -> tuple:
+        return self._type_tree
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"Type is immutable - cannot set {key}")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"Type is immutable - cannot delete {key}")
+
+    def __reduce__(self):
+        #Unpickling goes through __new__, so the type stays interned
+        return (Type, (self._type_tree,))
 
     def __eq__(self, other):
-        flag = self.type_tree == other.type_tree
-        return flag
+        if not isinstance(other, Type):
+            return NotImplemented
+        return self is other or self._type_tree == other._type_tree
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f"Type('{self._type_str}')"
 
     def _validateType(self):
 
-        if(self.type_tree == []):
+        if(self.type_tree == ()):
             raise ValueError(f"Type tree is empty - {self.type_tree}")
 
-        if(any(type_leaf is "" for type_leaf in self.type_tree)):
+        if(any(type_leaf == "" for type_leaf in self.type_tree)):
             raise ValueError(f"A type_leaf is empty implying a slash without a type name - {self.type_str} \t {self.type_tree}")
 
         if(self.type_str[-1] == "\\"):
             raise ValueError(f"Types are not allowed to end on slash - {self.type_str}")
 
 
+class TypeTrie:
+
+    """
+    Prefix trie of type trees: base -> device -> laser ...
+    Every node knows the ids of all personas in its subtree, so a whole subtree is returned at once.
+    """
+
+    class _Node:
+        __slots__ = ("children", "ids", "subtree_ids")
+
+        def __init__(self):
+            self.children = {}
+            #Ids of the personas of exactly this type
+            self.ids = set()
+            #Ids of the personas of this type and all of its sub-types
+            self.subtree_ids = set()
+
+    def __init__(self):
+        self._root = self._Node()
+
+    def add(self, pers_type: Type, pers_id):
+        node = self._root
+        for type_leaf in pers_type.type_tree:
+            node = node.children.setdefault(type_leaf, self._Node())
+            node.subtree_ids.add(pers_id)
+        node.ids.add(pers_id)
+
+    def discard(self, pers_type: Type, pers_id):
+        path = []
+        node = self._root
+        for type_leaf in pers_type.type_tree:
+            node = node.children.get(type_leaf, None)
+            if node is None:
+                return
+            path.append(node)
+
+        node.ids.discard(pers_id)
+        for node in path:
+            node.subtree_ids.discard(pers_id)
+        self._prune(pers_type.type_tree)
+
+    def _prune(self, type_tree):
+        #Cuts off the first branch along type_tree that nobody is left in
+        node = self._root
+        for type_leaf in type_tree:
+            child = node.children.get(type_leaf, None)
+            if child is None:
+                return
+            if not child.subtree_ids:
+                del node.children[type_leaf]
+                return
+            node = child
+
+    def subtree(self, prefix) -> set:
+        """
+        :param prefix: Type or type tree
+        :return: Ids of all personas whose type tree starts with prefix
+        """
+        node = self._root
+        for type_leaf in (prefix.type_tree if isinstance(prefix, Type) else prefix):
+            node = node.children.get(type_leaf, None)
+            if node is None:
+                return set()
+        if node is self._root:
+            return {pers_id for child in node.children.values() for pers_id in child.subtree_ids}
+        return set(node.subtree_ids)
+
+    def containing(self, sub_path) -> set:
+        """
+        :param sub_path: Type or type tree
+        :return: Ids of all personas whose type tree contains sub_path as an ordered sub-path ("in" on types).
+
+        The trie is walked once while carrying the KMP state of sub_path, so shared prefixes are matched once.
+        As soon as sub_path is matched the whole subtree below that node matches.
+        """
+        pattern = sub_path.type_tree if isinstance(sub_path, Type) else tuple(sub_path)
+        n = len(pattern)
+        if n == 0:
+            return self.subtree(())
+        table = _kmpTable(pattern)
+
+        ids = set()
+        stack = [(child, type_leaf, 0) for type_leaf, child in self._root.children.items()]
+        while stack:
+            node, type_leaf, k = stack.pop()
+            while k and type_leaf != pattern[k]:
+                k = table[k - 1]
+            if type_leaf == pattern[k]:
+                k += 1
+            if k == n:
+                ids |= node.subtree_ids
+                continue
+            stack.extend((child, child_leaf, k) for child_leaf, child in node.children.items())
+        return ids
+
+
+class _FrozenList(tuple):
+
+    """
+    Read-only list of a persona. It compares equal to lists (not tuples) with the same items, just like the list it replaces.
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if isinstance(other, (list, _FrozenList)):
+            return tuple.__eq__(self, tuple(other))
+        if isinstance(other, tuple):
+            return False
+        return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = tuple.__hash__
+
+    def __getitem__(self, index):
+        item = tuple.__getitem__(self, index)
+        return _FrozenList(item) if isinstance(index, slice) else item
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def _freeze(value):
+    """
+    :return: Read-only version of a parsed JSON value - dicts become mapping proxies and lists become _FrozenLists.
+    Strings are interned, so the many personas of a fleet share their keys and common values.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({sys.intern(key) if isinstance(key, str) else key: _freeze(item)
+                                 for key, item in value.items()})
+    if isinstance(value, list):
+        return _FrozenList(_freeze(item) for item in value)
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def _thaw(value):
+    """
+    :return: Plain JSON value of a frozen value - the inverse of _freeze
+    """
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, _FrozenList):
+        return [_thaw(item) for item in value]
+    if isinstance(value, Type):
+        return value.type_str
+    return value
 
 
 class Persona:
 
     """
     Immutable object - Python implementation of persona (see profiles in docs)
+
+    The descriptor and capabilities are read-only views, so the getters hand them out without copying.
+    Every Persona gets a new version when it is built, so a reloaded persona never shares cached results with the one
+    it replaces, see CriterionCache.
     """
 
+    __slots__ = ("descriptor", "capabilities", "type", "id", "version", "_capabilities_names", "_extra")
+
+    #Shared by all personas of the process - next() on a count is atomic
+    _versions = itertools.count(1)
+
     def __init__(self,persona_path : str):
 
         if not(persona_path.endswith(".json")):
             raise ArgumentTypeError(f"The persona class can only load JSON files, you tried to load {persona_path}")
 
         with open(persona_path, "r", encoding="utf-8") as f:
-            self.data = json.load(f)
+            data = json.load(f)
+
+        self._initFromData(data)
 
-        self.descriptor = self.data["descriptor"]
-        self.descriptor["type"] = Type(self.descriptor["type"])
-        self.capabilities = self.data["capabilities"]
-        self.type = self.descriptor["type"]
-        self.id = self.descriptor["id"]
+    @classmethod
+    def fromData(cls, data: dict, validate: bool = True):
+        """
+        :param data: An already parsed persona dict, e.g. the output of the jsonnet compiler.
+        :param validate: Set to False to skip the validation of data that has been validated before, e.g. cached data
+        :return: Persona built from the dict - the dict itself is not modified
+        """
+        pers = cls.__new__(cls)
+        pers._initFromData(data, validate)
+        return pers
+
+    @classmethod
+    def fromBundle(cls, bundle_path: str, pers_id: str):
+        """
+        :param bundle_path: Persona bundle, see components.bundle
+        :param pers_id: Id of the persona - only this record of the bundle is decoded
+        :return: Persona from the bundle
+        """
+        from .bundle import PersonaBundle
 
-        self._validatePersona()
+        return PersonaBundle.open(bundle_path).get(pers_id)
+
+    def _initFromData(self, data: dict, validate: bool = True):
+        descriptor = dict(data["descriptor"])
+        descriptor["type"] = Type(descriptor["type"])
+
+        #The persona is immutable from here on, so we go around __setattr__
+        set_attr = object.__setattr__
+        set_attr(self, "descriptor", _freeze(descriptor))
+        set_attr(self, "capabilities", _freeze(data["capabilities"]))
+        set_attr(self, "type", self.descriptor["type"])
+        set_attr(self, "id", self.descriptor["id"])
+        set_attr(self, "version", next(Persona._versions))
+        set_attr(self, "_capabilities_names", _FrozenList(self.capabilities))
+        #Top level entries besides descriptor and capabilities are rare, so they only cost memory when present
+        extra = {key: value for key, value in data.items() if key not in ("descriptor", "capabilities")}
+        set_attr(self, "_extra", _freeze(extra) if extra else None)
+
+        if validate:
+            self._validatePersona()
+
+    @property
+    def data(self):
+        """
+        :return: Read-only view of the whole persona
+        """
+        data = {"descriptor": self.descriptor, "capabilities": self.capabilities}
+        if self._extra is not None:
+            data.update(self._extra)
+        return MappingProxyType(data)
+
+    def toData(self) -> dict:
+        """
+        :return: Plain (JSON serializable) persona dict - Persona.fromData(pers.toData()) gives the same persona
+        """
+        return _thaw(self.data)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"Persona is immutable - cannot set {key}")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"Persona is immutable - cannot delete {key}")
+
+    def __reduce__(self):
+        #Mapping proxies can't be pickled, so we go through the plain dict
+        return (Persona.fromData, (self.toData(),))
 
     def getID(self):
-        return copy.copy(self.id)
+        return self.id
+
+    def getVersion(self) -> int:
+        """
+        :return: Version stamp of this persona - unique within the process, newer personas have higher versions
+        """
+        return self.version
 
     def getTypeString(self):
         return self.type.type_str
 
     # Get all the types of this and previous generations
-    def getTypeTree(self) -> list:
+    def getTypeTree(self) -> tuple:
         return self.type.type_tree
 
     def _validateDescriptor(self):
@@ -94,24 +396,42 @@ class Persona:
                 if(type(variable) == dict):
                     raise ValueError("Dictionaries are not as a part of a descriptor in the current iteration of LIROS")
 
+    def _validateCapabilities(self):
+        #Only the structure every capability template shares - components.schema checks the fields of each template
+        if not isinstance(self.capabilities, Mapping):
+            raise ValueError(f"The capabilities of {self.id} must be a dict, not {type(self.capabilities).__name__}")
+        for name, capability in self.capabilities.items():
+            if not isinstance(capability, Mapping) or not isinstance(capability.get("type", None), str):
+                raise ValueError(f"Capability {name} of {self.id} must be a dict with a string type")
+
     def _validatePersona(self):
         self._validateDescriptor()
-        #TODO: Add tests for the capabilities
+        self._validateCapabilities()
 
     def getDescriptor(self):
         """
-        :return: Copy of descriptor
+        :return: Read-only view of the descriptor
         """
-        return copy.copy(self.descriptor)
+        return self.descriptor
 
     def getCapabilities(self):
         """
-        :return: Copy of capabilities
+        :return: Read-only view of the capabilities
         """
-        return copy.copy(self.capabilities)
+        return self.capabilities
 
     def getCapabilitiesNames(self):
-        return list(self.getCapabilities())
+        """
+        :return: Read-only list of the capability names, computed once
+        """
+        return self._capabilities_names
+
+    def diff(self, other):
+        """
+        :param other: The edited persona
+        :return: PersonaDiff from this persona to other
+        """
+        return PersonaDiff(self, other)
 
     #CHATGPT Generated Code - Works as expected!
     def __repr__(self):
@@ -133,7 +453,7 @@ class Persona:
         lines.append("\nCapabilities:")
         for name, details in capabilities.items():
             # If capability is a dict, flatten it nicely
-            if isinstance(details, dict):
+            if isinstance(details, Mapping):
                 lines.append(f"  {name:15} :")
                 for k, v in details.items():
                     lines.append(f"    {k:13} -> {v}")
@@ -142,14 +462,191 @@ class Persona:
 
         return "\n".join(lines)
 
+def _sameValue(a, b):
+    #1 == True, but only one of them is in the bool ids of the registry
+    return a is b or (type(a) is type(b) and a == b)
+
+
+class PersonaDiff:
+
+    """
+    What changed between two versions of a persona - missing entries are None on their side, as criteria see them.
+    """
+
+    __slots__ = ("old", "new", "descriptor", "capabilities", "names_changed", "extra_changed")
+
+    def __init__(self, old: Persona, new: Persona):
+        self.old = old
+        self.new = new
+        #descriptor key -> (old value, new value)
+        self.descriptor = {key: (old.descriptor.get(key, None), new.descriptor.get(key, None))
+                           for key in old.descriptor.keys() | new.descriptor.keys()
+                           if not _sameValue(old.descriptor.get(key, None), new.descriptor.get(key, None))}
+        #capability name -> (old capability, new capability)
+        self.capabilities = {name: (old.capabilities.get(name, None), new.capabilities.get(name, None))
+                             for name in old.capabilities.keys() | new.capabilities.keys()
+                             if old.capabilities.get(name, None) != new.capabilities.get(name, None)}
+        #The ordered list of names is indexed on its own, so reordering counts as a change
+        self.names_changed = old.getCapabilitiesNames() != new.getCapabilitiesNames()
+        self.extra_changed = old._extra != new._extra
+
+    def __bool__(self):
+        return bool(self.descriptor or self.capabilities or self.names_changed or self.extra_changed)
+
+    def __repr__(self):
+        return (f"PersonaDiff({self.new.getID()!r}, descriptor={sorted(self.descriptor)}, "
+                f"capabilities={sorted(self.capabilities)}, names_changed={self.names_changed})")
+
+
 class CriteriaOperator(Enum):
     EQ = "eq"
     IN = "in"
+    GT = "gt"
+    GE = "ge"
+    LT = "lt"
+    LE = "le"
+    #Inclusive on both ends, the criterion value is [low, high]
+    BETWEEN = "between"
+
+RANGE_OPERATORS = frozenset({CriteriaOperator.GT, CriteriaOperator.GE, CriteriaOperator.LT, CriteriaOperator.LE,
+                             CriteriaOperator.BETWEEN})
+
+
+def _isNumber(value):
+    #bool is an int, but True is not a wavelength - and NaN can't be ordered
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+
+
+def _rangeBounds(operator, variable_crd):
+    """
+    :return: (low, low inclusive, high, high inclusive) of a range rule - None for an open end
+    """
+    if operator == CriteriaOperator.BETWEEN:
+        if not isinstance(variable_crd, (list, tuple)) or len(variable_crd) != 2:
+            raise ValueError(f"between needs [low, high], not {variable_crd}")
+        low, high = variable_crd
+        if not (_isNumber(low) and _isNumber(high)) or low > high:
+            raise ValueError(f"between needs two numbers with low <= high, not {variable_crd}")
+        return low, True, high, True
+
+    if not _isNumber(variable_crd):
+        raise ValueError(f"{operator.value} needs a number, not {variable_crd}")
+    return {
+        CriteriaOperator.GT: (variable_crd, False, None, False),
+        CriteriaOperator.GE: (variable_crd, True, None, False),
+        CriteriaOperator.LT: (None, False, variable_crd, False),
+        CriteriaOperator.LE: (None, False, variable_crd, True),
+    }[operator]
+
+
+def _rangePredicate(operator, variable_crd):
+    """
+    :return: Predicate of a range rule - values that are not numbers never match
+    """
+    low, low_inclusive, high, high_inclusive = _rangeBounds(operator, variable_crd)
+
+    def predicate(variable_D):
+        if not _isNumber(variable_D):
+            return False
+        if low is not None and (variable_D < low if low_inclusive else variable_D <= low):
+            return False
+        if high is not None and (variable_D > high if high_inclusive else variable_D >= high):
+            return False
+        return True
+
+    return predicate
+
+
+def _canonicalValue(value):
+    """
+    :return: Hashable form of a criterion value - values with equal forms give equal results.
+        Lists and tuples stay apart (a persona's lists only equal lists), as do bools and numbers
+    """
+    if isinstance(value, bool):
+        return (bool, value)
+    if isinstance(value, (list, _FrozenList)):
+        return (list, tuple(_canonicalValue(item) for item in value))
+    if isinstance(value, tuple):
+        return (tuple, tuple(_canonicalValue(item) for item in value))
+    if isinstance(value, Mapping):
+        #Criteria iteralize mappings to their items, in order
+        return (dict, tuple((key, _canonicalValue(item)) for key, item in value.items()))
+    #Strings, numbers, None and the interned Types
+    return value
+
+
+def _firstItem(item):
+    return item[0]
+
+
+def _operatorName(operator):
+    #Unknown operators only make a key that matches nothing else, the checks raise on them
+    return operator.value if isinstance(operator, CriteriaOperator) else operator
+
 
 class Criterion:
 
     def __init__(self, criteria_dict):
         self.criteria_dict = criteria_dict
+        self._compiled = None
+        self._key = None
+        self._hash = None
+
+    def key(self) -> tuple:
+        """
+        Canonical form of the criteria dict - the order of rules and sections, and string or CriteriaOperator
+        operators, don't change it. Like the compiled plan it is computed once, so the criteria dict should not be
+        modified afterwards.
+
+        :return: Hashable tuple - criteria with equal keys give equal results for every persona
+        """
+        if self._key is None:
+            sections = []
+            for section, rules in self.criteria_dict.items():
+                if section == "descriptor":
+                    canonical = []
+                    for key_crd, rule in rules.items():
+                        #Only the first operator of a rule is used
+                        operator, variable_crd = next(iter(rule.items()))
+                        canonical.append((key_crd, (_operatorName(operator), _canonicalValue(variable_crd))))
+                elif section == "capabilities":
+                    canonical = [(_operatorName(op_key), _canonicalValue(crit_cap_names))
+                                 for op_key, crit_cap_names in rules.items()]
+                else:
+                    sections.append((section, _canonicalValue(rules)))
+                    continue
+                #Every rule has to pass, so their order doesn't matter
+                sections.append((section, tuple(sorted(canonical, key=_firstItem))))
+            self._key = tuple(sorted(sections, key=_firstItem))
+        return self._key
+
+    def __eq__(self, other):
+        if not isinstance(other, Criterion):
+            return NotImplemented
+        return self is other or self.key() == other.key()
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self.key())
+        return self._hash
+
+    def compile(self):
+        """
+        Parses the criteria dict once into a flat predicate plan, see CompiledCriterion.
+        The plan is cached, so the criteria dict should not be modified after compiling.
+
+        :return: The CompiledCriterion of this criterion
+        """
+        if self._compiled is None:
+            self._compiled = CompiledCriterion(self)
+        return self._compiled
+
+    def plan(self, statistics):
+        """
+        :param statistics: PersonaStatistics of the personas that will be checked
+        :return: A new CompiledCriterion whose sub-checks are ordered by estimated cost and selectivity
+        """
+        return CompiledCriterion(self).reorder(statistics)
 
     """
     Wrapper to use the check directly on component rather than persona level.
@@ -179,6 +676,19 @@ class Criterion:
 
         return True
 
+    def checkMany(self, personas):
+        """
+        Checks a whole population at once through a columnar view, see PersonaColumns.
+
+        :param personas: Iterable of personas, or a PersonaColumns to reuse over repeated sweeps of the same population
+        :return: Boolean NumPy mask - True where checkPersona would return True
+        """
+        #NumPy is only needed for batch checks
+        from .columnar import PersonaColumns
+
+        columns = personas if isinstance(personas, PersonaColumns) else PersonaColumns(personas)
+        return columns.evaluate(self)
+
     def _parseOperator(self, rule):
         #Ensures that it doesn't matter whether we use string or Enum
         operator, crit_value = next(iter(rule.items()))
@@ -189,7 +699,7 @@ class Criterion:
     def _iteralize(self,obj):
         if isinstance(obj, (list, tuple,str)):
             return obj
-        elif isinstance(obj, (dict)):
+        elif isinstance(obj, Mapping):
             #By using list we match the formal definition
             # + We don't get a runtime error if the underlying dict changes :)
             return list(obj.items())
@@ -220,9 +730,12 @@ class Criterion:
                 #Substring search is ordered
                 return a in b
 
-            n = len(a)
-            #We sadly have to do a O(m*n) check
-            return n == 0 or any(b[i:i + n] == a for i in range(len(b) - n + 1))
+            #A string is never an ordered sub-path of a type tree, nor the other way around
+            if isinstance(a, str) or isinstance(b, str):
+                return len(a) == 0
+
+            #Knuth-Morris-Pratt keeps the ordered check linear
+            return _kmpContains(a, b)
         else:
             return all(val in b for val in a)
 
@@ -250,6 +763,10 @@ class Criterion:
                 if not variable_D == variable_crd:
                     return False
 
+            elif(operator in RANGE_OPERATORS):
+                if not _rangePredicate(operator, variable_crd)(variable_D):
+                    return False
+
         return True
 
     """
@@ -322,3 +839,835 @@ class Criterion:
                 raise ValueError(f"Unsupported operator for criterion match: {operator}")
 
         return True
+
+
+class CompiledCriterion:
+
+    """
+    Flat predicate plan of a Criterion - gives the same results as Criterion.checkPersona.
+
+    Operators are parsed and the criterion side of every rule is iteralized once, when compiling.
+    A check is then a walk over (key, predicate) pairs, so the criteria dict is never looked at again.
+
+    checkPersona walks descriptor and capabilities rules as one plan - as written, descriptor first, until reorder puts
+    the cheap and selective rules first. After trackExits it counts at which step personas are rejected, see exitStats.
+    """
+
+    #Relative cost of the predicates, see _ruleCost
+    EQ_COST = 1.0
+    IN_COST = 2.0
+
+    def __init__(self, criterion: Criterion):
+        self.criterion = criterion
+        crit = criterion.criteria_dict
+
+        #Each rule is (key, operator, criterion value, predicate) - the predicate takes the persona's value
+        self.descriptor_rules = [self._compileDescriptorRule(key_crd, rule)
+                                 for key_crd, rule in crit.get("descriptor", {}).items()]
+
+        #Each rule is (operator, criterion names, predicate) - the predicate takes the list of capability names
+        self.capabilities_rules = [self._compileCapabilitiesRule(op_key, crit_cap_names)
+                                   for op_key, crit_cap_names in crit.get("capabilities", {}).items()]
+
+        #The hot loops only need the predicates
+        self._descriptor_plan = [(key_crd, predicate) for key_crd, _, _, predicate in self.descriptor_rules]
+        self._capabilities_plan = [predicate for _, _, predicate in self.capabilities_rules]
+
+        #Steps of checkPersona - the key is None for capabilities rules, whose predicate takes the capability names
+        self._plan = self._descriptor_plan + [(None, predicate) for predicate in self._capabilities_plan]
+        #(rule, cost, selectivity) per step, once reordered
+        self.estimates = None
+        #Estimated cost of a check that passes every step, see CriterionCache
+        self.cost = sum(self._ruleCost(operator, variable_crd) for _, operator, variable_crd, _ in self.descriptor_rules)
+        self.cost += sum(self._capabilitiesCost(operator, crit_cap_names)
+                         for operator, crit_cap_names, _ in self.capabilities_rules)
+        #The key and hash of the criterion are computed once, so cache lookups through the plan don't redo them
+        hash(criterion)
+        self._exits_lock = threading.Lock()
+        self.resetExitStats()
+
+    def _compileDescriptorRule(self, key_crd, rule):
+        operator, variable_crd = self.criterion._parseOperator(rule)
+
+        if operator == CriteriaOperator.IN:
+            predicate = self._compileIn(variable_crd)
+
+        elif operator == CriteriaOperator.EQ:
+            def predicate(variable_D, variable_crd=variable_crd):
+                return variable_D == variable_crd
+
+        elif operator in RANGE_OPERATORS:
+            predicate = _rangePredicate(operator, variable_crd)
+
+        else:
+            raise ValueError(f"Unsupported operator for descriptor match: {operator}")
+
+        return key_crd, operator, variable_crd, predicate
+
+    def _compileIn(self, variable_crd):
+        #The criterion side is normalized once - the persona side still depends on the persona
+        iteralize = self.criterion._iteralize
+        variable_crd_iter = iteralize(variable_crd)
+        crd_is_str = isinstance(variable_crd_iter, str)
+        crd_is_empty = len(variable_crd_iter) == 0
+        #The failure table only depends on the criterion
+        table = None if crd_is_str else _kmpTable(variable_crd_iter)
+
+        def predicate(variable_D):
+            #Strings and types are ordered, see Criterion._containsSuper
+            if isinstance(variable_D, str):
+                if crd_is_str:
+                    return variable_crd_iter in variable_D
+                return crd_is_empty
+
+            if isinstance(variable_D, Type):
+                if crd_is_str:
+                    return crd_is_empty
+                return _kmpContains(variable_crd_iter, variable_D.type_tree, table)
+
+            variable_D_iter = iteralize(variable_D)
+            return all(val in variable_D_iter for val in variable_crd_iter)
+
+        return predicate
+
+    def _compileCapabilitiesRule(self, op_key, crit_cap_names):
+        operator, _ = self.criterion._parseOperator({op_key: crit_cap_names})
+
+        if operator == CriteriaOperator.IN:
+            names = tuple(crit_cap_names)
+
+            def predicate(cap_names):
+                return all(name in cap_names for name in names)
+
+        elif operator == CriteriaOperator.EQ:
+            #Eq is an ordered comparison with the list of capability names
+            def predicate(cap_names):
+                return crit_cap_names == cap_names
+
+        else:
+            raise ValueError(f"Unsupported operator for criterion match: {operator}")
+
+        return operator, crit_cap_names, predicate
+
+    def checkComponent(self, comp):
+        return self.checkPersona(comp.getPersona())
+
+    def checkPersona(self, pers: Persona):
+        """
+        :param pers: The persona to be checked according to the compiled criteria.
+        :return: True if none of the sub-checks return false.
+        """
+        desc_pers = pers.getDescriptor()
+
+        for key_crd, predicate in self._plan:
+            if key_crd is None:
+                variable_D = pers.getCapabilitiesNames()
+            else:
+                variable_D = desc_pers.get(key_crd, None)
+
+            if variable_D is None or not predicate(variable_D):
+                return False
+
+        return True
+
+    def _rejectingStep(self, pers: Persona):
+        """
+        :return: The step of the plan that rejects the persona, None if it passes every step
+        """
+        desc_pers = pers.getDescriptor()
+
+        for step, (key_crd, predicate) in enumerate(self._plan):
+            if key_crd is None:
+                variable_D = pers.getCapabilitiesNames()
+            else:
+                variable_D = desc_pers.get(key_crd, None)
+
+            if variable_D is None or not predicate(variable_D):
+                return step
+
+        return None
+
+    def _trackedCheckPersona(self, pers: Persona):
+        step = self._rejectingStep(pers)
+        #A plan is shared by the threads that query the registry
+        with self._exits_lock:
+            self.checks += 1
+            if step is not None:
+                self.rejections[step] += 1
+        return step is None
+
+    def trackExits(self, enabled: bool = True):
+        """
+        Counts the exits of checkPersona from now on, see exitStats - untracked checks cost nothing extra.
+        Meant for the planner benchmark and tests: a tracked plan is not timed by metrics.enable.
+        """
+        self.resetExitStats()
+        if enabled:
+            self.checkPersona = self._trackedCheckPersona
+        else:
+            self.__dict__.pop("checkPersona", None)
+
+    def resetExitStats(self):
+        with self._exits_lock:
+            self.checks = 0
+            #Number of personas rejected at each step of the plan
+            self.rejections = [0] * len(self._plan)
+
+    def exitStats(self) -> dict:
+        """
+        :return: Counters of checkPersona since trackExits - early_exit_rate is the share of the rejections made by
+            the first step, mean_steps the average number of predicates evaluated per check
+        """
+        rejected = sum(self.rejections)
+        accepted = self.checks - rejected
+        steps = sum((step + 1) * count for step, count in enumerate(self.rejections)) + accepted * len(self._plan)
+        return {
+            "checks": self.checks,
+            "rejections": rejected,
+            "rejections_per_step": list(self.rejections),
+            "early_exit_rate": self.rejections[0] / rejected if rejected else 0.0,
+            "mean_steps": steps / self.checks if self.checks else 0.0,
+        }
+
+    @classmethod
+    def _ruleCost(cls, operator, variable_crd) -> float:
+        if operator == CriteriaOperator.EQ or operator in RANGE_OPERATORS:
+            return cls.EQ_COST
+        if isinstance(variable_crd, str):
+            return cls.IN_COST
+        #Ordered sub-path and subset checks grow with the criterion side
+        if isinstance(variable_crd, Type):
+            return cls.IN_COST + len(variable_crd.type_tree)
+        if isinstance(variable_crd, (list, tuple, Mapping)):
+            return cls.IN_COST + len(variable_crd)
+        #Primitives are iteralized to a single value
+        return cls.IN_COST + 1
+
+    @classmethod
+    def _capabilitiesCost(cls, operator, crit_cap_names) -> float:
+        return cls.EQ_COST if operator == CriteriaOperator.EQ else cls.IN_COST + len(crit_cap_names)
+
+    def reorder(self, statistics):
+        """
+        Orders the steps of checkPersona by cost / (1 - selectivity) - for independent checks this minimizes the
+        expected cost, and the most rejections happen on the first, cheapest check.
+
+        :param statistics: PersonaStatistics of the personas that will be checked
+        :return: self
+        """
+        steps = []
+        for key_crd, operator, variable_crd, predicate in self.descriptor_rules:
+            selectivity = statistics.descriptorSelectivity(key_crd, operator, variable_crd, predicate)
+            steps.append(((key_crd, operator.value), self._ruleCost(operator, variable_crd), selectivity,
+                          (key_crd, predicate)))
+        for operator, crit_cap_names, predicate in self.capabilities_rules:
+            selectivity = statistics.capabilitiesSelectivity(predicate)
+            steps.append((("capabilities", operator.value), self._capabilitiesCost(operator, crit_cap_names),
+                          selectivity, (None, predicate)))
+
+        #Rules every persona passes go last, stable otherwise
+        steps.sort(key=lambda step: step[1] / (1.0 - step[2]) if step[2] < 1.0 else float("inf"))
+        self._plan = [step[3] for step in steps]
+        self.estimates = [step[:3] for step in steps]
+        self.resetExitStats()
+        return self
+
+    def checkDescriptor(self, pers: Persona):
+        desc_pers = pers.getDescriptor()
+
+        for key_crd, predicate in self._descriptor_plan:
+            variable_D = desc_pers.get(key_crd, None)
+
+            if variable_D is None or not predicate(variable_D):
+                return False
+
+        return True
+
+    def checkCapabilities(self, pers: Persona):
+        cap_names = pers.getCapabilitiesNames()
+
+        for predicate in self._capabilities_plan:
+            if not predicate(cap_names):
+                return False
+
+        return True
+
+
+class CriterionCache:
+
+    """
+    Bounded LRU cache of criterion results in front of checkPersona, keyed by (criterion, persona id, persona version).
+
+    Criteria are keyed by their canonical form, see Criterion.key, so equal criteria built apart share their results.
+    The key is computed once per compiled plan - pass the same Criterion or plan again, a Criterion built for every
+    check pays for its compile. A lookup costs about as much as a check of a few rules, so plans whose estimated cost is
+    below min_cost are checked directly and never cached.
+    A reloaded persona is a new Persona with a new version, so results of the old one are never returned - invalidate
+    only frees their entries before they are evicted.
+    """
+
+    #In units of CompiledCriterion.cost - a hit costs about as much as checking a plan this expensive
+    MIN_COST = 10.0
+
+    def __init__(self, max_size: int = 4096, min_cost: float = MIN_COST):
+        """
+        :param max_size: Number of cached results - the least recently used is evicted first
+        :param min_cost: Plans with a lower CompiledCriterion.cost are checked without the cache
+        """
+        if max_size <= 0:
+            raise ValueError(f"max_size must be positive, not {max_size}")
+        self.max_size = max_size
+        self.min_cost = min_cost
+        #(criterion, persona id, version) -> result
+        self._results = OrderedDict()
+        #persona id -> keys of its cached results
+        self._keys_by_id = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def checkPersona(self, criterion, pers: Persona) -> bool:
+        """
+        :param criterion: Criterion or CompiledCriterion - a miss is checked by the compiled plan
+        :return: The result of criterion.checkPersona(pers)
+        """
+        compiled = criterion if isinstance(criterion, CompiledCriterion) else criterion.compile()
+        if compiled.cost < self.min_cost:
+            return compiled.checkPersona(pers)
+        key = (compiled.criterion, pers.id, pers.version)
+
+        with self._lock:
+            result = self._results.get(key, None)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        #Checked outside the lock - two threads missing the same key both check, and store the same result
+        result = bool(compiled.checkPersona(pers))
+        with self._lock:
+            if key not in self._results:
+                self._results[key] = result
+                self._keys_by_id.setdefault(pers.id, set()).add(key)
+                if len(self._results) > self.max_size:
+                    self._discard(self._results.popitem(last=False)[0])
+                    self.evictions += 1
+        return result
+
+    def checkComponent(self, criterion, comp) -> bool:
+        return self.checkPersona(criterion, comp.getPersona())
+
+    def _discard(self, key):
+        keys = self._keys_by_id[key[1]]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_id[key[1]]
+
+    def invalidate(self, pers_id=None) -> int:
+        """
+        :param pers_id: Persona whose results are dropped, all results if None
+        :return: Number of dropped results
+        """
+        with self._lock:
+            if pers_id is None:
+                dropped = len(self._results)
+                self._results.clear()
+                self._keys_by_id.clear()
+            else:
+                keys = self._keys_by_id.pop(pers_id, ())
+                for key in keys:
+                    del self._results[key]
+                dropped = len(keys)
+            self.invalidations += dropped
+            return dropped
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._results), "max_size": self.max_size, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "invalidations": self.invalidations,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class PersonaStatistics:
+
+    """
+    Value frequencies of a population of personas - used to estimate the share of personas passing a rule.
+    """
+
+    #Above this many distinct values a rule's selectivity is estimated from a sample of them
+    MAX_COUNTED_VALUES = 512
+    #Selectivity assumed when there is nothing to count
+    DEFAULT_SELECTIVITY = 0.5
+
+    def __init__(self, personas=()):
+        self.count = 0
+        #descriptor key -> index key of value -> [representative value, number of personas]
+        self.values = {}
+        #descriptor key -> number of personas with a value that can't be indexed
+        self.unindexed = {}
+        #list of capability names -> number of personas
+        self.capability_lists = {}
+
+        for pers in personas:
+            self.add(pers)
+
+    @classmethod
+    def fromRegistry(cls, registry):
+        """
+        :return: Statistics read off the indexes of the registry, without looking at any persona
+        """
+        stats = cls()
+        stats.count = len(registry)
+        stats.values = {key: {index_key: [bucket[0], len(bucket[1])] for index_key, bucket in values.items()}
+                        for key, values in registry._descriptor_index.items()}
+        stats.unindexed = {key: len(ids) for key, ids in registry._unindexed.items()}
+        stats.capability_lists = {names: len(ids) for names, ids in registry._capability_names_index.items()}
+        return stats
+
+    def add(self, pers: Persona):
+        self.count += 1
+        for key, value in pers.descriptor.items():
+            if value is None:
+                continue
+            index_key = PersonaRegistry._indexKey(value)
+            if index_key is None:
+                self.unindexed[key] = self.unindexed.get(key, 0) + 1
+            else:
+                self.values.setdefault(key, {}).setdefault(index_key, [value, 0])[1] += 1
+        names = pers.getCapabilitiesNames()
+        self.capability_lists[names] = self.capability_lists.get(names, 0) + 1
+
+    def _share(self, buckets, predicate) -> float:
+        """
+        :param buckets: Collection of (value, number of personas)
+        :return: Share of the personas in buckets whose value passes the predicate
+        """
+        total = sum(count for _, count in buckets)
+        if total == 0:
+            return 0.0
+        if len(buckets) > self.MAX_COUNTED_VALUES:
+            buckets = list(itertools.islice(buckets, self.MAX_COUNTED_VALUES))
+            sampled = sum(count for _, count in buckets)
+            return sum(count for value, count in buckets if predicate(value)) / sampled * total / self.count
+        #The predicate runs once per distinct value, not once per persona
+        return sum(count for value, count in buckets if predicate(value)) / self.count
+
+    def descriptorSelectivity(self, key_crd, operator, variable_crd, predicate) -> float:
+        """
+        :param operator, variable_crd, predicate: A rule of a compiled criterion
+        :return: Estimated share of the personas passing the rule
+        """
+        if self.count == 0:
+            return self.DEFAULT_SELECTIVITY
+
+        values = self.values.get(key_crd, {})
+        unindexed = self.DEFAULT_SELECTIVITY * self.unindexed.get(key_crd, 0) / self.count
+
+        if operator == CriteriaOperator.EQ:
+            index_key = PersonaRegistry._indexKey(variable_crd)
+            if index_key is not None:
+                bucket = values.get(index_key, None)
+                return (0 if bucket is None else bucket[1]) / self.count + unindexed
+
+        return self._share(values.values(), predicate) + unindexed
+
+    def capabilitiesSelectivity(self, predicate) -> float:
+        """
+        :param predicate: Predicate of a compiled capabilities rule
+        :return: Estimated share of the personas passing the rule
+        """
+        if self.count == 0:
+            return self.DEFAULT_SELECTIVITY
+        return self._share(self.capability_lists.items(), predicate)
+
+
+class PersonaRegistry:
+
+    """
+    Holds many personas and answers Criterion queries through inverted indexes.
+
+    Every rule of the compiled criterion is turned into a set of candidate ids using the indexes.
+    The sets are intersected, smallest first, before any persona is looked at.
+    Only personas whose value for a rule's key could not be indexed (e.g. dicts) get a residual check.
+    """
+
+    _EMPTY = frozenset()
+
+    def __init__(self, personas=()):
+        #persona id -> persona
+        self._personas = {}
+        #descriptor key -> index key of value -> [representative value, ids]
+        self._descriptor_index = {}
+        #descriptor key -> ids whose value is unhashable and therefore not in _descriptor_index
+        self._unindexed = {}
+        #capability name -> ids
+        self._capability_index = {}
+        #list of capability names (in order, as returned by getCapabilitiesNames) -> ids
+        self._capability_names_index = {}
+        #type prefix -> ids, see TypeTrie
+        self._type_trie = TypeTrie()
+        #descriptor key -> (sorted distinct numbers, their id sets) - built on the first range query on the key
+        self._sorted_index = {}
+        #descriptor key -> ids whose value is a bool - True shares its bucket with 1, but never matches a range
+        self._bool_ids = {}
+        #PersonaColumns of the registered personas, built on the first evaluate()
+        self._columns = None
+        #PersonaStatistics of the registered personas, built on the first plan()
+        self._statistics = None
+
+        for pers in personas:
+            self.register(pers)
+
+    @classmethod
+    def fromBundle(cls, bundle_path: str, pers_ids=None):
+        """
+        :param bundle_path: Persona bundle, see components.bundle
+        :param pers_ids: Ids of the personas to register - only these are decoded. All personas of the bundle if None
+        :return: Registry of the personas
+        """
+        from .bundle import PersonaBundle
+
+        bundle = PersonaBundle.open(bundle_path)
+        return cls(bundle.get(pers_id) for pers_id in (bundle.ids() if pers_ids is None else pers_ids))
+
+    def __len__(self):
+        return len(self._personas)
+
+    def __contains__(self, pers_id):
+        return pers_id in self._personas
+
+    def __iter__(self):
+        return iter(self._personas.values())
+
+    def get(self, pers_id):
+        return self._personas.get(pers_id, None)
+
+    def underType(self, prefix):
+        """
+        :param prefix: Type or type tree, e.g. Type("base/device")
+        :return: List of all registered personas whose type starts with prefix
+        """
+        return [self._personas[pers_id] for pers_id in self._type_trie.subtree(prefix)]
+
+    @staticmethod
+    def _indexKey(value):
+        """
+        :return: A hashable key, where equal keys imply equal values - None if the value can't be indexed
+        """
+        if isinstance(value, (list, _FrozenList)):
+            #A frozen list compares like the list it was loaded from
+            key = (list, tuple(value))
+        elif isinstance(value, tuple):
+            key = (tuple, value)
+        elif isinstance(value, Mapping):
+            return None
+        else:
+            key = value
+
+        try:
+            hash(key)
+        except TypeError:
+            return None
+
+        return key
+
+    def register(self, pers: Persona):
+        pers_id = pers.getID()
+        if pers_id in self._personas:
+            raise ValueError(f"A persona with the id {pers_id} is already registered")
+
+        self._personas[pers_id] = pers
+        self._columns = None
+        self._statistics = None
+
+        for key, value in pers.descriptor.items():
+            self._indexValue(key, value, pers_id)
+
+        for name in pers.capabilities:
+            self._capability_index.setdefault(name, set()).add(pers_id)
+        self._capability_names_index.setdefault(pers.getCapabilitiesNames(), set()).add(pers_id)
+
+        self._type_trie.add(pers.type, pers_id)
+
+    def unregister(self, pers_id):
+        """
+        :return: The removed persona
+        """
+        pers = self._personas.pop(pers_id)
+        self._columns = None
+        self._statistics = None
+
+        for key, value in pers.descriptor.items():
+            self._unindexValue(key, value, pers_id)
+
+        for name in pers.capabilities:
+            self._discardId(self._capability_index, name, pers_id)
+        self._discardId(self._capability_names_index, pers.getCapabilitiesNames(), pers_id)
+
+        self._type_trie.discard(pers.type, pers_id)
+
+        return pers
+
+    def update(self, pers: Persona):
+        """
+        Replaces the registered persona with the same id by an edited version. Only the index entries of the changed
+        descriptor values and capabilities are touched, the cached columns only lose the columns of changed keys.
+
+        :return: PersonaDiff from the registered persona to pers
+        """
+        pers_id = pers.getID()
+        old = self._personas.get(pers_id, None)
+        if old is None:
+            raise ValueError(f"No persona with the id {pers_id} is registered")
+
+        diff = old.diff(pers)
+        self._personas[pers_id] = pers
+        if self._columns is not None:
+            self._columns.replace(pers, diff)
+        if not diff:
+            return diff
+        self._statistics = None
+
+        for key, (old_value, new_value) in diff.descriptor.items():
+            self._unindexValue(key, old_value, pers_id)
+            self._indexValue(key, new_value, pers_id)
+        if "type" in diff.descriptor:
+            self._type_trie.discard(old.type, pers_id)
+            self._type_trie.add(pers.type, pers_id)
+
+        for name, (old_capability, new_capability) in diff.capabilities.items():
+            #A changed capability keeps its name, so only added and removed names move
+            if new_capability is None:
+                self._discardId(self._capability_index, name, pers_id)
+            elif old_capability is None:
+                self._capability_index.setdefault(name, set()).add(pers_id)
+        if diff.names_changed:
+            self._discardId(self._capability_names_index, old.getCapabilitiesNames(), pers_id)
+            self._capability_names_index.setdefault(pers.getCapabilitiesNames(), set()).add(pers_id)
+
+        return diff
+
+    def _indexValue(self, key, value, pers_id):
+        #Criteria treat None as a missing key
+        if value is None:
+            return
+
+        index_key = self._indexKey(value)
+        if index_key is None:
+            self._unindexed.setdefault(key, set()).add(pers_id)
+            return
+
+        if isinstance(value, bool):
+            self._bool_ids.setdefault(key, set()).add(pers_id)
+
+        values = self._descriptor_index.setdefault(key, {})
+        bucket = values.get(index_key, None)
+        if bucket is None:
+            bucket = values[index_key] = [value, set()]
+            #The sorted index shares the id sets, so only new distinct values need to be inserted
+            if key in self._sorted_index and self._rangeValue(value) is not None:
+                numbers, id_sets = self._sorted_index[key]
+                position = bisect.bisect_left(numbers, value)
+                numbers.insert(position, self._rangeValue(value))
+                id_sets.insert(position, bucket[1])
+        bucket[1].add(pers_id)
+
+    def _unindexValue(self, key, value, pers_id):
+        if value is None:
+            return
+
+        index_key = self._indexKey(value)
+        if index_key is None:
+            self._discardId(self._unindexed, key, pers_id)
+            return
+
+        if isinstance(value, bool):
+            self._discardId(self._bool_ids, key, pers_id)
+
+        values = self._descriptor_index[key]
+        values[index_key][1].discard(pers_id)
+        if not values[index_key][1]:
+            del values[index_key]
+            if key in self._sorted_index and self._rangeValue(value) is not None:
+                numbers, id_sets = self._sorted_index[key]
+                position = bisect.bisect_left(numbers, value)
+                del numbers[position]
+                del id_sets[position]
+        if not values:
+            del self._descriptor_index[key]
+
+    @staticmethod
+    def _discardId(index, index_key, pers_id):
+        ids = index[index_key]
+        ids.discard(pers_id)
+        if not ids:
+            del index[index_key]
+
+    def columns(self):
+        """
+        :return: PersonaColumns of the registered personas, in registration order
+        """
+        if self._columns is None:
+            from .columnar import PersonaColumns
+            self._columns = PersonaColumns(self._personas.values())
+        return self._columns
+
+    def statistics(self):
+        """
+        :return: PersonaStatistics of the registered personas
+        """
+        if self._statistics is None:
+            self._statistics = PersonaStatistics.fromRegistry(self)
+        return self._statistics
+
+    def plan(self, criterion):
+        """
+        :param criterion: Criterion or CompiledCriterion
+        :return: A CompiledCriterion ordered for the registered personas, see CompiledCriterion.reorder
+        """
+        crit = criterion.criterion if isinstance(criterion, CompiledCriterion) else criterion
+        return crit.plan(self.statistics())
+
+    def evaluate(self, criterion):
+        """
+        Columnar counterpart of queryIDs, for sweeps over the whole fleet.
+
+        :return: NumPy array of the ids of the matching personas, in registration order
+        """
+        return self.columns().evaluateIDs(criterion)
+
+    def query(self, criterion):
+        """
+        :param criterion: Criterion or CompiledCriterion
+        :return: List of the registered personas matching the criterion (in no particular order)
+        """
+        return [self._personas[pers_id] for pers_id in self.queryIDs(criterion)]
+
+    def queryIDs(self, criterion):
+        """
+        :param criterion: Criterion or CompiledCriterion
+        :return: Set of the ids of the registered personas matching the criterion
+        """
+        compiled = criterion.compile() if isinstance(criterion, Criterion) else criterion
+
+        candidate_sets = []
+        residual = set()
+
+        for key_crd, operator, variable_crd, predicate in compiled.descriptor_rules:
+            ids = self._descriptorCandidates(key_crd, operator, variable_crd, predicate)
+            unindexed = self._unindexed.get(key_crd, None)
+            if unindexed:
+                ids = ids | unindexed
+                residual |= unindexed
+            candidate_sets.append(ids)
+
+        for operator, crit_cap_names, predicate in compiled.capabilities_rules:
+            candidate_sets.append(self._capabilitiesCandidates(operator, crit_cap_names, predicate))
+
+        if not candidate_sets:
+            return set(self._personas)
+
+        candidate_sets.sort(key=len)
+        candidates = set(candidate_sets[0])
+        for ids in candidate_sets[1:]:
+            if not candidates:
+                break
+            candidates &= ids
+
+        #The indexes are exact for everything else
+        if residual:
+            candidates = {pers_id for pers_id in candidates
+                          if pers_id not in residual or compiled.checkPersona(self._personas[pers_id])}
+
+        return candidates
+
+    def _descriptorCandidates(self, key_crd, operator, variable_crd, predicate):
+        values = self._descriptor_index.get(key_crd, None)
+        if values is None:
+            return self._EMPTY
+
+        if operator == CriteriaOperator.EQ:
+            index_key = self._indexKey(variable_crd)
+            if index_key is not None:
+                bucket = values.get(index_key, None)
+                return bucket[1] if bucket is not None else self._EMPTY
+
+        elif operator == CriteriaOperator.IN and key_crd == "type" and isinstance(variable_crd, (Type, list, tuple)):
+            return self._type_trie.containing(variable_crd)
+
+        elif operator in RANGE_OPERATORS:
+            return self._rangeCandidates(key_crd, operator, variable_crd)
+
+        #Fallback: the predicate is evaluated once per distinct value rather than once per persona
+        ids = set()
+        for value, value_ids in values.values():
+            if predicate(value):
+                ids |= value_ids
+        return ids
+
+    @staticmethod
+    def _rangeValue(value):
+        """
+        :return: The number a bucket with this representative value is sorted by, None if it is not a number
+        """
+        #A bucket of True may hold the ids of 1 as well, the bool ids themselves are removed after the search
+        if isinstance(value, bool):
+            return int(value)
+        return value if _isNumber(value) else None
+
+    def _sortedIndex(self, key_crd):
+        """
+        :return: (sorted distinct numbers of the key, id set of each number), kept up to date by (un)register
+        """
+        index = self._sorted_index.get(key_crd, None)
+        if index is None:
+            buckets = sorted(((self._rangeValue(bucket[0]), bucket[1])
+                              for bucket in self._descriptor_index.get(key_crd, {}).values()
+                              if self._rangeValue(bucket[0]) is not None), key=lambda bucket: bucket[0])
+            index = self._sorted_index[key_crd] = ([bucket[0] for bucket in buckets], [bucket[1] for bucket in buckets])
+        return index
+
+    def _rangeCandidates(self, key_crd, operator, variable_crd):
+        """
+        :return: Ids whose number lies in the range - two binary searches and a union of the id sets in between
+        """
+        low, low_inclusive, high, high_inclusive = _rangeBounds(operator, variable_crd)
+        numbers, id_sets = self._sortedIndex(key_crd)
+
+        start = 0
+        if low is not None:
+            start = (bisect.bisect_left if low_inclusive else bisect.bisect_right)(numbers, low)
+        stop = len(numbers)
+        if high is not None:
+            stop = (bisect.bisect_right if high_inclusive else bisect.bisect_left)(numbers, high)
+
+        if start >= stop:
+            return self._EMPTY
+        return set().union(*id_sets[start:stop]) - self._bool_ids.get(key_crd, self._EMPTY)
+
+    def _capabilitiesCandidates(self, operator, crit_cap_names, predicate):
+        if operator == CriteriaOperator.IN:
+            ids = None
+            for name in crit_cap_names:
+                name_ids = self._capability_index.get(name, self._EMPTY)
+                ids = set(name_ids) if ids is None else ids & name_ids
+                if not ids:
+                    return self._EMPTY
+            return set(self._personas) if ids is None else ids
+
+        if operator == CriteriaOperator.EQ and isinstance(crit_cap_names, list):
+            return self._capability_names_index.get(_FrozenList(crit_cap_names), self._EMPTY)
+
+        ids = set()
+        for cap_names, names_ids in self._capability_names_index.items():
+            if predicate(cap_names):
+                ids |= names_ids
+        return ids
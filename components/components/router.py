@@ -0,0 +1,317 @@
+"""
+Wires ROS endpoints from the capabilities of personas.
+
+Server side, CapabilityRouter builds the routing table of a persona and creates a service for every service capability
+with a handler and a publisher for every topic capability. Client side, ClientPool keeps one client per
+(persona, capability), created and discovered on first use and reused by every later call.
+
+Building the routing table needs no ROS - the interface types are only imported when an endpoint is created.
+"""
+import importlib
+import threading
+
+from .persona import Persona
+
+KIND_SERVICE = "service"
+KIND_TOPIC = "topic"
+
+#Capability type -> (interface field, channel field, interface module)
+_KINDS = {
+    KIND_SERVICE: ("srv_type", "request_channel", "srv"),
+    KIND_TOPIC: ("msg_type", "topic_channel", "msg"),
+}
+
+_interfaces = {}
+_interfaces_lock = threading.Lock()
+
+
+def import_interface(type_name: str, module_kind: str):
+    """
+    :param type_name: "package/Name" or "package/srv/Name"
+    :param module_kind: "srv" or "msg", used when type_name does not name it
+    :return: The generated interface class, e.g. interfaces.srv.SetLaserPower
+    """
+    with _interfaces_lock:
+        interface = _interfaces.get(type_name, None)
+    if interface is not None:
+        return interface
+
+    parts = type_name.split("/")
+    if len(parts) == 2:
+        module_name, name = f"{parts[0]}.{module_kind}", parts[1]
+    elif len(parts) == 3:
+        module_name, name = f"{parts[0]}.{parts[1]}", parts[2]
+    else:
+        raise ValueError(f"{type_name} is not an interface type - expected package/Name")
+
+    interface = getattr(importlib.import_module(module_name), name, None)
+    if interface is None:
+        raise ValueError(f"{module_name} has no interface {name}")
+
+    with _interfaces_lock:
+        return _interfaces.setdefault(type_name, interface)
+
+
+def call_service(client, request, timeout_s: float = None):
+    """
+    Calls the service and waits for the response - the node of the client must be spun by an executor on another
+    thread.
+
+    :param timeout_s: Seconds to wait for the response, wait forever if None
+    :return: The response
+    """
+    done = threading.Event()
+    future = client.call_async(request)
+    future.add_done_callback(lambda _: done.set())
+    if not done.wait(timeout_s):
+        client.remove_pending_request(future)
+        raise TimeoutError(f"No response from {client.srv_name} within {timeout_s} s")
+    return future.result()
+
+
+class Route:
+
+    """
+    One capability of a persona - its kind, interface type and the channel its endpoint lives on.
+    """
+
+    __slots__ = ("name", "kind", "type_name", "channel")
+
+    def __init__(self, name: str, kind: str, type_name: str, channel: str):
+        self.name = name
+        self.kind = kind
+        self.type_name = type_name
+        self.channel = channel
+
+    @property
+    def interface(self):
+        """
+        :return: The interface class, imported on first access
+        """
+        return import_interface(self.type_name, _KINDS[self.kind][2])
+
+    def __eq__(self, other):
+        if not isinstance(other, Route):
+            return NotImplemented
+        return (self.name, self.kind, self.type_name, self.channel) == (other.name, other.kind, other.type_name, other.channel)
+
+    def __hash__(self):
+        return hash((self.name, self.kind, self.type_name, self.channel))
+
+    def __repr__(self):
+        return f"Route({self.name!r}, {self.kind!r}, {self.type_name!r}, {self.channel!r})"
+
+
+def routing_table(pers: Persona) -> dict:
+    """
+    :return: Dict of capability name -> Route, for every capability of a known kind
+    """
+    table = {}
+    for name, capability in pers.getCapabilities().items():
+        kind = capability.get("type", None)
+        if kind not in _KINDS:
+            continue
+
+        type_field, channel_field, _ = _KINDS[kind]
+        if type_field not in capability or channel_field not in capability:
+            raise ValueError(f"Capability {name} of {pers.getID()} needs {type_field} and {channel_field}")
+        table[name] = Route(name, kind, capability[type_field], capability[channel_field])
+    return table
+
+
+class CapabilityRouter:
+
+    """
+    Creates the endpoints of the capabilities of a node's persona.
+    """
+
+    def __init__(self, node, pers: Persona = None):
+        """
+        :param node: The rclpy node the endpoints belong to
+        :param pers: Persona to route, the persona of node if None
+        """
+        self.node = node
+        self.persona = node.getPersona() if pers is None else pers
+        self.table = routing_table(self.persona)
+        self.services = {}
+        self.publishers = {}
+        #Arguments of the last wire, reused by reroute
+        self._wiring = None
+
+    def route(self, name: str) -> Route:
+        route = self.table.get(name, None)
+        if route is None:
+            raise ValueError(f"{self.persona.getID()} has no service or topic capability {name}")
+        return route
+
+    def serve(self, name: str, callback, callback_group=None):
+        """
+        :return: The service of the capability, created on the first call
+        """
+        service = self.services.get(name, None)
+        if service is None:
+            route = self.route(name)
+            if route.kind != KIND_SERVICE:
+                raise ValueError(f"Capability {name} of {self.persona.getID()} is a {route.kind}, not a service")
+            service = self.services[name] = self.node.create_service(route.interface, route.channel, callback,
+                                                                     callback_group=callback_group)
+        return service
+
+    def publisher(self, name: str, qos_profile=10):
+        """
+        :return: The publisher of the capability, created on the first call
+        """
+        publisher = self.publishers.get(name, None)
+        if publisher is None:
+            route = self.route(name)
+            if route.kind != KIND_TOPIC:
+                raise ValueError(f"Capability {name} of {self.persona.getID()} is a {route.kind}, not a topic")
+            publisher = self.publishers[name] = self.node.create_publisher(route.interface, route.channel, qos_profile)
+        return publisher
+
+    def wire(self, handlers: dict = None, callback_group=None, qos_profile=10, strict: bool = False, wrap=None):
+        """
+        Creates a publisher for every topic capability and a service for every service capability with a handler.
+        A handler is taken from handlers, or else is the method on<Name> of the node - onGetPower for getPower.
+
+        :param strict: Raise a ValueError for a service capability without handler instead of logging a warning
+        :param wrap: Callable (capability name, handler) -> handler applied to every handler, e.g. to time it
+        :return: self
+        """
+        self._wiring = ({} if handlers is None else handlers, callback_group, qos_profile, strict, wrap)
+        self._wireRoutes(self.table, *self._wiring)
+        return self
+
+    def _wireRoutes(self, names, handlers, callback_group, qos_profile, strict, wrap):
+        for name in names:
+            route = self.table[name]
+            if route.kind == KIND_TOPIC:
+                self.publisher(name, qos_profile)
+                continue
+
+            callback = handlers.get(name, None) or getattr(self.node, f"on{name[:1].upper()}{name[1:]}", None)
+            if callback is None:
+                message = f"No handler for service capability {name} of {self.persona.getID()}"
+                if strict:
+                    raise ValueError(message)
+                self.node.get_logger().warning(message)
+                continue
+            self.serve(name, callback if wrap is None else wrap(name, callback), callback_group)
+
+    def reroute(self, pers: Persona) -> set:
+        """
+        Moves the router to an edited version of its persona. Only the endpoints of added, removed or changed routes
+        are created or destroyed - the new ones are created before any old one is destroyed, so an error leaves the
+        router as it was.
+
+        :return: Names of the routes that changed
+        """
+        table = routing_table(pers)
+        changed = {name for name in self.table.keys() | table.keys() if self.table.get(name, None) != table.get(name, None)}
+
+        staged = CapabilityRouter(self.node, pers)
+        if self._wiring is not None:
+            try:
+                staged._wireRoutes(sorted(changed & table.keys()), *self._wiring)
+            except Exception:
+                staged.destroy()
+                raise
+
+        for name in changed:
+            if name in self.services:
+                self.node.destroy_service(self.services.pop(name))
+            if name in self.publishers:
+                self.node.destroy_publisher(self.publishers.pop(name))
+        self.services.update(staged.services)
+        self.publishers.update(staged.publishers)
+        self.persona = pers
+        self.table = table
+        return changed
+
+    def destroy(self):
+        for service in self.services.values():
+            self.node.destroy_service(service)
+        for publisher in self.publishers.values():
+            self.node.destroy_publisher(publisher)
+        self.services.clear()
+        self.publishers.clear()
+
+
+class ClientPool:
+
+    """
+    One service client per (persona, capability), created lazily and reused across calls - service discovery is
+    only waited for until a client has seen its service once.
+
+    The node must be spun by an executor on another thread for call to return.
+    """
+
+    def __init__(self, node, discovery_timeout_s: float = 5.0, callback_group=None):
+        self.node = node
+        self.discovery_timeout_s = discovery_timeout_s
+        self.callback_group = callback_group
+
+        self._lock = threading.Lock()
+        #(persona id, capability name) -> client
+        self._clients = {}
+        #Keys of the clients that found their service
+        self._ready = set()
+
+        self.created = 0
+        self.reused = 0
+
+    def __len__(self):
+        return len(self._clients)
+
+    def client(self, pers: Persona, name: str):
+        """
+        :return: The client of the service capability, waiting for the service if it was never seen
+        """
+        key = (pers.getID(), name)
+        with self._lock:
+            client = self._clients.get(key, None)
+            if client is None:
+                route = routing_table(pers).get(name, None)
+                if route is None or route.kind != KIND_SERVICE:
+                    raise ValueError(f"{pers.getID()} has no service capability {name}")
+                client = self._clients[key] = self.node.create_client(route.interface, route.channel,
+                                                                      callback_group=self.callback_group)
+                self.created += 1
+            else:
+                self.reused += 1
+            is_ready = key in self._ready
+
+        if not is_ready:
+            if not client.wait_for_service(timeout_sec=self.discovery_timeout_s):
+                raise TimeoutError(f"Service {client.srv_name} was not found within {self.discovery_timeout_s} s")
+            with self._lock:
+                self._ready.add(key)
+        return client
+
+    def callAsync(self, pers: Persona, name: str, request):
+        """
+        :return: The rclpy future of the response
+        """
+        return self.client(pers, name).call_async(request)
+
+    def call(self, pers: Persona, name: str, request, timeout_s: float = None):
+        """
+        :param timeout_s: Seconds to wait for the response, wait forever if None
+        :return: The response
+        """
+        return call_service(self.client(pers, name), request, timeout_s)
+
+    def release(self, pers_id=None):
+        """
+        Destroys the clients of one persona - after it went away or changed - or all clients if pers_id is None.
+        """
+        with self._lock:
+            keys = [key for key in self._clients if pers_id is None or key[0] == pers_id]
+            clients = [self._clients.pop(key) for key in keys]
+            self._ready.difference_update(keys)
+        for client in clients:
+            self.node.destroy_client(client)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"clients": len(self._clients), "created": self.created, "reused": self.reused}
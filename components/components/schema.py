@@ -0,0 +1,351 @@
+"""
+Validates personas against the jsonnet profiles they are compiled from.
+
+build_schema evaluates the capability templates and the profile hierarchy under interfaces/profiles into a plain dict:
+the fields every kind of capability must define, and per profile the descriptor fields and the capabilities it requires.
+SchemaValidator compiles that dict into one checking function per profile. A persona is checked by the profile with the
+longest type that is a prefix of its own, e.g. a base/device/laser/diode by the laser profile.
+
+validate_directory checks whole directories in a pool and caches pass/fail keyed by the SHA-256 of each file and the
+fingerprint of the schema, so unchanged files are not checked again on the next start. load_personas takes the same
+validator through its schema parameter.
+
+Only build_schema needs _jsonnet, and only when a profile changed since the schema was last built. A schema written by
+"python -m components.schema build --out" is loaded with json alone.
+"""
+import hashlib
+import json
+import os
+import time
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .loader import MIN_PARALLEL_FILES, _loadCache, _readFile, _saveCache
+
+DEFAULT_PROFILES_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "interfaces", "profiles")
+CACHE_FILE_NAME = ".persona_schema_cache.marshal"
+#Written to the profiles root, keyed by the SHA-256 of all jsonnet sources - evaluating them takes _jsonnet ~0.5 s
+SCHEMA_CACHE_FILE_NAME = ".persona_schema.json"
+TEMPLATE_SUFFIX = "_capability_template.jsonnet"
+PROFILE_SUFFIX = "_profile.jsonnet"
+
+#Evaluated with the profiles root as its directory. Only field names and the fields that don't depend on the persona
+#(its type, the interface type of a capability) are evaluated, the rest are errors until a persona defines them
+_SCHEMA_SNIPPET = """
+local templates = [{templates}];
+local profiles = {{{profiles}}};
+local interfaceFields(cap) = [key for key in std.objectFields(cap) if std.endsWith(key, "_type")];
+{{
+    kinds: {{[template.type]: std.objectFields(template) for template in templates}},
+    profiles: [
+        {{
+            file: file,
+            type: profiles[file].descriptor.type,
+            descriptor: std.objectFields(profiles[file].descriptor),
+            capabilities: {{
+                [name]: {{
+                    kind: profiles[file].capabilities[name].type,
+                    fixed: {{[key]: profiles[file].capabilities[name][key]
+                             for key in interfaceFields(profiles[file].capabilities[name])}}
+                }}
+                for name in std.objectFields(profiles[file].capabilities)
+            }}
+        }}
+        for file in std.objectFields(profiles)
+    ]
+}}
+"""
+
+
+def _jsonnetFiles(root, suffix):
+    return sorted(os.path.relpath(os.path.join(directory, name), root).replace(os.sep, "/")
+                  for directory, _, names in os.walk(root) for name in names if name.endswith(suffix))
+
+
+def _sourcesDigest(root) -> str:
+    digest = hashlib.sha256()
+    for path in _jsonnetFiles(root, ".jsonnet"):
+        with open(os.path.join(root, path), "rb") as f:
+            digest.update(path.encode("utf-8") + b"\0" + hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def build_schema(root=DEFAULT_PROFILES_ROOT, use_cache=True) -> dict:
+    """
+    :param root: Directory of the profiles - every *_capability_template.jsonnet and *_profile.jsonnet below it is used
+    :param use_cache: Set to False to evaluate the profiles even if none changed since the last build
+    :return: Schema dict {"kinds": {kind: [fields]}, "profiles": {type: {"file", "descriptor", "capabilities"}}}
+    """
+    root = os.path.abspath(root)
+    cache_path = os.path.join(root, SCHEMA_CACHE_FILE_NAME)
+    sources = _sourcesDigest(root)
+    if use_cache:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached["sources"] == sources:
+                return cached["schema"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    schema = _evaluateSchema(root)
+    if use_cache:
+        #A read-only checkout evaluates the profiles on every build instead
+        try:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"sources": sources, "schema": schema}, f)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+    return schema
+
+
+def _evaluateSchema(root) -> dict:
+    import _jsonnet
+
+    templates = _jsonnetFiles(root, TEMPLATE_SUFFIX)
+    profiles = _jsonnetFiles(root, PROFILE_SUFFIX)
+    snippet = _SCHEMA_SNIPPET.format(
+        templates=", ".join(f"import {json.dumps(path)}" for path in templates),
+        profiles=", ".join(f"{json.dumps(path)}: import {json.dumps(path)}" for path in profiles))
+    evaluated = json.loads(_jsonnet.evaluate_snippet(os.path.join(root, "schema.jsonnet"), snippet))
+
+    schema = {"kinds": evaluated["kinds"], "profiles": {}}
+    for profile in evaluated["profiles"]:
+        other = schema["profiles"].get(profile["type"], None)
+        if other is not None:
+            raise ValueError(f"{profile['file']} and {other['file']} both define the type {profile['type']}")
+        schema["profiles"][profile.pop("type")] = profile
+    return schema
+
+
+def load_schema(path) -> dict:
+    """
+    :param path: Schema JSON file, e.g. from "python -m components.schema build --out", or a directory of profiles
+    """
+    if os.path.isdir(path):
+        return build_schema(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _isName(value) -> bool:
+    return isinstance(value, str) and value != ""
+
+
+class SchemaValidator:
+
+    def __init__(self, schema: dict):
+        """
+        :param schema: Output of build_schema
+        """
+        self.schema = schema
+        self.fingerprint = hashlib.sha256(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()
+        #kind -> fields every capability of the kind must define, besides type
+        self._kinds = {kind: tuple(field for field in fields if field != "type")
+                       for kind, fields in schema["kinds"].items()}
+        self._profiles = {pers_type: self._compileProfile(profile) for pers_type, profile in schema["profiles"].items()}
+        #type string -> checking function of the profile, found once per type
+        self._checks = {}
+
+    def __reduce__(self):
+        #Worker processes build each validator once, not once per file
+        return (_validator, (self.fingerprint, self.schema))
+
+    def _compileProfile(self, profile: dict):
+        file = profile["file"]
+        descriptor_fields = tuple(profile["descriptor"])
+        capabilities = tuple((name, capability["kind"], tuple(capability["fixed"].items()))
+                             for name, capability in profile["capabilities"].items())
+
+        def check(descriptor, capabilities_data, errors):
+            for field in descriptor_fields:
+                if field not in descriptor:
+                    errors.append(f"descriptor.{field} is required by {file}")
+            for name, kind, fixed in capabilities:
+                capability = capabilities_data.get(name, None)
+                if not isinstance(capability, Mapping):
+                    errors.append(f"capabilities.{name} is required by {file}")
+                    continue
+                if capability.get("type", None) != kind:
+                    errors.append(f"capabilities.{name} must be a {kind}, as in {file}")
+                for key, value in fixed:
+                    if capability.get(key, None) != value:
+                        errors.append(f"capabilities.{name}.{key} must be {value!r}, as in {file}")
+
+        return check
+
+    def profileCheck(self, type_str: str):
+        """
+        :return: Checking function of the profile with the longest type that prefixes type_str, None if there is none
+        """
+        check = self._checks.get(type_str, False)
+        if check is not False:
+            return check
+
+        check = None
+        parts = type_str.split("/")
+        for i in range(len(parts), 0, -1):
+            check = self._profiles.get("/".join(parts[:i]), None)
+            if check is not None:
+                break
+        self._checks[type_str] = check
+        return check
+
+    def errors(self, data) -> list:
+        """
+        :param data: Persona dict as compiled from the profiles
+        :return: List of error messages, empty if the persona is valid
+        """
+        if not isinstance(data, Mapping):
+            return ["A persona must be a dict"]
+        descriptor = data.get("descriptor", None)
+        capabilities = data.get("capabilities", None)
+        errors = []
+        if not isinstance(descriptor, Mapping):
+            errors.append("descriptor must be a dict")
+        if not isinstance(capabilities, Mapping):
+            errors.append("capabilities must be a dict")
+        if errors:
+            return errors
+
+        for field in ("id", "type"):
+            if not _isName(descriptor.get(field, None)):
+                errors.append(f"descriptor.{field} must be a non-empty string")
+
+        for name, capability in capabilities.items():
+            if not isinstance(capability, Mapping):
+                errors.append(f"capabilities.{name} must be a dict")
+                continue
+            kind = capability.get("type", None)
+            fields = self._kinds.get(kind, None) if isinstance(kind, str) else None
+            if fields is None:
+                errors.append(f"capabilities.{name}.type must be one of {sorted(self._kinds)}, not {kind!r}")
+                continue
+            for field in fields:
+                if not _isName(capability.get(field, None)):
+                    errors.append(f"capabilities.{name}.{field} must be a non-empty string")
+
+        if isinstance(descriptor.get("type", None), str):
+            check = self.profileCheck(descriptor["type"])
+            if check is None:
+                errors.append(f"No profile matches the type {descriptor['type']}")
+            else:
+                check(descriptor, capabilities, errors)
+        return errors
+
+    def validate(self, data):
+        """
+        Raises a ValueError listing every error if the persona does not match its profile.
+        """
+        errors = self.errors(data)
+        if errors:
+            pers_id = data.get("descriptor", {}).get("id", None) if isinstance(data, Mapping) else None
+            raise ValueError(f"Persona {pers_id} does not match its profile: " + "; ".join(errors))
+
+
+#fingerprint -> validator, per process
+_VALIDATORS = {}
+
+
+def _validator(fingerprint, schema) -> SchemaValidator:
+    validator = _VALIDATORS.get(fingerprint, None)
+    if validator is None:
+        validator = _VALIDATORS[fingerprint] = SchemaValidator(schema)
+    return validator
+
+
+def _checkContent(validator, content) -> tuple:
+    try:
+        data = json.loads(content)
+    except ValueError as err:
+        return (f"{type(err).__name__}: {err}",)
+    return tuple(validator.errors(data))
+
+
+def validate_directory(directory, validator: SchemaValidator = None, recursive=False, cache_path=None, use_cache=True,
+                       executor="process", max_workers=None) -> dict:
+    """
+    Checks every persona JSON file of a directory against the schema.
+
+    :param validator: SchemaValidator, built from the profiles of this repository by default
+    :param recursive: Also check the JSON files of sub-directories
+    :param cache_path: Cache file, defaults to CACHE_FILE_NAME inside directory
+    :param use_cache: Set to False to neither read nor write the cache
+    :param executor: "process" or "thread" - the pool used for checking
+    :param max_workers: Size of the pool, defaults to the executor's default
+    :return: Dict of path -> tuple of error messages, empty for the files that passed
+    """
+    if validator is None:
+        validator = SchemaValidator(build_schema())
+
+    if recursive:
+        paths = [os.path.join(root, name) for root, _, names in os.walk(directory)
+                 for name in names if name.endswith(".json")]
+    else:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")]
+    paths.sort()
+
+    if cache_path is None:
+        cache_path = os.path.join(directory, CACHE_FILE_NAME)
+    cache = _loadCache(cache_path) if use_cache else {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        files = [(path, (digest, validator.fingerprint), content)
+                 for path, digest, content in pool.map(_readFile, paths)]
+
+    misses = [(key, content) for _, key, content in files if key not in cache]
+    if len(misses) < MIN_PARALLEL_FILES:
+        results = [_checkContent(validator, content) for _, content in misses]
+    else:
+        pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        with pool_class(max_workers=max_workers) as pool:
+            results = list(pool.map(_checkContent, [validator] * len(misses), [content for _, content in misses],
+                                    chunksize=16))
+    for (key, _), errors in zip(misses, results):
+        cache[key] = errors
+
+    if use_cache:
+        #Only the current files are kept, so the cache doesn't grow with every edit
+        _saveCache(cache_path, {key: cache[key] for _, key, _ in files})
+    return {path: cache[key] for path, key, _ in files}
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Validate personas against the jsonnet profiles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Write the schema of the profiles as JSON")
+    build_parser.add_argument("--root", default=DEFAULT_PROFILES_ROOT, help="Directory of the profiles")
+    build_parser.add_argument("--out", default=None, help="Output file, stdout by default")
+    validate_parser = subparsers.add_parser("validate", help="Check a directory of compiled personas")
+    validate_parser.add_argument("directory")
+    validate_parser.add_argument("--schema", default=DEFAULT_PROFILES_ROOT,
+                                 help="Schema JSON file or directory of profiles")
+    validate_parser.add_argument("--recursive", action="store_true")
+    validate_parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        out = json.dumps(build_schema(args.root, use_cache=False), indent=2, sort_keys=True)
+        if args.out is None:
+            print(out)
+        else:
+            with open(args.out, "w", encoding="utf-8") as f:
+                f.write(out)
+        sys.exit(0)
+
+    start = time.perf_counter()
+    results = validate_directory(args.directory, SchemaValidator(load_schema(args.schema)), args.recursive,
+                                 use_cache=not args.no_cache)
+    failed = {path: errors for path, errors in results.items() if errors}
+    print(f"{len(results) - len(failed)}/{len(results)} personas match their profile "
+          f"({(time.perf_counter() - start) * 1e3:.1f} ms)")
+    for path, errors in failed.items():
+        print(f"  {path}:")
+        for error in errors:
+            print(f"    {error}")
+    sys.exit(1 if failed else 0)
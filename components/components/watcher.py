@@ -0,0 +1,208 @@
+"""
+Watches a directory of compiled persona JSON files and reports what changed since the last poll.
+
+A poll compares the modification time and size of every file, and reads only the files whose stat changed. Of those,
+only the files whose SHA-256 changed are parsed - touching a file, or rewriting it unchanged, costs a single read.
+Every change carries the PersonaDiff of the old and new persona, and apply_changes hands the changes to a registry and
+to the live components, which update only what the diff touches.
+
+Nothing here depends on ROS. ComponentContainer polls its watchers from a timer of its executor, so reloads run like any
+other callback of the hosted nodes.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from .persona import Persona
+
+ADDED = "added"
+CHANGED = "changed"
+REMOVED = "removed"
+
+
+class PersonaChange:
+
+    __slots__ = ("kind", "path", "old", "new", "diff")
+
+    def __init__(self, kind: str, path: str, old: Persona = None, new: Persona = None, diff=None):
+        """
+        :param kind: ADDED, CHANGED or REMOVED
+        :param old: The persona before the change, None if ADDED
+        :param new: The persona after the change, None if REMOVED
+        :param diff: PersonaDiff from old to new if CHANGED
+        """
+        self.kind = kind
+        self.path = path
+        self.old = old
+        self.new = new
+        self.diff = diff
+
+    def __repr__(self):
+        pers = self.new if self.new is not None else self.old
+        return f"PersonaChange({self.kind!r}, {pers.getID()!r}, {self.path!r})"
+
+
+class PersonaWatcher:
+
+    def __init__(self, directory, recursive: bool = False):
+        """
+        :param directory: Directory of compiled persona JSON files
+        :param recursive: Also watch the JSON files of sub-directories
+        """
+        self.directory = directory
+        self.recursive = recursive
+        #path -> (st_mtime_ns, st_size) when the file was last read
+        self._stats = {}
+        #path -> (SHA-256 of the content, persona)
+        self._personas = {}
+        #path -> error message of the files that could not be loaded - their last good persona stays in place
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def personas(self) -> dict:
+        """
+        :return: Dict of path -> current persona of the file
+        """
+        with self._lock:
+            return {path: pers for path, (_, pers) in self._personas.items()}
+
+    def _paths(self):
+        if self.recursive:
+            return [os.path.join(root, name) for root, _, names in os.walk(self.directory)
+                    for name in names if name.endswith(".json")]
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")]
+
+    def poll(self) -> list:
+        """
+        :return: List of PersonaChange since the last poll - the first poll reports every persona as ADDED.
+            Removals come first, and a persona that moved to another file is one CHANGED
+        """
+        with self._lock:
+            changes = []
+            seen = set()
+            for path in sorted(self._paths()):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                seen.add(path)
+
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                if self._stats.get(path, None) != stamp:
+                    self._stats[path] = stamp
+                    changes.extend(self._reload(path))
+
+            for path in sorted(self._stats.keys() - seen):
+                del self._stats[path]
+                self.errors.pop(path, None)
+                if path in self._personas:
+                    changes.append(PersonaChange(REMOVED, path, old=self._personas.pop(path)[1]))
+
+            return self._fold(changes)
+
+    @staticmethod
+    def _fold(changes) -> list:
+        """
+        :return: The changes with removals first, so an id is free before it is added again - a persona removed from
+            one file and added from another is folded into one CHANGED, or dropped if it didn't change
+        """
+        removed = {change.old.getID(): change for change in changes if change.kind == REMOVED}
+        added = {change.new.getID() for change in changes if change.kind == ADDED}
+
+        folded = [change for change in changes if change.kind == REMOVED and change.old.getID() not in added]
+        for change in changes:
+            if change.kind == REMOVED:
+                continue
+            old_change = removed.get(change.new.getID(), None) if change.kind == ADDED else None
+            if old_change is None:
+                folded.append(change)
+                continue
+            diff = old_change.old.diff(change.new)
+            if diff:
+                folded.append(PersonaChange(CHANGED, change.path, old_change.old, change.new, diff))
+        return folded
+
+    def _reload(self, path) -> list:
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError as err:
+            self.errors[path] = f"{type(err).__name__}: {err}"
+            return []
+
+        digest = hashlib.sha256(content).hexdigest()
+        old_digest, old = self._personas.get(path, (None, None))
+        if digest == old_digest:
+            return []
+
+        try:
+            new = Persona.fromData(json.loads(content))
+        except Exception as err:
+            #A file caught half written fails here, finishing the write changes its stat again
+            self.errors[path] = f"{type(err).__name__}: {err}"
+            return []
+        self.errors.pop(path, None)
+        self._personas[path] = (digest, new)
+
+        if old is None:
+            return [PersonaChange(ADDED, path, new=new)]
+        if old.getID() != new.getID():
+            return [PersonaChange(REMOVED, path, old=old), PersonaChange(ADDED, path, new=new)]
+
+        diff = old.diff(new)
+        #E.g. only the formatting of the file changed
+        if not diff:
+            return []
+        return [PersonaChange(CHANGED, path, old, new, diff)]
+
+    def start(self, period_s: float, callback):
+        """
+        Polls every period_s on a daemon thread and calls callback with the list of changes, if there are any.
+        The callback runs on that thread - callers sharing the registry or components with it have to lock.
+        """
+        if self._thread is not None:
+            raise RuntimeError("The watcher is already running")
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(period_s):
+                changes = self.poll()
+                if changes:
+                    callback(changes)
+
+        self._thread = threading.Thread(target=run, name=f"persona-watcher-{self.directory}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def apply_changes(changes, registry=None, components=None, cache=None):
+    """
+    :param changes: PersonaChanges in the order of PersonaWatcher.poll - removals first
+    :param registry: PersonaRegistry kept in step with the files - only the index entries of a diff are updated
+    :param components: Dict of persona id -> live ComponentProfile, reloaded in place when their persona CHANGED
+    :param cache: CriterionCache whose results of changed and removed personas are dropped
+    """
+    for change in changes:
+        if cache is not None and change.kind != ADDED:
+            cache.invalidate(change.old.getID())
+
+        if registry is not None:
+            if change.kind == ADDED:
+                registry.register(change.new)
+            elif change.kind == REMOVED:
+                registry.unregister(change.old.getID())
+            else:
+                registry.update(change.new)
+
+        if components and change.kind == CHANGED:
+            component = components.get(change.new.getID(), None)
+            if component is not None:
+                component.reloadPersona(change.new)
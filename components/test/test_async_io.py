@@ -0,0 +1,88 @@
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from components.components.async_io import AsyncDeviceIO, FakeDevice
+
+
+class TestAsyncDeviceIO(unittest.TestCase):
+
+    def setUp(self):
+        self.io = AsyncDeviceIO()
+        self.device = FakeDevice(latency_s=0.05)
+        self.io.run(self.device.connect())
+
+    def tearDown(self):
+        self.io.close()
+
+    def test_round_trip(self):
+        self.assertTrue(self.io.run(self.device.write("power", 0.5)))
+        self.assertEqual(0.5, self.io.run(self.device.read("power")))
+        self.assertTrue(self.io.run(self.device.turnOn()))
+
+    def test_latency(self):
+        start = time.perf_counter()
+        self.io.run(self.device.read("power"))
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+    """
+    We show that executor threads waiting for the device overlap - 20 calls of 50 ms take far less than 1 s
+    """
+    def test_concurrent_calls_overlap(self):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            results = list(pool.map(lambda i: self.io.run(self.device.write(i, i)), range(20)))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual([True] * 20, results)
+        self.assertLess(elapsed, 0.5)
+        self.assertGreater(self.device.max_in_flight, 1)
+
+    def test_serialized_device(self):
+        device = FakeDevice(latency_s=0.02, serialize=True)
+        self.io.run(device.connect())
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            list(pool.map(lambda i: self.io.run(device.read(i)), range(5)))
+        self.assertEqual(1, device.max_in_flight)
+
+    """
+    We show that a blocked thread leaves the loop free for other operations
+    """
+    def test_slow_call_does_not_stall_others(self):
+        slow = FakeDevice(latency_s=0.5)
+        self.io.run(slow.connect())
+        slow_future = self.io.submit(slow.read("temperature"))
+
+        start = time.perf_counter()
+        self.io.run(self.device.read("power"))
+        self.assertLess(time.perf_counter() - start, 0.3)
+        self.assertFalse(slow_future.done())
+
+    def test_errors_propagate(self):
+        device = FakeDevice(latency_s=0)
+        with self.assertRaises(ConnectionError):
+            self.io.run(device.read("power"))
+
+    def test_timeout_cancels(self):
+        slow = FakeDevice(latency_s=1.0)
+        with self.assertRaises(FutureTimeoutError):
+            self.io.run(slow.connect(), timeout=0.05)
+
+        async def pending():
+            await asyncio.sleep(0.01)
+            return len(asyncio.all_tasks()) - 1
+
+        self.assertEqual(0, self.io.run(pending()))
+
+    def test_run_from_loop_raises(self):
+        async def nested():
+            return self.io.run(self.device.read("power"))
+
+        with self.assertRaises(RuntimeError):
+            self.io.run(nested())
+
+    def test_closed(self):
+        self.io.close()
+        self.assertTrue(self.io.closed)
+        with self.assertRaises(RuntimeError):
+            self.io.run(self.device.read("power"))
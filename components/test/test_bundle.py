@@ -0,0 +1,121 @@
+import gc
+import os
+import tempfile
+import unittest
+from components.components.persona import Persona, PersonaRegistry, Criterion, Type
+from components.components.bundle import PersonaBundle, write_bundle
+
+
+def make_persona(i):
+    return Persona.fromData({
+        "descriptor": {"id": f"laser{i}", "vendor": "Toptica", "product": "IBeam Pro", "description": "Bundle test",
+                       "type": "base/device/laser", "wavelength": [445, 488][i % 2], "TEM_modes": ["00"],
+                       "nr_channels": 2},
+        "capabilities": {"setPower": {"type": "service", "srv_type": "interfaces/SetLaserPower"}},
+    })
+
+
+class TestPersonaBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.bundle_path = os.path.join(self.tmp.name, "personas.lpb")
+        self.personas = [make_persona(i) for i in range(20)]
+        write_bundle(self.personas, self.bundle_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    """
+    We show that personas come out of the bundle as they went in, and that only the requested ones are decoded
+    """
+    def test_lazy_round_trip(self):
+        with PersonaBundle(self.bundle_path) as bundle:
+            self.assertEqual(20, len(bundle))
+            self.assertEqual(0, bundle.decodedCount())
+
+            pers = bundle.get("laser3")
+            self.assertEqual(1, bundle.decodedCount())
+            self.assertIs(pers, bundle["laser3"])
+            self.assertEqual(self.personas[3].toData(), pers.toData())
+            self.assertIs(Type("base/device/laser"), pers.type)
+
+    """
+    We show that every persona is found by the binary search over the sorted index, and that missing ids are not
+    """
+    def test_lookup(self):
+        with PersonaBundle(self.bundle_path) as bundle:
+            self.assertEqual(sorted(f"laser{i}" for i in range(20)), bundle.ids())
+            for pers in self.personas:
+                self.assertIn(pers.getID(), bundle)
+                self.assertEqual(pers.toData(), bundle.get(pers.getID()).toData())
+            for pers_id in ("laser", "laser20", "laser1\0", "laser100", "", 3):
+                self.assertNotIn(pers_id, bundle)
+            with self.assertRaises(KeyError):
+                bundle.get("laser20")
+
+    def test_persona_and_registry_from_bundle(self):
+        self.assertEqual(self.personas[5].toData(), Persona.fromBundle(self.bundle_path, "laser5").toData())
+
+        registry = PersonaRegistry.fromBundle(self.bundle_path, ["laser0", "laser1", "laser2"])
+        self.assertEqual({"laser0", "laser2"}, registry.queryIDs(Criterion({"descriptor": {"wavelength": {"eq": 445}}})))
+        self.assertEqual(20, len(PersonaRegistry.fromBundle(self.bundle_path)))
+
+    def test_not_a_bundle(self):
+        other_path = os.path.join(self.tmp.name, "other.lpb")
+        with open(other_path, "wb") as f:
+            f.write(b"{}" * 20)
+        with self.assertRaises(ValueError):
+            PersonaBundle(other_path)
+
+    def test_corrupt_record(self):
+        with open(self.bundle_path, "r+b") as f:
+            f.seek(40)
+            f.write(b"#")
+        with PersonaBundle(self.bundle_path) as bundle:
+            with self.assertRaises(ValueError):
+                bundle.get("laser0")
+
+    """
+    We show that the shared bundle of a path is reopened once it is rewritten, and that the old one stays readable
+    """
+    def test_open_rewritten(self):
+        bundle = PersonaBundle.open(self.bundle_path)
+        self.assertIs(bundle, PersonaBundle.open(self.bundle_path))
+
+        write_bundle([make_persona(i) for i in range(25)], self.bundle_path)
+        reopened = PersonaBundle.open(self.bundle_path)
+        self.assertIsNot(bundle, reopened)
+        self.assertEqual(25, len(reopened))
+        self.assertEqual(20, len(bundle))
+        self.assertEqual(self.personas[3].toData(), bundle.get("laser3").toData())
+        self.assertIs(reopened, PersonaBundle.open(self.bundle_path))
+        bundle.close()
+        reopened.close()
+
+    """
+    We show that a replaced shared bundle is closed once nobody holds it any more
+    """
+    def test_replaced_closed(self):
+        bundle = PersonaBundle.open(self.bundle_path)
+        pers = bundle.get("laser3")
+        old_map = bundle._map
+
+        write_bundle([make_persona(i) for i in range(25)], self.bundle_path)
+        reopened = PersonaBundle.open(self.bundle_path)
+        self.assertFalse(old_map.closed)
+        del bundle
+        gc.collect()
+        self.assertTrue(old_map.closed)
+
+        self.assertEqual(self.personas[3].toData(), pers.toData())
+        self.assertFalse(reopened.closed)
+        reopened.close()
+
+    def test_duplicate_id(self):
+        with self.assertRaises(ValueError):
+            write_bundle([make_persona(1), make_persona(1)], os.path.join(self.tmp.name, "dup.lpb"))
+
+
+if __name__ == '__main__':
+    unittest.main()
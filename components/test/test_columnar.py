@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+from components.components.persona import Persona, PersonaRegistry, Criterion, Type
+from components.components.columnar import PersonaColumns
+
+
+def make_persona_data(i):
+    return {
+        "descriptor": {
+            "id": f"laser{i}",
+            "vendor": ["Toptica", "Thorlabs", "Coherent"][i % 3],
+            "product": "Product",
+            "description": "Columnar test persona",
+            "type": ["base/device/laser", "base/device/camera"][i % 5 == 0],
+            "wavelength": [445, 488, 532, 640, 445.0][i % 5],
+            "nr_channels": 1 + i % 4,
+            "TEM_modes": ["00", "01"][: 1 + i % 2],
+            "calibration": {"offset": i % 2},
+            "enabled": [True, False, None][i % 3],
+        },
+        "capabilities": {"setPower": {"type": "service"}} if i % 2 == 0 else {"getPower": {"type": "service"}},
+    }
+
+
+class TestPersonaColumns(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.personas = [Persona.fromData(make_persona_data(i)) for i in range(50)]
+        cls.columns = PersonaColumns(cls.personas)
+
+    def criteria(self):
+        return [
+            {},
+            {"descriptor": {"wavelength": {"eq": 445}, "nr_channels": {"eq": 2}}},
+            {"descriptor": {"type": {"in": Type("device/laser")}, "wavelength": {"eq": 445}}},
+            {"descriptor": {"type": {"eq": Type("base/device/camera")}}},
+            {"descriptor": {"id": {"eq": "laser7"}}},
+            {"descriptor": {"id": {"in": "laser1"}}},
+            {"descriptor": {"vendor": {"in": "Th"}}},
+            {"descriptor": {"TEM_modes": {"eq": ["00", "01"]}}},
+            {"descriptor": {"TEM_modes": {"in": ["01"]}}},
+            {"descriptor": {"calibration": {"eq": {"offset": 0}}}},
+            {"descriptor": {"enabled": {"eq": True}}},
+            {"descriptor": {"enabled": {"eq": 1}}},
+            {"descriptor": {"missing": {"in": []}}},
+            {"capabilities": {"in": ["setPower"]}},
+            {"capabilities": {"eq": ["getPower"]}},
+            {"capabilities": {"in": ["setPower", "getPower"]}},
+        ]
+
+    """
+    We show that the batch evaluation gives exactly the per-persona results of checkPersona
+    """
+    def test_mask_matches_check_persona(self):
+        for criteria_dict in self.criteria():
+            crit = Criterion(criteria_dict)
+            expected = np.array([crit.checkPersona(pers) for pers in self.personas])
+            np.testing.assert_array_equal(expected, crit.checkMany(self.columns), f"{criteria_dict}")
+            np.testing.assert_array_equal(expected, crit.checkMany(self.personas), f"{criteria_dict}")
+
+    def test_registry_evaluate(self):
+        registry = PersonaRegistry(self.personas)
+        crit = Criterion({"descriptor": {"type": {"in": Type("laser")}, "nr_channels": {"eq": 2}}})
+        self.assertEqual(registry.queryIDs(crit), set(registry.evaluate(crit)))
+
+        registry.unregister("laser1")
+        self.assertNotIn("laser1", registry.evaluate(crit))
+
+
+if __name__ == '__main__':
+    unittest.main()
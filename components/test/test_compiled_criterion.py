@@ -0,0 +1,60 @@
+import os
+import unittest
+from components.components.persona import Persona, Criterion, CompiledCriterion, CriteriaOperator, Type
+
+TEST_PROFILES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "interfaces", "profiles", "test")
+
+
+class TestCompiledCriterion(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_pers = Persona(os.path.join(TEST_PROFILES_DIR, "testpersona_persona.json"))
+
+    def criteria(self):
+        desc = self.__class__.test_pers.getDescriptor()
+        cap_names = self.__class__.test_pers.getCapabilitiesNames()
+        return [
+            {},
+            {"descriptor": {}},
+            {"capabilities": {}},
+            {"descriptor": {"type": {"eq": Type("base/device/test")}}},
+            {"descriptor": {"type": {"eq": Type("base/device")}}},
+            {"descriptor": {"type": {"in": Type("base/device")}}},
+            {"descriptor": {"type": {"in": Type("device/test")}}},
+            {"descriptor": {"type": {"in": Type("device/base")}}},
+            {"descriptor": {"type": {CriteriaOperator.IN: ["base"]}}},
+            {"descriptor": {"type": {"in": "base"}}},
+            {"descriptor": {"vendor": {"in": desc["vendor"][:2]}}},
+            {"descriptor": {"vendor": {"in": "enoN"}}},
+            {"descriptor": {"dummy1": {"eq": desc["dummy1"]}}},
+            {"descriptor": {"dummy1": {"in": desc["dummy1"]}}},
+            {"descriptor": {"dummy2_list": {"in": list(reversed(desc["dummy2_list"][:3]))}}},
+            {"descriptor": {"dummy2_list": {"eq": [str(x) for x in desc["dummy2_list"]]}}},
+            {"descriptor": {"dummy2_list": {"in": []}, "dummy3": {"in": "CAE"}}},
+            {"descriptor": {"not_a_key": {"eq": 1}}},
+            {"capabilities": {"in": ["testService1"]}},
+            {"capabilities": {"in": ["testService3"]}},
+            {"capabilities": {"eq": cap_names}},
+            {"capabilities": {CriteriaOperator.EQ: cap_names[:-1]}},
+            {"descriptor": {"type": {"in": Type("base")}}, "capabilities": {"in": ["testService2"]}},
+        ]
+
+    """
+    We show that the compiled plan gives the same result as the criterion for every kind of rule
+    """
+    def test_compiled_matches_criterion(self):
+        test_pers = self.__class__.test_pers
+        for criteria_dict in self.criteria():
+            crit = Criterion(criteria_dict)
+            compiled = crit.compile()
+            self.assertEqual(crit.checkPersona(test_pers), compiled.checkPersona(test_pers), f"{criteria_dict}")
+
+    def test_compile_is_cached(self):
+        crit = Criterion({"descriptor": {"type": {"in": Type("base")}}})
+        self.assertIs(crit.compile(), crit.compile())
+        self.assertIsInstance(crit.compile(), CompiledCriterion)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,16 @@
 import copy
+import os
 import unittest
 from components.components.persona import Persona, Criterion, CriteriaOperator,Type
 
+TEST_PROFILES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "interfaces", "profiles", "test")
+
 
 class MyTestCase_Operators(unittest.TestCase):
 
         @classmethod
         def setUpClass(cls):
-            cls.test_pers = Persona(r"D:\LIDAROS\interfaces\profiles\test\testpersona_persona.json")
+            cls.test_pers = Persona(os.path.join(TEST_PROFILES_DIR, "testpersona_persona.json"))
 
         """
         We show that "eq" operator only works if the value for the criterion is equal to the persona's
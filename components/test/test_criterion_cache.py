@@ -0,0 +1,126 @@
+import random
+import unittest
+from components.components.persona import Persona, Criterion, CriterionCache, CriteriaOperator, Type
+from components.components.watcher import PersonaChange, apply_changes, CHANGED
+
+
+def make_persona(i, wavelength=445, pers_type="base/device/laser"):
+    capabilities = {"setPower": {"type": "service"}} if i % 2 == 0 else {}
+    if i % 3 == 0:
+        capabilities["getTemperature"] = {"type": "service"}
+    return Persona.fromData({
+        "descriptor": {"id": f"dev{i}", "vendor": "Toptica", "product": "IBeam Pro", "description": "Cache test",
+                       "type": pers_type, "wavelength": wavelength, "nr_channels": 1 + i % 4, "TEM_modes": ["00"]},
+        "capabilities": capabilities,
+    })
+
+
+class TestCriterionKey(unittest.TestCase):
+
+    def test_equal_criteria(self):
+        a = Criterion({"descriptor": {"wavelength": {"eq": 445}, "type": {"in": Type("device/laser")}},
+                       "capabilities": {"in": ["setPower"]}})
+        b = Criterion({"capabilities": {CriteriaOperator.IN: ["setPower"]},
+                       "descriptor": {"type": {CriteriaOperator.IN: Type("device/laser")}, "wavelength": {"eq": 445}}})
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(1, len({a, b}))
+
+    """
+    We show that values the checks tell apart give different keys
+    """
+    def test_different_criteria(self):
+        keys = [Criterion({"descriptor": {"TEM_modes": {"eq": value}}}).key()
+                for value in (["00"], ("00",), "00", Type("00"))]
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertNotEqual(Criterion({"descriptor": {"nr_channels": {"eq": 1}}}),
+                            Criterion({"descriptor": {"nr_channels": {"eq": True}}}))
+        self.assertNotEqual(Criterion({"descriptor": {"nr_channels": {"eq": 1}}}),
+                            Criterion({"descriptor": {"nr_channels": {"ge": 1}}}))
+
+
+class TestCriterionCache(unittest.TestCase):
+
+    CRITERIA = [
+        {"descriptor": {"type": {"in": Type("device/laser")}}, "capabilities": {"in": ["setPower"]}},
+        {"descriptor": {"wavelength": {"between": [400, 450]}}},
+        {"descriptor": {"nr_channels": {"ge": 2}, "TEM_modes": {"eq": ["00"]}}},
+        {"capabilities": {"eq": ["setPower", "getTemperature"]}},
+        {},
+    ]
+
+    def test_same_results(self):
+        rng = random.Random(0)
+        personas = [make_persona(i, rng.choice([405, 445, 488])) for i in range(30)]
+        #Every plan is cached, however cheap
+        cache = CriterionCache(max_size=64, min_cost=0)
+        for _ in range(3):
+            for criteria_dict in self.CRITERIA:
+                for pers in personas:
+                    #A new Criterion each time, as a controller asking again would build
+                    crit = Criterion(criteria_dict)
+                    self.assertEqual(crit.checkPersona(pers), cache.checkPersona(crit, pers), criteria_dict)
+
+        metrics = cache.metrics()
+        self.assertEqual(64, metrics["size"])
+        self.assertEqual(3 * 5 * 30, metrics["hits"] + metrics["misses"])
+        self.assertGreater(metrics["evictions"], 0)
+
+    def test_hits(self):
+        cache = CriterionCache(min_cost=0)
+        pers = make_persona(0)
+        for _ in range(5):
+            self.assertTrue(cache.checkPersona(Criterion(self.CRITERIA[0]), pers))
+        self.assertEqual((4, 1), (cache.hits, cache.misses))
+
+    """
+    We show that a reloaded persona is checked again, even if the old results are never invalidated
+    """
+    def test_reload(self):
+        cache = CriterionCache(min_cost=0)
+        crit = Criterion({"descriptor": {"wavelength": {"eq": 445}}})
+        old = make_persona(0, 445)
+        self.assertTrue(cache.checkPersona(crit, old))
+
+        new = make_persona(0, 488)
+        self.assertGreater(new.getVersion(), old.getVersion())
+        self.assertFalse(cache.checkPersona(crit, new))
+
+        apply_changes([PersonaChange(CHANGED, "dev0.json", old, new, old.diff(new))], cache=cache)
+        self.assertEqual(2, cache.invalidations)
+        self.assertEqual(0, len(cache))
+
+    def test_invalidate(self):
+        cache = CriterionCache(min_cost=0)
+        for i in range(4):
+            cache.checkPersona(Criterion(self.CRITERIA[1]), make_persona(i))
+        self.assertEqual(1, cache.invalidate("dev2"))
+        self.assertEqual(3, len(cache))
+        self.assertEqual(3, cache.invalidate())
+        self.assertEqual(0, len(cache))
+
+    """
+    We show that plans cheaper than a lookup are checked directly, and only the expensive ones are cached
+    """
+    def test_min_cost(self):
+        cache = CriterionCache()
+        cheap = Criterion(self.CRITERIA[1]).compile()
+        expensive = Criterion({"descriptor": {"type": {"in": Type("base/device/laser")}, "TEM_modes": {"in": ["00"]}},
+                               "capabilities": {"in": ["setPower"]}}).compile()
+        self.assertLess(cheap.cost, CriterionCache.MIN_COST)
+        self.assertGreaterEqual(expensive.cost, CriterionCache.MIN_COST)
+
+        pers = make_persona(0)
+        for _ in range(3):
+            self.assertTrue(cache.checkPersona(cheap, pers))
+            self.assertTrue(cache.checkPersona(expensive, pers))
+        self.assertEqual((2, 1), (cache.hits, cache.misses))
+        self.assertEqual(1, len(cache))
+
+    def test_max_size(self):
+        with self.assertRaises(ValueError):
+            CriterionCache(max_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+from components.components.persona import Persona, PersonaRegistry, Criterion, CriteriaOperator, Type
+from components.components.discovery import DiscoveryIndex, encode_criteria, decode_criteria
+
+
+def make_persona(i, wavelength=445, pers_type="base/device/laser"):
+    return Persona.fromData({
+        "descriptor": {"id": f"dev{i}", "vendor": "Toptica", "product": "IBeam Pro", "description": "Discovery test",
+                       "type": pers_type, "wavelength": wavelength},
+        "capabilities": {"setPower": {"type": "service"}} if i % 2 == 0 else {},
+    })
+
+
+class TestCriteriaCodec(unittest.TestCase):
+
+    def test_round_trip(self):
+        criteria_dict = {"descriptor": {"type": {"in": Type("device/laser")}, "wavelength": {"eq": 445}},
+                         "capabilities": {"in": ["setPower"]}}
+        decoded = decode_criteria(encode_criteria(criteria_dict))
+        self.assertEqual(criteria_dict, decoded)
+        self.assertIs(Type("device/laser"), decoded["descriptor"]["type"]["in"])
+
+    """
+    We show that the encoding doesn't depend on the order of the keys, so it can be used as a cache key
+    """
+    def test_canonical(self):
+        a = {"descriptor": {"vendor": {"eq": "Toptica"}, "wavelength": {"eq": 445}}}
+        b = {"descriptor": {"wavelength": {"eq": 445}, "vendor": {"eq": "Toptica"}}}
+        self.assertEqual(encode_criteria(a), encode_criteria(b))
+
+    def test_operator_keys(self):
+        criteria_dict = {"descriptor": {"wavelength": {CriteriaOperator.EQ: 445}, "vendor": {"eq": "Toptica"}}}
+        self.assertEqual(encode_criteria({"descriptor": {"wavelength": {"eq": 445}, "vendor": {"eq": "Toptica"}}}),
+                         encode_criteria(criteria_dict))
+
+    def test_invalid(self):
+        with self.assertRaises(TypeError):
+            encode_criteria({"descriptor": {"vendor": {"eq": object()}}})
+        with self.assertRaises(ValueError):
+            decode_criteria("[1, 2]")
+
+
+class TestDiscoveryIndex(unittest.TestCase):
+
+    CRITERIA = [
+        {"descriptor": {"type": {"in": Type("device/laser")}}},
+        {"descriptor": {"wavelength": {"eq": 488}}},
+        {"capabilities": {"in": ["setPower"]}},
+        {},
+    ]
+
+    def setUp(self):
+        self.index = DiscoveryIndex()
+        for i in range(20):
+            self.index.join(make_persona(i, wavelength=[445, 488][i % 2]))
+
+    def assertFresh(self):
+        """
+        Every memoized result must equal a query over a fresh registry
+        """
+        registry = PersonaRegistry(self.index.get(f"dev{i}") for i in range(100) if f"dev{i}" in self.index)
+        for criteria_dict in self.CRITERIA:
+            self.assertEqual(sorted(registry.queryIDs(Criterion(criteria_dict))), self.index.find(criteria_dict))
+
+    def test_memoized(self):
+        self.assertFresh()
+        misses = self.index.misses
+        self.assertFresh()
+        self.assertEqual(misses, self.index.misses)
+        self.assertEqual(len(self.CRITERIA), self.index.hits)
+
+    def test_find_from_json(self):
+        criteria_dict = self.CRITERIA[0]
+        self.assertEqual(self.index.find(criteria_dict), self.index.find(encode_criteria(criteria_dict)))
+        self.assertEqual(1, self.index.misses)
+
+    """
+    We show that criteria which only look alike once encoded are memoized apart - a persona's list never equals a
+    tuple - and that CriteriaOperator keys are memoized with their strings
+    """
+    def test_memo_key(self):
+        index = DiscoveryIndex()
+        for i in range(4):
+            data = make_persona(i).toData()
+            data["descriptor"]["TEM_modes"] = ["00"] if i % 2 == 0 else ["01"]
+            index.join(Persona.fromData(data))
+
+        self.assertEqual([], index.find({"descriptor": {"TEM_modes": {"eq": ("00",)}}}))
+        self.assertEqual(["dev0", "dev2"], index.find({"descriptor": {"TEM_modes": {"eq": ["00"]}}}))
+        self.assertEqual(2, index.misses)
+
+        self.assertEqual(["dev0", "dev2"], index.find({"descriptor": {"TEM_modes": {CriteriaOperator.EQ: ["00"]}}}))
+        self.assertEqual(2, index.misses)
+        self.assertEqual(1, index.hits)
+
+    def test_join_updates_results(self):
+        self.assertFresh()
+        self.assertEqual(DiscoveryIndex.JOINED, self.index.join(make_persona(20, wavelength=488)))
+        self.assertIn("dev20", self.index.find(self.CRITERIA[1]))
+        self.assertFresh()
+
+    def test_leave_updates_results(self):
+        self.assertFresh()
+        self.assertTrue(self.index.leave("dev1"))
+        self.assertFalse(self.index.leave("dev1"))
+        self.assertNotIn("dev1", self.index.find({}))
+        self.assertFresh()
+
+    def test_change_updates_results(self):
+        self.assertFresh()
+        self.assertEqual(DiscoveryIndex.CHANGED, self.index.join(make_persona(1, wavelength=445, pers_type="base/device/camera")))
+        self.assertNotIn("dev1", self.index.find(self.CRITERIA[0]))
+        self.assertNotIn("dev1", self.index.find(self.CRITERIA[1]))
+        self.assertFresh()
+
+    def test_renew(self):
+        self.assertEqual(DiscoveryIndex.RENEWED, self.index.join(make_persona(3, wavelength=488)))
+
+    def test_lease_expiry(self):
+        self.index.join(make_persona(30), lease_s=10.0)
+        self.assertEqual([], self.index.expire())
+        self.assertEqual(["dev30"], self.index.expire(now=float("inf")))
+        self.assertNotIn("dev30", self.index)
+        self.assertEqual(20, len(self.index))
+
+    """
+    We show that an in rule with a single number is answered like checkPersona answers it
+    """
+    def test_scalar_in(self):
+        criteria_dict = {"descriptor": {"wavelength": {"in": 488}}}
+        self.assertEqual([f"dev{i}" for i in sorted(range(1, 20, 2), key=str)], self.index.find(criteria_dict))
+        self.assertEqual(self.index.find(criteria_dict), self.index.find(encode_criteria(criteria_dict)))
+
+    def test_bounded_cache(self):
+        index = DiscoveryIndex(max_cached=2)
+        for wavelength in (445, 488, 532):
+            index.find({"descriptor": {"wavelength": {"eq": wavelength}}})
+        self.assertEqual(2, index.metrics()["cached_criteria"])
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import unittest
+import components.components
+from components.components import persona
+
+ROS_MODULES = ("rclpy", "interfaces.srv", "interfaces.msg")
+
+
+def imported_modules(statement):
+    """
+    :return: Names of all modules loaded after running statement in a fresh interpreter
+    """
+    code = f"{statement}\nimport sys\nprint('\\n'.join(sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+    return result.stdout.split()
+
+
+class TestROSFreeImports(unittest.TestCase):
+
+    """
+    We show that personas, criteria and discovery load without importing rclpy or the generated interfaces
+    """
+    def test_no_ros(self):
+        modules = imported_modules(
+            "from components.components import Persona, Criterion, PersonaRegistry, DiscoveryIndex, routing_table\n"
+            "import components.components.loader, components.components.bundle, components.components.async_io")
+        self.assertIn("components.components.persona", modules)
+        self.assertEqual([], [name for name in modules if name.startswith(ROS_MODULES)])
+
+    def test_package_import_is_lazy(self):
+        modules = imported_modules("import components.components")
+        self.assertNotIn("components.components.persona", modules)
+
+    def test_lazy_names(self):
+        self.assertIs(persona.Criterion, components.components.Criterion)
+        self.assertIs(persona.Persona, getattr(components.components, "Persona"))
+        self.assertIn("ComponentProfile", dir(components.components))
+        with self.assertRaises(AttributeError):
+            components.components.NotAName
@@ -0,0 +1,97 @@
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from components.components.loader import load_personas, CACHE_FILE_NAME
+
+
+class Planted:
+
+    """
+    Creates the directory at path when it is unpickled
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return os.mkdir, (self.path,)
+
+
+def write_persona(directory, i, wavelength=445):
+    data = {
+        "descriptor": {"id": f"laser{i}", "vendor": "Toptica", "product": "IBeam Pro", "description": "Loader test",
+                       "type": "base/device/laser", "wavelength": wavelength, "nr_channels": 2},
+        "capabilities": {"setPower": {"type": "service", "srv_type": "interfaces/SetLaserPower"}},
+    }
+    with open(os.path.join(directory, f"laser{i}_persona.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+class TestLoadPersonas(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+        for i in range(40):
+            write_persona(self.directory, i)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_load(self):
+        personas, stats = load_personas(self.directory, executor="thread")
+        self.assertEqual(40, len(personas))
+        self.assertEqual(40, stats.parsed)
+        self.assertEqual(0, stats.cache_hits)
+        self.assertEqual({f"laser{i}" for i in range(40)}, {pers.getID() for pers in personas})
+        self.assertTrue(os.path.exists(os.path.join(self.directory, CACHE_FILE_NAME)))
+
+    """
+    We show that only changed personas are parsed again on the next load
+    """
+    def test_cache_skips_unchanged(self):
+        load_personas(self.directory, executor="thread")
+        write_persona(self.directory, 3, wavelength=488)
+
+        personas, stats = load_personas(self.directory, executor="thread")
+        self.assertEqual(39, stats.cache_hits)
+        self.assertEqual(1, stats.parsed)
+        by_id = {pers.getID(): pers for pers in personas}
+        self.assertEqual(488, by_id["laser3"].getDescriptor()["wavelength"])
+        self.assertEqual("base/device/laser", by_id["laser5"].getTypeString())
+
+    def test_malformed(self):
+        with open(os.path.join(self.directory, "broken_persona.json"), "w", encoding="utf-8") as f:
+            json.dump({"descriptor": {"id": "broken", "type": "base//device"}, "capabilities": {}}, f)
+
+        with self.assertRaises(ValueError):
+            load_personas(self.directory, executor="thread")
+
+        personas, stats = load_personas(self.directory, executor="thread", strict=False)
+        self.assertEqual(40, len(personas))
+        self.assertIn("A type_leaf is empty", stats.errors[os.path.join(self.directory, "broken_persona.json")])
+
+    """
+    We show that a cache planted in the persona directory is never unpickled, only ignored and replaced
+    """
+    def test_planted_cache(self):
+        marker = os.path.join(self.directory, "planted")
+        with open(os.path.join(self.directory, CACHE_FILE_NAME), "wb") as f:
+            pickle.dump(Planted(marker), f)
+
+        personas, stats = load_personas(self.directory, executor="thread")
+        self.assertFalse(os.path.exists(marker))
+        self.assertEqual(40, stats.parsed)
+        self.assertEqual(40, len(personas))
+        self.assertEqual(40, load_personas(self.directory, executor="thread")[1].cache_hits)
+
+    def test_process_pool(self):
+        personas, stats = load_personas(self.directory, executor="process", use_cache=False)
+        self.assertEqual(40, len(personas))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, CACHE_FILE_NAME)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from components.components import metrics
+from components.components.metrics import Histogram, MetricsRegistry
+from components.components.persona import Persona, Criterion
+
+
+def make_persona(i):
+    return Persona.fromData({"descriptor": {"id": f"dev{i}", "type": "base/device/laser", "wavelength": [445, 488][i % 2],
+                                            "nr_channels": 1 + i % 3},
+                             "capabilities": {"setPower": {"type": "service"}} if i % 4 == 0 else {}})
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_quantiles(self):
+        histogram = Histogram()
+        for _ in range(90):
+            histogram.record(3e-6)
+        for _ in range(10):
+            histogram.record(0.5)
+        self.assertEqual(100, histogram.count)
+        self.assertEqual(4e-6, histogram.quantile(0.5))
+        self.assertEqual(4e-6, histogram.quantile(0.9))
+        #Capped by the largest latency instead of the bound of its bucket
+        self.assertEqual(0.5, histogram.quantile(0.99))
+
+    def test_empty(self):
+        snapshot = Histogram().snapshot()
+        self.assertEqual(0, snapshot["count"])
+        self.assertNotEqual(snapshot["p50_s"], snapshot["p50_s"])
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.personas = [make_persona(i) for i in range(12)]
+
+    def tearDown(self):
+        metrics.disable()
+
+    """
+    We show that disable puts the very same functions back, so disabled instrumentation costs nothing
+    """
+    def test_disable_restores_originals(self):
+        originals = (Criterion.checkPersona, Criterion.checkDescriptor, Persona._initFromData)
+        metrics.enable(self.registry)
+        self.assertTrue(metrics.is_enabled())
+        self.assertIsNot(originals[0], Criterion.checkPersona)
+        metrics.disable()
+        self.assertFalse(metrics.is_enabled())
+        self.assertEqual(originals, (Criterion.checkPersona, Criterion.checkDescriptor, Persona._initFromData))
+
+    def test_counts_and_rejections(self):
+        crit = Criterion({"descriptor": {"wavelength": {"eq": 445}}, "capabilities": {"in": ["setPower"]}})
+        compiled = crit.compile()
+        expected = [crit.checkPersona(pers) for pers in self.personas]
+
+        metrics.enable(self.registry)
+        self.assertEqual(expected, [crit.checkPersona(pers) for pers in self.personas])
+        self.assertEqual(expected, [compiled.checkPersona(pers) for pers in self.personas])
+        make_persona(100)
+        snapshot = self.registry.snapshot()
+
+        self.assertEqual(12, snapshot["criterion.checkPersona"]["calls"])
+        self.assertEqual({"rejected": 9}, snapshot["criterion.checkPersona"]["rejections"])
+        self.assertEqual({"rejected": 6}, snapshot["criterion.checkDescriptor"]["rejections"])
+        self.assertEqual(12, snapshot["compiled.checkPersona"]["latency"]["count"])
+        self.assertEqual(9, sum(snapshot["compiled.checkPersona"]["rejections"].values()))
+        self.assertEqual(1, snapshot["persona.build"]["calls"])
+
+    """
+    We show that the rejection reason of a compiled criterion is the key of the step that rejected
+    """
+    def test_compiled_reasons(self):
+        compiled = Criterion({"descriptor": {"nr_channels": {"eq": 1}}}).compile()
+        metrics.enable(self.registry)
+        for pers in self.personas:
+            compiled.checkPersona(pers)
+        self.assertEqual({"nr_channels": 8}, self.registry.snapshot()["compiled.checkPersona"]["rejections"])
+
+    def test_timed_errors(self):
+        def fail(x):
+            raise KeyError(x)
+
+        timed_fail = metrics.timed(fail, "fail", self.registry)
+        with self.assertRaises(KeyError):
+            timed_fail(1)
+        timed_len = metrics.timed(len, "len", self.registry, rejection=lambda n: "empty" if n == 0 else None)
+        self.assertEqual(0, timed_len([]))
+        timed_len([1])
+
+        snapshot = self.registry.snapshot()
+        self.assertEqual((1, 1), (snapshot["fail"]["calls"], snapshot["fail"]["errors"]))
+        self.assertEqual({"empty": 1}, snapshot["len"]["rejections"])
+        self.assertEqual(2, snapshot["len"]["calls"])
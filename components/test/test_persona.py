@@ -1,30 +1,66 @@
+import os
+import pickle
 import unittest
 from components.components.persona import Persona, Criterion
 
+TEST_PROFILES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "interfaces", "profiles", "test")
+
+
 class TestPersona(unittest.TestCase):
     def test_persona_doubleslash(self):
-        doubles_slash_path = r"D:\LIDAROS\interfaces\profiles\test\testpersona_persona_type_doubleslash.json"
+        doubles_slash_path = os.path.join(TEST_PROFILES_DIR, "testpersona_persona_type_doubleslash.json")
         with self.assertRaises(ValueError) as err:
             Persona(doubles_slash_path)
         self.assertIn("A type_leaf is empty", str(err.exception))
 
     def test_persona_endslash(self):
-        end_slash_path = r"D:\LIDAROS\interfaces\profiles\test\testpersona_persona_type_endslash.json"
+        end_slash_path = os.path.join(TEST_PROFILES_DIR, "testpersona_persona_type_endslash.json")
         with self.assertRaises(ValueError) as err:
             Persona(end_slash_path)
         msg = str(err.exception)
         self.assertTrue(("end on slash" in msg) or ("A type_leaf is empty" in msg))
 
     def test_persona_empty(self):
-        empty_type_path = r"D:\LIDAROS\interfaces\profiles\test\testpersona_persona_type_empty.json"
+        empty_type_path = os.path.join(TEST_PROFILES_DIR, "testpersona_persona_type_empty.json")
         with self.assertRaises(ValueError) as err:
             Persona(empty_type_path)
         self.assertIn("empty", str(err.exception))
 
     def test_pass(self):
-        correct_persona = r"D:\LIDAROS\interfaces\profiles\test\testpersona_persona.json"
+        correct_persona = os.path.join(TEST_PROFILES_DIR, "testpersona_persona.json")
         Persona(correct_persona)
         self.assertTrue(True)
 
+    def test_immutable(self):
+        pers = Persona(os.path.join(TEST_PROFILES_DIR, "testpersona_persona.json"))
+        with self.assertRaises(AttributeError):
+            pers.id = "wrong"
+        with self.assertRaises(TypeError):
+            pers.getDescriptor()["id"] = "wrong"
+        with self.assertRaises(TypeError):
+            pers.getCapabilities()["testService1"]["type"] = "topic"
+        with self.assertRaises(AttributeError):
+            pers.getDescriptor()["dummy2_list"].append(1)
+
+    """
+    We show that the getters hand out the same read-only views instead of copies, and that these still compare as lists and dicts
+    """
+    def test_views_are_not_copied(self):
+        pers = Persona(os.path.join(TEST_PROFILES_DIR, "testpersona_persona.json"))
+        self.assertIs(pers.getDescriptor(), pers.getDescriptor())
+        self.assertIs(pers.getCapabilitiesNames(), pers.getCapabilitiesNames())
+        self.assertEqual(["testService1", "testService2"], pers.getCapabilitiesNames())
+        self.assertEqual([82, 85, 66, 73, 67, 79, 78], pers.getDescriptor()["dummy2_list"])
+        self.assertNotEqual((82, 85, 66, 73, 67, 79, 78), pers.getDescriptor()["dummy2_list"])
+
+    def test_data_round_trip(self):
+        pers = Persona(os.path.join(TEST_PROFILES_DIR, "testpersona_persona.json"))
+        data = pers.toData()
+        self.assertEqual("base/device/test", data["descriptor"]["type"])
+        copied = Persona.fromData(data)
+        self.assertEqual(pers.getDescriptor(), copied.getDescriptor())
+        self.assertEqual(pers.getCapabilities(), copied.getCapabilities())
+        self.assertEqual(data, pickle.loads(pickle.dumps(pers)).toData())
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+from components.components.persona import Persona, PersonaRegistry, PersonaStatistics, Criterion, CompiledCriterion, Type
+
+TYPES = ["base/device/laser", "base/device/test", "base/static_component", "base/device/laser/pulsed"]
+
+
+def make_persona_data(i):
+    capabilities = {"setPower": {"type": "service"}} if i % 2 == 0 else {}
+    if i % 3 == 0:
+        capabilities["getTemperature"] = {"type": "service"}
+    return {
+        "descriptor": {
+            "id": f"dev{i}",
+            "vendor": ["Toptica", "Thorlabs", "Coherent"][i % 3],
+            "product": "Product",
+            "description": "Planner test persona",
+            "type": TYPES[i % len(TYPES)],
+            "wavelength": [445, 488, 532, 640][i % 4],
+            "TEM_modes": ["00", "01"][: 1 + i % 2],
+            "calibration": {"offset": i % 2},
+        },
+        "capabilities": capabilities,
+    }
+
+
+class TestPersonaStatistics(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.personas = [Persona.fromData(make_persona_data(i)) for i in range(60)]
+        cls.registry = PersonaRegistry(cls.personas)
+
+    def selectivity(self, stats, criteria_dict):
+        compiled = Criterion(criteria_dict).compile()
+        if compiled.descriptor_rules:
+            return stats.descriptorSelectivity(*compiled.descriptor_rules[0])
+        return stats.capabilitiesSelectivity(compiled.capabilities_rules[0][2])
+
+    """
+    We show that the selectivity is the exact share of passing personas, when all values can be counted
+    """
+    def test_selectivity(self):
+        stats = PersonaStatistics(self.personas)
+        for criteria_dict in [{"descriptor": {"id": {"eq": "dev3"}}},
+                              {"descriptor": {"wavelength": {"eq": 445}}},
+                              {"descriptor": {"type": {"in": Type("device/laser")}}},
+                              {"descriptor": {"vendor": {"in": "o"}}},
+                              {"descriptor": {"missing": {"eq": 1}}},
+                              {"capabilities": {"in": ["setPower"]}},
+                              {"capabilities": {"in": ["setPower", "getTemperature"]}}]:
+            crit = Criterion(criteria_dict)
+            expected = sum(crit.checkPersona(pers) for pers in self.personas) / len(self.personas)
+            self.assertAlmostEqual(expected, self.selectivity(stats, criteria_dict), msg=criteria_dict)
+
+    def test_from_registry(self):
+        criteria_dict = {"descriptor": {"type": {"in": Type("device/laser")}, "wavelength": {"eq": 488}},
+                         "capabilities": {"in": ["setPower"]}}
+        crit = Criterion(criteria_dict)
+        self.assertEqual(crit.plan(PersonaStatistics(self.personas)).estimates, self.registry.plan(crit).estimates)
+
+    def test_empty(self):
+        self.assertEqual(PersonaStatistics.DEFAULT_SELECTIVITY,
+                         self.selectivity(PersonaStatistics(), {"descriptor": {"id": {"eq": "dev3"}}}))
+
+
+class TestPlanner(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.personas = [Persona.fromData(make_persona_data(i)) for i in range(60)]
+        cls.registry = PersonaRegistry(cls.personas)
+
+    """
+    We show that a selective eq on id is checked before an expensive type check written first
+    """
+    def test_cheap_selective_first(self):
+        crit = Criterion({"descriptor": {"type": {"in": Type("base/device/laser")}, "id": {"eq": "dev4"}}})
+        planned = self.registry.plan(crit)
+        self.assertEqual(("id", "eq"), planned.estimates[0][0])
+
+    def test_same_results(self):
+        for criteria_dict in [{"descriptor": {"type": {"in": Type("device/laser")}, "id": {"eq": "dev4"}}},
+                              {"descriptor": {"TEM_modes": {"in": ["01"]}, "calibration": {"eq": {"offset": 1}}},
+                               "capabilities": {"in": ["getTemperature"]}},
+                              {"capabilities": {"eq": ["setPower"]}},
+                              {}]:
+            crit = Criterion(criteria_dict)
+            planned = self.registry.plan(crit)
+            self.assertEqual([crit.checkPersona(pers) for pers in self.personas],
+                             [planned.checkPersona(pers) for pers in self.personas])
+
+    """
+    We show that the counters prove more personas are rejected by the first check after planning
+    """
+    def test_early_exit_rate_improves(self):
+        crit = Criterion({"descriptor": {"type": {"in": Type("device")}, "vendor": {"in": "Coh"}, "id": {"eq": "dev5"}}})
+        written = crit.compile()
+        written.trackExits()
+        planned = self.registry.plan(crit)
+        planned.trackExits()
+        for pers in self.personas:
+            written.checkPersona(pers)
+            planned.checkPersona(pers)
+
+        written_stats = written.exitStats()
+        planned_stats = planned.exitStats()
+        self.assertEqual(60, planned_stats["checks"])
+        self.assertEqual(written_stats["rejections"], planned_stats["rejections"])
+        self.assertGreater(planned_stats["early_exit_rate"], written_stats["early_exit_rate"])
+        self.assertLess(planned_stats["mean_steps"], written_stats["mean_steps"])
+
+    """
+    We show that an in rule with a single number, which the checks iteralize to a list, can be planned
+    """
+    def test_scalar_in(self):
+        crit = Criterion({"descriptor": {"wavelength": {"in": 445}, "vendor": {"in": "Top"}}})
+        planned = self.registry.plan(crit)
+        costs = {rule: cost for rule, cost, _ in planned.estimates}
+        self.assertEqual(CompiledCriterion.IN_COST + 1, costs[("wavelength", "in")])
+        self.assertEqual([crit.checkPersona(pers) for pers in self.personas],
+                         [planned.checkPersona(pers) for pers in self.personas])
+
+    def test_exit_stats(self):
+        compiled = Criterion({"descriptor": {"id": {"eq": "dev1"}}}).compile()
+        for pers in self.personas[:10]:
+            compiled.checkPersona(pers)
+        self.assertEqual(0, compiled.exitStats()["checks"])
+
+        compiled.trackExits()
+        for pers in self.personas[:10]:
+            compiled.checkPersona(pers)
+        self.assertEqual({"checks": 10, "rejections": 9, "rejections_per_step": [9], "early_exit_rate": 1.0,
+                          "mean_steps": 1.0}, compiled.exitStats())
+
+        compiled.trackExits(False)
+        self.assertTrue(compiled.checkPersona(self.personas[1]))
+        self.assertEqual(0, compiled.exitStats()["checks"])
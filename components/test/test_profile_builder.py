@@ -0,0 +1,90 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from interfaces.profiles import profile_builder
+from interfaces.profiles.profile_builder import plan, save_state, state_key, output_path
+
+PROFILES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "interfaces", "profiles")
+
+
+class TestProfileBuilder(unittest.TestCase):
+
+    ALL = [os.path.join("lasers", "IBeam455_persona.jsonnet"), os.path.join("lasers", "IBeam488_persona.jsonnet"),
+           os.path.join("test", "testpersona_persona.jsonnet")]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "profiles")
+        shutil.copytree(PROFILES_DIR, self.root, ignore=shutil.ignore_patterns("*.json", "*.py", "__pycache__"))
+        #A second persona on the laser profile, so it has more than one descendant
+        shutil.copy(self.path("lasers", "IBeam455_persona.jsonnet"), self.path("lasers", "IBeam488_persona.jsonnet"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def markBuilt(self):
+        #What a successful build leaves behind, without compiling
+        _, personas, fingerprints = plan(self.root)
+        for persona in personas:
+            output_path(persona).write_text("{}", encoding="utf-8")
+        save_state(self.root, {state_key(self.root, persona): fingerprints[persona] for persona in personas})
+
+    def edit(self, *parts):
+        with open(self.path(*parts), "a", encoding="utf-8") as f:
+            f.write("\n")
+
+    def stale(self):
+        return sorted(os.path.relpath(path, os.path.realpath(self.root)) for path in plan(self.root)[0])
+
+    def test_first_build(self):
+        self.assertEqual(self.ALL, self.stale())
+        self.markBuilt()
+        self.assertEqual([], self.stale())
+        self.assertEqual(self.ALL, sorted(os.path.relpath(path, os.path.realpath(self.root))
+                                          for path in plan(self.root, force=True)[0]))
+
+    """
+    We show that editing the base profile rebuilds every persona, as all of them import it
+    """
+    def test_base_profile(self):
+        self.markBuilt()
+        self.edit("base", "base_profile.jsonnet")
+        self.assertEqual(self.ALL, self.stale())
+
+    """
+    We show that editing the laser profile only rebuilds the personas that import it
+    """
+    def test_laser_profile(self):
+        self.markBuilt()
+        self.edit("lasers", "laser_profile.jsonnet")
+        self.assertEqual(self.ALL[:2], self.stale())
+
+    def test_persona(self):
+        self.markBuilt()
+        self.edit("lasers", "IBeam455_persona.jsonnet")
+        self.assertEqual(self.ALL[:1], self.stale())
+
+    def test_missing_output(self):
+        self.markBuilt()
+        os.remove(self.path("test", "testpersona_persona.json"))
+        self.assertEqual(self.ALL[2:], self.stale())
+
+    def test_build(self):
+        try:
+            import _jsonnet
+        except ImportError:
+            self.skipTest("jsonnet is not installed")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(0, profile_builder.build(self.root, jobs=2))
+        self.assertTrue(os.path.exists(self.path("lasers", "IBeam455_persona.json")))
+        self.assertEqual([], self.stale())
+
+
+if __name__ == '__main__':
+    unittest.main()
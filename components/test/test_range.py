@@ -0,0 +1,112 @@
+import unittest
+import numpy as np
+from components.components.persona import Persona, PersonaRegistry, Criterion, CriteriaOperator, Type
+from components.components.columnar import PersonaColumns
+
+
+def make_persona_data(i):
+    descriptor = {
+        "id": f"dev{i}",
+        "vendor": "Toptica",
+        "product": "Product",
+        "description": "Range test persona",
+        "type": "base/device/laser",
+        "wavelength": [405, 445, 488, 532, 561, 640, 785.5][i % 7],
+        "nr_channels": 1 + i % 4,
+    }
+    #Values that are not numbers never match a range
+    if i % 11 == 0:
+        descriptor["wavelength"] = "unknown"
+    if i % 13 == 0:
+        descriptor["nr_channels"] = True
+    if i % 17 == 0:
+        del descriptor["nr_channels"]
+    return {"descriptor": descriptor, "capabilities": {}}
+
+
+class TestRangeOperators(unittest.TestCase):
+
+    CRITERIA = [
+        {"descriptor": {"wavelength": {"gt": 488}}},
+        {"descriptor": {"wavelength": {"ge": 488}}},
+        {"descriptor": {"wavelength": {"lt": 488}}},
+        {"descriptor": {"wavelength": {"le": 488}}},
+        {"descriptor": {"wavelength": {"between": [440, 570]}}},
+        {"descriptor": {"wavelength": {"between": [785.5, 785.5]}}},
+        {"descriptor": {"wavelength": {"gt": 1000}}},
+        {"descriptor": {"nr_channels": {CriteriaOperator.GE: 2}}},
+        {"descriptor": {"type": {"in": Type("laser")}, "wavelength": {"between": [400, 500]},
+                        "nr_channels": {"lt": 3}}},
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.personas = [Persona.fromData(make_persona_data(i)) for i in range(80)]
+
+    def expected(self, criteria_dict):
+        return {pers.getID() for pers in self.personas if Criterion(criteria_dict).checkPersona(pers)}
+
+    def test_raw(self):
+        pers = Persona.fromData(make_persona_data(1))
+        self.assertTrue(Criterion({"descriptor": {"wavelength": {"between": [440, 450]}}}).checkPersona(pers))
+        self.assertFalse(Criterion({"descriptor": {"wavelength": {"gt": 445}}}).checkPersona(pers))
+        self.assertTrue(Criterion({"descriptor": {"wavelength": {"ge": 445}}}).checkPersona(pers))
+        self.assertFalse(Criterion({"descriptor": {"vendor": {"lt": 445}}}).checkPersona(pers))
+
+    """
+    We show that the compiled criterion, the registry and the columns agree with the raw check
+    """
+    def test_all_paths_agree(self):
+        registry = PersonaRegistry(self.personas)
+        columns = PersonaColumns(self.personas)
+        for criteria_dict in self.CRITERIA:
+            expected = self.expected(criteria_dict)
+            crit = Criterion(criteria_dict)
+            self.assertEqual(expected, {pers.getID() for pers in self.personas if crit.compile().checkPersona(pers)})
+            self.assertEqual(expected, registry.queryIDs(crit), criteria_dict)
+            self.assertEqual(expected, set(columns.evaluateIDs(crit)), criteria_dict)
+
+    def test_bools_and_strings_never_match(self):
+        ids = self.expected({"descriptor": {"nr_channels": {"ge": 0}}})
+        self.assertNotIn("dev13", ids)
+        self.assertNotIn("dev17", ids)
+        self.assertNotIn("dev11", self.expected({"descriptor": {"wavelength": {"ge": 0}}}))
+
+    """
+    We show that the sorted index follows registrations after it was built
+    """
+    def test_sorted_index_is_incremental(self):
+        registry = PersonaRegistry(self.personas[:40])
+        criteria_dict = {"descriptor": {"wavelength": {"between": [500, 800]}}}
+        registry.queryIDs(Criterion(criteria_dict))
+
+        for pers in self.personas[40:]:
+            registry.register(pers)
+        data = make_persona_data(100)
+        data["descriptor"]["wavelength"] = 700
+        registry.register(Persona.fromData(data))
+        for i in range(0, 80, 3):
+            registry.unregister(f"dev{i}")
+
+        expected = {pers.getID() for pers in registry if Criterion(criteria_dict).checkPersona(pers)}
+        self.assertIn("dev100", expected)
+        self.assertEqual(expected, registry.queryIDs(Criterion(criteria_dict)))
+
+        numbers, id_sets = registry._sortedIndex("wavelength")
+        self.assertEqual(sorted(numbers), numbers)
+        self.assertTrue(all(id_sets))
+
+    def test_invalid_bounds(self):
+        for criteria_dict in [{"descriptor": {"wavelength": {"between": [500]}}},
+                              {"descriptor": {"wavelength": {"between": [800, 500]}}},
+                              {"descriptor": {"wavelength": {"gt": "500"}}},
+                              {"descriptor": {"wavelength": {"le": None}}}]:
+            with self.assertRaises(ValueError):
+                Criterion(criteria_dict).compile()
+
+    def test_large_integers_exact(self):
+        big = 2 ** 60
+        personas = [Persona.fromData({"descriptor": {"id": f"n{i}", "type": "base", "serial": big + i},
+                                      "capabilities": {}}) for i in range(3)]
+        mask = Criterion({"descriptor": {"serial": {"gt": big + 1}}}).checkMany(personas)
+        np.testing.assert_array_equal([False, False, True], mask)
@@ -0,0 +1,84 @@
+import unittest
+from components.components.persona import Persona, PersonaRegistry, Criterion, CriteriaOperator, Type
+
+TYPES = ["base/device/laser", "base/device/test", "base/static_component", "base/device/laser/pulsed"]
+
+
+def make_persona_data(i):
+    capabilities = {"setPower": {"type": "service"}} if i % 2 == 0 else {}
+    if i % 3 == 0:
+        capabilities["getTemperature"] = {"type": "service"}
+    return {
+        "descriptor": {
+            "id": f"dev{i}",
+            "vendor": ["Toptica", "Thorlabs", "Coherent"][i % 3],
+            "product": "Product",
+            "description": "Registry test persona",
+            "type": TYPES[i % len(TYPES)],
+            "wavelength": [445, 488, 532, 640][i % 4],
+            "nr_channels": 1 + i % 3,
+            "TEM_modes": ["00", "01"][: 1 + i % 2],
+            "calibration": {"offset": i % 2},
+        },
+        "capabilities": capabilities,
+    }
+
+
+class TestPersonaRegistry(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.personas = [Persona.fromData(make_persona_data(i)) for i in range(60)]
+        cls.registry = PersonaRegistry(cls.personas)
+
+    def criteria(self):
+        return [
+            {},
+            {"descriptor": {"id": {"eq": "dev7"}}},
+            {"descriptor": {"id": {"in": "dev1"}}},
+            {"descriptor": {"type": {"eq": Type("base/device/laser")}}},
+            {"descriptor": {"type": {"in": Type("device/laser")}}},
+            {"descriptor": {"type": {"in": Type("laser")}}},
+            {"descriptor": {"type": {CriteriaOperator.IN: ["base", "device"]}}},
+            {"descriptor": {"type": {"in": Type("laser/device")}}},
+            {"descriptor": {"wavelength": {"eq": 445}, "nr_channels": {"in": 2}}},
+            {"descriptor": {"vendor": {"in": "lab"}}},
+            {"descriptor": {"TEM_modes": {"in": ["01"]}}},
+            {"descriptor": {"TEM_modes": {"eq": ["00"]}}},
+            {"descriptor": {"calibration": {"eq": {"offset": 1}}}},
+            {"descriptor": {"calibration": {"in": {"offset": 0}}, "wavelength": {"eq": 532}}},
+            {"descriptor": {"missing": {"eq": 1}}},
+            {"capabilities": {"in": ["setPower"]}},
+            {"capabilities": {"in": ["setPower", "getTemperature"]}},
+            {"capabilities": {"eq": ["setPower"]}},
+            {"capabilities": {"eq": []}},
+            {"descriptor": {"type": {"in": Type("base/device")}, "wavelength": {"eq": 488}},
+             "capabilities": {"in": ["getTemperature"]}},
+        ]
+
+    """
+    We show that the indexed query finds exactly the personas a linear scan with checkPersona finds
+    """
+    def test_query_matches_linear_scan(self):
+        for criteria_dict in self.criteria():
+            crit = Criterion(criteria_dict)
+            expected = {pers.getID() for pers in self.personas if crit.checkPersona(pers)}
+            self.assertEqual(expected, self.registry.queryIDs(crit), f"{criteria_dict}")
+
+    def test_unregister_updates_indexes(self):
+        registry = PersonaRegistry(self.personas)
+        crit = Criterion({"descriptor": {"id": {"eq": "dev4"}}, "capabilities": {"in": ["setPower"]}})
+        self.assertEqual({"dev4"}, registry.queryIDs(crit))
+
+        registry.unregister("dev4")
+        self.assertEqual(set(), registry.queryIDs(crit))
+        self.assertNotIn("dev4", registry)
+        self.assertEqual(len(self.personas) - 1, len(registry))
+
+    def test_duplicate_id(self):
+        with self.assertRaises(ValueError):
+            self.registry.register(Persona.fromData(make_persona_data(0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from components.components.persona import Persona
+from components.components.router import Route, routing_table, import_interface, KIND_SERVICE, KIND_TOPIC
+
+
+def make_laser_data():
+    return {
+        "descriptor": {"id": "lazer", "vendor": "Toptica", "product": "IBeam Pro", "description": "Router test",
+                       "type": "base/device/laser", "nr_channels": 2},
+        "capabilities": {
+            "setPower": {"type": "service", "srv_type": "interfaces/SetLaserPower",
+                         "request_channel": "lazer/setPower/request", "response_channel": "lazer/setPower/response"},
+            "telemetry": {"type": "topic", "msg_type": "interfaces/LaserTelemetry", "topic_channel": "lazer/telemetry"},
+            "calibration": {"type": "file", "path": "calibration.csv"},
+        },
+    }
+
+
+class TestRoutingTable(unittest.TestCase):
+
+    def test_routes(self):
+        table = routing_table(Persona.fromData(make_laser_data()))
+        self.assertEqual({
+            "setPower": Route("setPower", KIND_SERVICE, "interfaces/SetLaserPower", "lazer/setPower/request"),
+            "telemetry": Route("telemetry", KIND_TOPIC, "interfaces/LaserTelemetry", "lazer/telemetry"),
+        }, table)
+
+    """
+    We show that capabilities of other kinds are not routed
+    """
+    def test_unknown_kind_skipped(self):
+        self.assertNotIn("calibration", routing_table(Persona.fromData(make_laser_data())))
+
+    def test_missing_channel(self):
+        data = make_laser_data()
+        del data["capabilities"]["setPower"]["request_channel"]
+        with self.assertRaises(ValueError):
+            routing_table(Persona.fromData(data))
+
+    def test_no_capabilities(self):
+        data = make_laser_data()
+        data["capabilities"] = {}
+        self.assertEqual({}, routing_table(Persona.fromData(data)))
+
+    def test_malformed_interface_name(self):
+        with self.assertRaises(ValueError):
+            import_interface("SetLaserPower", "srv")
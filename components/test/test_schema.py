@@ -0,0 +1,149 @@
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from components.components.loader import load_personas
+from components.components.persona import Persona
+from components.components.schema import SchemaValidator, build_schema, validate_directory, CACHE_FILE_NAME
+
+
+def service(pers_id, name, srv_type):
+    return {"type": "service", "srv_type": srv_type, "request_channel": f"{pers_id}/{name}/request",
+            "response_channel": f"{pers_id}/{name}/response", "description": f"Test {name}"}
+
+
+def topic(pers_id, name, msg_type):
+    return {"type": "topic", "msg_type": msg_type, "topic_channel": f"{pers_id}/{name}", "description": f"Test {name}"}
+
+
+def make_laser_data(i, pers_type="base/device/laser"):
+    pers_id = f"laser{i}"
+    return {
+        "descriptor": {"id": pers_id, "vendor": "Toptica", "product": "IBeam Pro", "description": "Schema test",
+                       "type": pers_type, "wavelength": 445, "nr_channels": 1, "TEM_modes": ["00"]},
+        "capabilities": {
+            "setPower": service(pers_id, "setPower", "interfaces/SetLaserPower"),
+            "getPower": service(pers_id, "getPower", "interfaces/GetLaserPower"),
+            "getTemperature": service(pers_id, "getTemperature", "interfaces/GetLaserTemperature"),
+            "telemetry": topic(pers_id, "telemetry", "interfaces/LaserTelemetry"),
+            "telemetryDownsampled": topic(pers_id, "telemetryDownsampled", "interfaces/LaserTelemetry"),
+        },
+    }
+
+
+def write_persona(directory, data):
+    with open(os.path.join(directory, f"{data['descriptor']['id']}_persona.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+class TestSchemaValidator(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schema = build_schema()
+        cls.validator = SchemaValidator(cls.schema)
+
+    def test_schema(self):
+        self.assertEqual({"service", "topic"}, set(self.schema["kinds"]))
+        self.assertIn("srv_type", self.schema["kinds"]["service"])
+        laser = self.schema["profiles"]["base/device/laser"]
+        self.assertIn("wavelength", laser["descriptor"])
+        self.assertEqual({"kind": "service", "fixed": {"srv_type": "interfaces/SetLaserPower"}},
+                         laser["capabilities"]["setPower"])
+
+    def test_valid(self):
+        self.assertEqual([], self.validator.errors(make_laser_data(0)))
+        #Sub-types are checked by the profile of the longest matching type
+        self.assertEqual([], self.validator.errors(make_laser_data(0, "base/device/laser/diode")))
+
+    def test_errors(self):
+        data = make_laser_data(0)
+        del data["descriptor"]["wavelength"]
+        del data["capabilities"]["telemetry"]
+        data["capabilities"]["getPower"]["srv_type"] = "interfaces/SetLaserPower"
+        data["capabilities"]["setPower"]["request_channel"] = ""
+        data["capabilities"]["extra"] = {"type": "action"}
+        errors = self.validator.errors(data)
+
+        self.assertEqual(5, len(errors), errors)
+        for expected in ["descriptor.wavelength", "capabilities.telemetry ", "capabilities.getPower.srv_type",
+                         "capabilities.setPower.request_channel", "capabilities.extra.type"]:
+            self.assertTrue(any(expected in error for error in errors), expected)
+        with self.assertRaises(ValueError):
+            self.validator.validate(data)
+
+    def test_unknown_type(self):
+        data = make_laser_data(0, "other/laser")
+        self.assertEqual(["No profile matches the type other/laser"], self.validator.errors(data))
+
+    """
+    We show that a worker unpickles one validator per schema, not one per file
+    """
+    def test_pickle(self):
+        first = pickle.loads(pickle.dumps(self.validator))
+        self.assertIs(first, pickle.loads(pickle.dumps(self.validator)))
+        self.assertEqual(self.validator.fingerprint, first.fingerprint)
+
+
+class TestValidateDirectory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+        for i in range(40):
+            write_persona(self.directory, make_laser_data(i))
+        self.validator = SchemaValidator(build_schema())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_validate_directory(self):
+        results = validate_directory(self.directory, self.validator, executor="thread")
+        self.assertEqual(40, len(results))
+        self.assertFalse(any(results.values()))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, CACHE_FILE_NAME)))
+
+        data = make_laser_data(3)
+        del data["capabilities"]["setPower"]
+        write_persona(self.directory, data)
+        results = validate_directory(self.directory, self.validator, executor="thread")
+        self.assertEqual([os.path.join(self.directory, "laser3_persona.json")],
+                         [path for path, errors in results.items() if errors])
+
+    """
+    We show that cached results are only reused for the schema they were checked against
+    """
+    def test_cache_keyed_by_schema(self):
+        validate_directory(self.directory, self.validator, executor="thread")
+        schema = build_schema()
+        schema["profiles"]["base/device/laser"]["descriptor"].append("serial_nr")
+        results = validate_directory(self.directory, SchemaValidator(schema), executor="thread")
+        self.assertTrue(all(results.values()))
+
+    def test_load_personas(self):
+        data = make_laser_data(5)
+        data["capabilities"]["telemetry"]["type"] = "service"
+        write_persona(self.directory, data)
+
+        personas, stats = load_personas(self.directory, executor="thread", strict=False, use_cache=False)
+        self.assertEqual(40, len(personas))
+        personas, stats = load_personas(self.directory, executor="thread", strict=False, use_cache=False,
+                                        schema=self.validator)
+        self.assertEqual(39, len(personas))
+        self.assertIn("capabilities.telemetry", stats.errors[os.path.join(self.directory, "laser5_persona.json")])
+
+
+class TestCapabilityStructure(unittest.TestCase):
+
+    def test_capability_without_type(self):
+        data = make_laser_data(0)
+        del data["capabilities"]["setPower"]["type"]
+        with self.assertRaises(ValueError):
+            Persona.fromData(data)
+        with self.assertRaises(ValueError):
+            Persona.fromData({"descriptor": make_laser_data(0)["descriptor"], "capabilities": ["setPower"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import itertools
+import pickle
+import unittest
+from components.components.persona import Type, TypeTrie, _kmpContains
+
+
+class TestType(unittest.TestCase):
+
+    """
+    We show that types are interned, so equal type strings and type trees give the same object
+    """
+    def test_interned(self):
+        self.assertIs(Type("base/device/laser"), Type(["base", "device", "laser"]))
+        self.assertIs(Type("base/device/laser"), Type(("base", "device", "laser")))
+        self.assertIs(Type("base"), Type(Type("base")))
+        self.assertIs(Type("base/device"), pickle.loads(pickle.dumps(Type("base/device"))))
+        self.assertIsNot(Type("base/device"), Type("device/base"))
+
+    def test_immutable_and_hashable(self):
+        laser = Type("base/device/laser")
+        self.assertEqual(("base", "device", "laser"), laser.type_tree)
+        with self.assertRaises(AttributeError):
+            laser._type_tree = ("base",)
+        self.assertEqual({laser: 1}[Type("base/device/laser")], 1)
+        self.assertNotEqual(laser, "base/device/laser")
+
+    def test_invalid(self):
+        for type_str in ["", "base//device", "base/device/"]:
+            with self.assertRaises(ValueError):
+                Type(type_str)
+        with self.assertRaises(TypeError):
+            Type(42)
+
+    """
+    We show that the linear time ordered check agrees with the sliding window check
+    """
+    def test_kmp_matches_sliding_window(self):
+        for sequence in itertools.product("ab", repeat=5):
+            for n in range(4):
+                for pattern in itertools.product("ab", repeat=n):
+                    expected = n == 0 or any(sequence[i:i + n] == pattern for i in range(len(sequence) - n + 1))
+                    self.assertEqual(expected, _kmpContains(pattern, sequence), f"{pattern} {sequence}")
+
+
+class TestTypeTrie(unittest.TestCase):
+
+    TYPES = ["base/device/laser", "base/device/laser/pulsed", "base/device/camera",
+             "base/static_component", "base/device/device/laser"]
+
+    def setUp(self):
+        self.trie = TypeTrie()
+        self.types = {f"id{i}": Type(type_str) for i, type_str in enumerate(self.TYPES)}
+        for pers_id, pers_type in self.types.items():
+            self.trie.add(pers_type, pers_id)
+
+    def test_subtree(self):
+        self.assertEqual({"id0", "id1", "id2", "id4"}, self.trie.subtree(Type("base/device")))
+        self.assertEqual({"id0", "id1"}, self.trie.subtree(["base", "device", "laser"]))
+        self.assertEqual(set(self.types), self.trie.subtree(()))
+        self.assertEqual(set(), self.trie.subtree(Type("device")))
+
+    """
+    We show that the trie walk finds the same personas as checking every type tree
+    """
+    def test_containing_matches_every_type(self):
+        sub_paths = [("laser",), ("device", "laser"), ("device", "device"), ("device", "device", "laser"),
+                     ("base",), ("laser", "device"), ("pulsed",), ()]
+        for sub_path in sub_paths:
+            expected = {pers_id for pers_id, pers_type in self.types.items()
+                        if _kmpContains(sub_path, pers_type.type_tree)}
+            self.assertEqual(expected, self.trie.containing(sub_path), f"{sub_path}")
+
+    def test_discard(self):
+        self.trie.discard(Type("base/device/laser/pulsed"), "id1")
+        self.assertEqual({"id0", "id4"}, self.trie.containing(Type("laser")))
+        self.assertEqual(set(), self.trie.subtree(Type("base/device/laser/pulsed")))
+        #Discarding with the wrong type leaves the trie untouched
+        self.trie.discard(Type("base/device/camera"), "id0")
+        self.assertEqual({"id0"}, self.trie.subtree(Type("base/device/laser")))
+
+
+if __name__ == '__main__':
+    unittest.main()
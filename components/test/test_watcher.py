@@ -0,0 +1,209 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from components.components.persona import Persona, PersonaRegistry, Criterion, Type
+from components.components.watcher import PersonaWatcher, apply_changes, ADDED, CHANGED, REMOVED
+
+
+def make_persona_data(i, wavelength=445, nr_channels=1):
+    capabilities = {"setPower": {"type": "service", "srv_type": "interfaces/SetLaserPower"}} if i % 2 == 0 else {}
+    return {
+        "descriptor": {"id": f"dev{i}", "vendor": "Toptica", "product": "IBeam Pro", "description": "Watcher test",
+                       "type": "base/device/laser", "wavelength": wavelength, "nr_channels": nr_channels},
+        "capabilities": capabilities,
+    }
+
+
+def write_persona(directory, data, name=None):
+    path = os.path.join(directory, name or f"{data['descriptor']['id']}_persona.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    #The stat has to change even when the file system keeps coarse timestamps
+    stamp = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(stamp, stamp))
+    return path
+
+
+class TestPersonaDiff(unittest.TestCase):
+
+    def test_diff(self):
+        old = Persona.fromData(make_persona_data(0))
+        data = make_persona_data(0, wavelength=488)
+        del data["descriptor"]["nr_channels"]
+        data["descriptor"]["shutter"] = True
+        data["capabilities"]["getPower"] = {"type": "service"}
+        diff = old.diff(Persona.fromData(data))
+
+        self.assertEqual({"wavelength": (445, 488), "nr_channels": (1, None), "shutter": (None, True)}, diff.descriptor)
+        self.assertEqual(["getPower"], list(diff.capabilities))
+        self.assertTrue(diff.names_changed)
+        self.assertFalse(old.diff(Persona.fromData(make_persona_data(0))))
+
+    """
+    We show that 1 becoming True is a change, even though 1 == True
+    """
+    def test_bool_is_not_int(self):
+        old = Persona.fromData(make_persona_data(0, nr_channels=1))
+        self.assertEqual({"nr_channels": (1, True)}, old.diff(Persona.fromData(make_persona_data(0, nr_channels=True))).descriptor)
+
+
+class TestRegistryUpdate(unittest.TestCase):
+
+    CRITERIA = [
+        {"descriptor": {"wavelength": {"eq": 488}}},
+        {"descriptor": {"wavelength": {"between": [400, 450]}}},
+        {"descriptor": {"nr_channels": {"ge": 1}}},
+        {"descriptor": {"type": {"in": Type("device/laser/pulsed")}}},
+        {"capabilities": {"in": ["setPower"]}},
+        {"capabilities": {"eq": ["getPower"]}},
+    ]
+
+    def test_matches_fresh_registry(self):
+        personas = [Persona.fromData(make_persona_data(i, wavelength=[445, 488][i % 2])) for i in range(20)]
+        registry = PersonaRegistry(personas)
+        #Builds the lazily built indexes, so the update has to keep them in step
+        for criteria_dict in self.CRITERIA:
+            registry.queryIDs(Criterion(criteria_dict))
+        columns = registry.columns()
+
+        edits = []
+        for i in range(0, 20, 3):
+            data = make_persona_data(i, wavelength=[405, 488, 532][i % 3], nr_channels=[True, 2, 1][i % 3])
+            data["descriptor"]["type"] = "base/device/laser/pulsed" if i % 2 else "base/device/laser"
+            data["capabilities"] = {"getPower": {"type": "service"}} if i % 4 == 0 else data["capabilities"]
+            edits.append(Persona.fromData(data))
+        for pers in edits:
+            registry.update(pers)
+
+        fresh = PersonaRegistry(registry)
+        self.assertIs(columns, registry.columns())
+        for criteria_dict in self.CRITERIA:
+            crit = Criterion(criteria_dict)
+            self.assertEqual(fresh.queryIDs(crit), registry.queryIDs(crit), criteria_dict)
+            self.assertEqual(sorted(fresh.queryIDs(crit)), sorted(registry.evaluate(crit)), criteria_dict)
+
+    """
+    We show that the index entries of unchanged values are left alone
+    """
+    def test_only_affected_entries(self):
+        registry = PersonaRegistry(Persona.fromData(make_persona_data(i)) for i in range(4))
+        vendor_ids = registry._descriptor_index["vendor"]["Toptica"][1]
+        capability_ids = registry._capability_index["setPower"]
+
+        diff = registry.update(Persona.fromData(make_persona_data(0, wavelength=640)))
+        self.assertEqual(["wavelength"], list(diff.descriptor))
+        self.assertIs(vendor_ids, registry._descriptor_index["vendor"]["Toptica"][1])
+        self.assertIs(capability_ids, registry._capability_index["setPower"])
+        self.assertEqual({"dev0"}, registry.queryIDs(Criterion({"descriptor": {"wavelength": {"eq": 640}}})))
+
+    def test_unknown_id(self):
+        with self.assertRaises(ValueError):
+            PersonaRegistry().update(Persona.fromData(make_persona_data(0)))
+
+
+class TestPersonaWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_changes(self):
+        path = write_persona(self.directory, make_persona_data(0))
+        write_persona(self.directory, make_persona_data(1))
+        watcher = PersonaWatcher(self.directory)
+        self.assertEqual([ADDED, ADDED], [change.kind for change in watcher.poll()])
+        self.assertEqual([], watcher.poll())
+
+        write_persona(self.directory, make_persona_data(0, wavelength=488))
+        changes = watcher.poll()
+        self.assertEqual([CHANGED], [change.kind for change in changes])
+        self.assertEqual({"wavelength": (445, 488)}, changes[0].diff.descriptor)
+
+        os.remove(path)
+        self.assertEqual([(REMOVED, "dev0")], [(change.kind, change.old.getID()) for change in watcher.poll()])
+
+    """
+    We show that rewriting a file without changing the persona is not reported, and broken files keep their persona
+    """
+    def test_unchanged_and_broken(self):
+        data = make_persona_data(0)
+        path = write_persona(self.directory, data)
+        watcher = PersonaWatcher(self.directory)
+        watcher.poll()
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        os.utime(path, ns=(os.stat(path).st_mtime_ns + 2_000_000_000,) * 2)
+        self.assertEqual([], watcher.poll())
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"descriptor": {')
+        os.utime(path, ns=(os.stat(path).st_mtime_ns + 3_000_000_000,) * 2)
+        self.assertEqual([], watcher.poll())
+        self.assertIn(path, watcher.errors)
+        self.assertEqual("dev0", watcher.personas()[path].getID())
+
+    """
+    We show that a persona moved to another file is one CHANGED, which a registry can apply
+    """
+    def test_rename(self):
+        path = write_persona(self.directory, make_persona_data(0))
+        watcher = PersonaWatcher(self.directory)
+        registry = PersonaRegistry()
+        apply_changes(watcher.poll(), registry)
+
+        os.remove(path)
+        write_persona(self.directory, make_persona_data(0, wavelength=488), name="renamed.json")
+        changes = watcher.poll()
+        self.assertEqual([(CHANGED, "dev0")], [(change.kind, change.new.getID()) for change in changes])
+        apply_changes(changes, registry)
+        self.assertEqual({"dev0"}, registry.queryIDs(Criterion({"descriptor": {"wavelength": {"eq": 488}}})))
+
+        #Moved again without an edit, nothing changed
+        os.rename(os.path.join(self.directory, "renamed.json"), os.path.join(self.directory, "again.json"))
+        self.assertEqual([], watcher.poll())
+        self.assertEqual(["again.json"], [os.path.basename(p) for p in watcher.personas()])
+
+    """
+    We show that a removal is applied before an addition that reuses its id
+    """
+    def test_removals_first(self):
+        write_persona(self.directory, make_persona_data(0), name="b.json")
+        data = make_persona_data(1)
+        write_persona(self.directory, data, name="a.json")
+        watcher = PersonaWatcher(self.directory)
+        registry = PersonaRegistry()
+        apply_changes(watcher.poll(), registry)
+
+        #a.json takes over the id of b.json, which is removed
+        os.remove(os.path.join(self.directory, "b.json"))
+        data["descriptor"]["id"] = "dev0"
+        write_persona(self.directory, data, name="a.json")
+        changes = watcher.poll()
+        self.assertEqual([REMOVED, CHANGED], [change.kind for change in changes])
+        apply_changes(changes, registry)
+        self.assertEqual(1, len(registry))
+
+    def test_apply_changes(self):
+        for i in range(3):
+            write_persona(self.directory, make_persona_data(i))
+        watcher = PersonaWatcher(self.directory)
+        registry = PersonaRegistry()
+        apply_changes(watcher.poll(), registry)
+        self.assertEqual(3, len(registry))
+
+        class Component:
+            persona = None
+
+            def reloadPersona(self, pers):
+                self.persona = pers
+
+        component = Component()
+        write_persona(self.directory, make_persona_data(1, nr_channels=3))
+        apply_changes(watcher.poll(), registry, {"dev1": component})
+        self.assertEqual(3, component.persona.getDescriptor()["nr_channels"])
+        self.assertEqual({"dev1"}, registry.queryIDs(Criterion({"descriptor": {"nr_channels": {"eq": 3}}})))
@@ -0,0 +1,43 @@
+"""
+Lets one pytest run from the repository root collect the tests of every package.
+
+The component tests import the repository layout (components.components.persona). The laser tests import the
+installed layout of the ROS packages (components.persona, lasers.telemetry), as the laser modules themselves do. The
+lasers package is put on the path, and the installed names of the components modules are made aliases of their
+repository modules, so both layouts share one module and one set of classes.
+"""
+import importlib
+import importlib.abc
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+COMPONENTS_DIR = os.path.join(ROOT, "components", "components")
+
+#The lasers package is found in lasers/lasers, like after colcon build
+sys.path.insert(0, os.path.join(ROOT, "lasers"))
+
+
+class _InstalledComponents(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+
+    """
+    Imports components.<module> as components.components.<module>
+    """
+
+    def find_spec(self, fullname, path=None, target=None):
+        package, _, module_name = fullname.partition(".")
+        if package != "components" or "." in module_name or \
+                not os.path.isfile(os.path.join(COMPONENTS_DIR, f"{module_name}.py")):
+            return None
+        return importlib.util.spec_from_loader(fullname, self)
+
+    def create_module(self, spec):
+        #The module keeps its own name and spec, only the alias is added to sys.modules
+        return importlib.import_module(f"components.components.{spec.name.partition('.')[2]}")
+
+    def exec_module(self, module):
+        pass
+
+
+sys.meta_path.insert(0, _InstalledComponents())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Incremental build of all personas under interfaces/profiles.
+
+Every *.jsonnet file is scanned for imports to build the dependency graph. A persona (*_persona.jsonnet) is only
+recompiled when the content of the persona itself or of one of its transitive imports changed since the last build.
+Touching base/base_profile.jsonnet rebuilds every persona, touching lasers/IBeam455_persona.jsonnet rebuilds one.
+Independent personas are compiled in parallel.
+
+Usage:
+    python profile_builder.py [root] [--jobs N] [--force] [--dry-run] [--watch [--interval S]]
+"""
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+STATE_FILE_NAME = ".profile_build_state.json"
+PERSONA_SUFFIX = "_persona.jsonnet"
+IMPORT_PATTERN = re.compile(r"""\b(?:import|importstr|importbin)\s+(['"])(.+?)\1""")
+
+
+def scan(root):
+    """
+    :return: Sorted list of all jsonnet sources under root
+    """
+    root = pathlib.Path(root)
+    return sorted(path.resolve() for pattern in ("*.jsonnet", "*.libsonnet") for path in root.rglob(pattern))
+
+
+def parse_imports(path):
+    """
+    :return: The files imported by path - like jsonnet, imports are resolved relative to the importing file
+    """
+    imports = []
+    for match in IMPORT_PATTERN.finditer(path.read_text(encoding="utf-8")):
+        imported = (path.parent / match.group(2)).resolve()
+        if imported.exists():
+            imports.append(imported)
+    return imports
+
+
+def build_graph(sources):
+    """
+    :return: Dict of file -> directly imported files
+    """
+    graph = {}
+    pending = list(sources)
+    while pending:
+        path = pending.pop()
+        if path in graph:
+            continue
+        graph[path] = parse_imports(path)
+        #Imports from outside the scanned root are tracked as well
+        pending.extend(imported for imported in graph[path] if imported not in graph)
+    return graph
+
+
+def transitive_dependencies(graph, path, memo=None):
+    """
+    :return: Set of path and everything it imports, directly or indirectly
+    """
+    memo = {} if memo is None else memo
+    if path in memo:
+        return memo[path]
+
+    #Marked before recursing, so an import cycle terminates
+    memo[path] = deps = {path}
+    for imported in graph.get(path, ()):
+        deps |= transitive_dependencies(graph, imported, memo)
+    return deps
+
+
+def state_key(root, path):
+    #Relative paths keep the state valid when the checkout moves
+    return os.path.relpath(path, pathlib.Path(root).resolve())
+
+
+def file_hash(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def output_path(path):
+    return path.with_suffix(".json")
+
+
+def load_state(root):
+    try:
+        return json.loads((pathlib.Path(root) / STATE_FILE_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(root, state):
+    state_path = pathlib.Path(root) / STATE_FILE_NAME
+    tmp_path = state_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(state, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, state_path)
+
+
+def plan(root, force=False):
+    """
+    :return: (personas to rebuild, all personas, {persona: {dependency state key: hash}})
+    """
+    graph = build_graph(scan(root))
+    personas = sorted(path for path in graph if path.name.endswith(PERSONA_SUFFIX))
+    state = load_state(root)
+
+    hashes = {}
+    memo = {}
+    fingerprints = {}
+    stale = []
+    for persona in personas:
+        deps = transitive_dependencies(graph, persona, memo)
+        fingerprint = {state_key(root, dep): hashes.setdefault(dep, file_hash(dep)) for dep in sorted(deps)}
+        fingerprints[persona] = fingerprint
+
+        if force or state.get(state_key(root, persona)) != fingerprint or not output_path(persona).exists():
+            stale.append(persona)
+
+    return stale, personas, fingerprints
+
+
+def compile_persona(path):
+    """
+    Runs in the worker pool.
+
+    :return: (path, error message or None, whether the output changed)
+    """
+    import _jsonnet
+
+    try:
+        out = _jsonnet.evaluate_file(str(path))
+    except RuntimeError as err:
+        return path, str(err), False
+
+    out_path = output_path(path)
+    #Unchanged outputs are left alone, so their timestamps keep meaning something to downstream tools
+    if out_path.exists() and out_path.read_text(encoding="utf-8") == out:
+        return path, None, False
+    out_path.write_text(out, encoding="utf-8")
+    return path, None, True
+
+
+def build(root, jobs=None, force=False, dry_run=False):
+    """
+    :return: Number of personas that failed to compile
+    """
+    start = time.perf_counter()
+    stale, personas, fingerprints = plan(root, force)
+    print(f"{len(stale)}/{len(personas)} persona(s) out of date")
+
+    if dry_run or not stale:
+        for path in stale:
+            print(f"  would build {path}")
+        return 0
+
+    if len(stale) == 1:
+        results = [compile_persona(stale[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(compile_persona, stale))
+
+    state = load_state(root)
+    #Personas that no longer exist are dropped from the state
+    known = {state_key(root, path) for path in fingerprints}
+    state = {key: value for key, value in state.items() if key in known}
+    failed = 0
+    for path, error, changed in results:
+        if error is None:
+            state[state_key(root, path)] = fingerprints[path]
+            print(f"{'Wrote' if changed else 'Unchanged'} {output_path(path)}")
+        else:
+            failed += 1
+            state.pop(state_key(root, path), None)
+            print(f"Failed {path}\n{error}", file=sys.stderr)
+    save_state(root, state)
+
+    print(f"Built {len(stale) - failed}/{len(stale)} in {time.perf_counter() - start:.2f} s")
+    return failed
+
+
+def snapshot(root):
+    return {path: path.stat().st_mtime_ns for path in scan(root)}
+
+
+def watch(root, jobs=None, interval=0.5):
+    """
+    Rebuilds whenever a jsonnet file is added, removed or modified - polls, so no extra dependencies are needed.
+    """
+    build(root, jobs)
+    last = snapshot(root)
+    print(f"Watching {root} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot(root)
+            if current != last:
+                last = current
+                build(root, jobs)
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally compile the jsonnet personas")
+    parser.add_argument("root", nargs="?", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Number of parallel compilations")
+    parser.add_argument("--force", action="store_true", help="Rebuild every persona")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the personas that would be rebuilt")
+    parser.add_argument("--watch", action="store_true", help="Keep running and rebuild on change")
+    parser.add_argument("--interval", type=float, default=0.5, help="Polling interval of --watch in seconds")
+    args = parser.parse_args()
+
+    if args.watch:
+        watch(args.root, args.jobs, args.interval)
+    else:
+        sys.exit(1 if build(args.root, args.jobs, args.force, args.dry_run) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,144 @@
 #!/usr/bin/env python3
+"""
+Writes test personas.
+
+    personagenerator.py <input.json>
+        Writes the malformed type variants of input.json next to it.
+
+    personagenerator.py --corpus N [--out DIR] [--seed S]
+        Writes a synthetic corpus of N compiled personas - with realistic type trees, descriptor fields and
+        capability sets - in shards of SHARD_SIZE files under DIR. The same N and seed always give the same corpus.
+"""
 import sys, json, os
+import argparse
+import random
+
+SHARD_SIZE = 1000
+
+VENDORS = {
+    "laser": ["Toptica", "Coherent", "Omicron", "Cobolt", "Thorlabs"],
+    "camera": ["Hamamatsu", "Andor", "Basler", "Photometrics"],
+    "stage": ["Physik Instrumente", "Thorlabs", "Newport", "Zaber"],
+    "powermeter": ["Thorlabs", "Ophir", "Newport"],
+    "shutter": ["Uniblitz", "Thorlabs"],
+    "optic": ["Thorlabs", "Edmund Optics", "Semrock", "Chroma"],
+}
+
+WAVELENGTHS = [405, 445, 488, 515, 532, 561, 594, 638, 660, 785]
+
+
+def service(pers_id, name, srv_type, description):
+    return {"type": "service", "srv_type": srv_type, "request_channel": f"{pers_id}/{name}/request",
+            "response_channel": f"{pers_id}/{name}/response", "description": description}
+
+
+def topic(pers_id, name, msg_type, description):
+    return {"type": "topic", "msg_type": msg_type, "topic_channel": f"{pers_id}/{name}", "description": description}
+
+
+def laser(rng, pers_id):
+    descriptor = {"wavelength": rng.choice(WAVELENGTHS), "nr_channels": rng.choice([1, 1, 1, 2, 2, 4]),
+                  "TEM_modes": rng.choice([["00"], ["00"], ["00", "01"]])}
+    capabilities = {
+        "setPower": service(pers_id, "setPower", "interfaces/SetLaserPower", "Sets the output power in watts"),
+        "getPower": service(pers_id, "getPower", "interfaces/GetLaserPower", "Gets the output power in watts"),
+        "getTemperature": service(pers_id, "getTemperature", "interfaces/GetLaserTemperature", "Gets the temperature"),
+        #Required by laser_profile.jsonnet, so every compiled laser has them
+        "telemetry": topic(pers_id, "telemetry", "interfaces/LaserTelemetry", "Laser telemetry"),
+        "telemetryDownsampled": topic(pers_id, "telemetryDownsampled", "interfaces/LaserTelemetry",
+                                      "Downsampled laser telemetry"),
+    }
+    return descriptor, capabilities
+
+
+def camera(rng, pers_id):
+    descriptor = {"resolution": rng.choice([[2048, 2048], [1920, 1200], [1024, 1024]]),
+                  "pixel_size_um": rng.choice([3.45, 5.86, 6.5, 11.0]), "bit_depth": rng.choice([12, 16])}
+    capabilities = {
+        "image": topic(pers_id, "image", "sensor_msgs/Image", "Camera frames"),
+        "setExposure": service(pers_id, "setExposure", "interfaces/SetExposure", "Sets the exposure time in seconds"),
+    }
+    if rng.random() < 0.5:
+        capabilities["trigger"] = service(pers_id, "trigger", "std_srvs/Trigger", "Takes one frame")
+    return descriptor, capabilities
+
+
+def stage(rng, pers_id):
+    descriptor = {"nr_axes": rng.choice([1, 2, 3]), "travel_mm": rng.choice([25, 50, 100, 300])}
+    capabilities = {
+        "move": service(pers_id, "move", "interfaces/MoveStage", "Moves to an absolute position"),
+        "position": topic(pers_id, "position", "geometry_msgs/Point", "Current position"),
+    }
+    if rng.random() < 0.3:
+        capabilities["home"] = service(pers_id, "home", "std_srvs/Trigger", "Homes all axes")
+    return descriptor, capabilities
+
+
+def powermeter(rng, pers_id):
+    descriptor = {"wavelength_range": rng.choice([[400, 1100], [190, 1100], [700, 1800]])}
+    capabilities = {"power": topic(pers_id, "power", "std_msgs/Float64", "Measured power in watts")}
+    return descriptor, capabilities
+
+
+def shutter(rng, pers_id):
+    return {"aperture_mm": rng.choice([3, 6, 12])}, {
+        "setOpen": service(pers_id, "setOpen", "std_srvs/SetBool", "Opens or closes the shutter")}
+
+
+def static(rng, pers_id):
+    return {"diameter_mm": rng.choice([12.7, 25.4, 50.8])}, {}
+
+
+#(type, vendor category, descriptor and capabilities, weight)
+CATEGORIES = [
+    ("base/device/laser", "laser", laser, 6),
+    ("base/device/laser/diode", "laser", laser, 4),
+    ("base/device/laser/dpss", "laser", laser, 2),
+    ("base/device/camera/scmos", "camera", camera, 4),
+    ("base/device/camera/ccd", "camera", camera, 2),
+    ("base/device/stage/linear", "stage", stage, 5),
+    ("base/device/stage/rotation", "stage", stage, 2),
+    ("base/device/powermeter", "powermeter", powermeter, 2),
+    ("base/device/shutter", "shutter", shutter, 3),
+    ("base/static_component/mirror", "optic", static, 8),
+    ("base/static_component/lens", "optic", static, 6),
+    ("base/static_component/filter/dichroic", "optic", static, 3),
+    ("base/static_component/table", "optic", static, 1),
+]
+
+
+def make_persona(rng, i):
+    """
+    :return: The data of the i-th synthetic persona, as compiled from the jsonnet profiles
+    """
+    pers_type, vendor_category, make_fields, _ = rng.choices(CATEGORIES, weights=[c[3] for c in CATEGORIES])[0]
+    pers_id = f"{pers_type.rsplit('/', 1)[-1]}{i}"
+    vendor = rng.choice(VENDORS[vendor_category])
+    descriptor, capabilities = make_fields(rng, pers_id)
+    descriptor.update({
+        "id": pers_id,
+        "vendor": vendor,
+        "product": f"{vendor.split()[0]} {pers_type.rsplit('/', 1)[-1].title()} {rng.randint(1, 40)}",
+        "type": pers_type,
+        "description": f"Synthetic {pers_type.rsplit('/', 1)[-1]} persona",
+    })
+    return {"descriptor": descriptor, "capabilities": capabilities}
+
+
+def write_corpus(out_dir, nr_personas, seed=0):
+    """
+    :return: Number of persona files written
+    """
+    rng = random.Random(seed)
+    for i in range(nr_personas):
+        data = make_persona(rng, i)
+        shard_dir = os.path.join(out_dir, f"shard{i // SHARD_SIZE:04d}")
+        if i % SHARD_SIZE == 0:
+            os.makedirs(shard_dir, exist_ok=True)
+        with open(os.path.join(shard_dir, f"{data['descriptor']['id']}_persona.json"), "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    return nr_personas
+
 
 def ensure_trailing_slash(s: str) -> str:
     return s if s.endswith("/") else s + "/"
@@ -27,8 +166,18 @@ def set_descriptor_type(obj, transform):
     return obj
 
 def main():
+    if "--corpus" in sys.argv:
+        parser = argparse.ArgumentParser(description="Write a synthetic persona corpus")
+        parser.add_argument("--corpus", type=int, required=True, help="Number of personas, e.g. 1000, 10000 or 100000")
+        parser.add_argument("--out", default=None, help="Output directory, corpus_<N> next to this script by default")
+        parser.add_argument("--seed", type=int, default=0)
+        args = parser.parse_args()
+        out_dir = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), f"corpus_{args.corpus}")
+        print(f"Wrote {write_corpus(out_dir, args.corpus, args.seed)} personas to {out_dir}")
+        return
+
     if len(sys.argv) != 2:
-        print(f"Usage: {os.path.basename(sys.argv[0])} <input.json>")
+        print(f"Usage: {os.path.basename(sys.argv[0])} <input.json> | --corpus N [--out DIR] [--seed S]")
         sys.exit(1)
 
     in_path = sys.argv[1]
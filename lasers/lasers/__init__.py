@@ -0,0 +1,34 @@
+"""
+Laser nodes and the ROS-free telemetry helpers they are built on.
+
+Names are imported from their modules on first access (PEP 562). The helpers in lasers.telemetry need no ROS, the
+nodes need rclpy and the generated interfaces of a sourced workspace.
+"""
+import importlib
+
+#name -> module it lives in
+_LAZY = {
+    "PowerCommandCoalescer": "telemetry",
+    "TelemetryCache": "telemetry",
+    "TelemetryRing": "telemetry",
+    "LaserProfile": "lasernode",
+    "SimulatedLaser": "simulated_laser",
+    "SimulatedDevice": "simulated_device",
+    "RampProfile": "ramp",
+    "RampScheduler": "ramp",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    module_name = _LAZY.get(name, None)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
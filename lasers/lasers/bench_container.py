@@ -0,0 +1,182 @@
+"""
+Memory and startup time of N simulated lasers hosted in one container against one process per laser.
+
+Writes N copies of a persona with distinct ids, then starts them once as a single components.container process and
+once as N container processes hosting one laser each. Startup is the wall time until every process reports that its
+nodes are constructed. Memory is read from /proc after the processes settle: RSS counts the shared libraries once per
+process, PSS splits them between the processes sharing them.
+
+Linux only. Run in a sourced workspace:
+    python3 -m lasers.bench_container [persona json] [--nodes 1 4 16] [--settle 1.0] [--json out]
+"""
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from lasers.simulated_device import default_persona_path
+
+NODE_CLASS = "lasers.simulated_laser:SimulatedLaser"
+READY_PREFIX = "Hosting"
+
+
+def with_id(data: dict, pers_id: str) -> dict:
+    """
+    :return: Copy of the persona data with the id pers_id - the channels named after the old id, <id>/..., follow it
+    """
+    old_id = data["descriptor"]["id"]
+    data = json.loads(json.dumps(data))
+    data["descriptor"]["id"] = pers_id
+    for capability in data["capabilities"].values():
+        for field, value in capability.items():
+            if field.endswith("_channel") and isinstance(value, str) and value.startswith(f"{old_id}/"):
+                capability[field] = pers_id + value[len(old_id):]
+    return data
+
+
+def write_personas(persona_path: str, nr_nodes: int, out_dir: str) -> list:
+    """
+    :return: Paths of nr_nodes copies of the persona, with the ids - and so the channel names - laser0, laser1, ...
+    """
+    with open(persona_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    paths = []
+    for i in range(nr_nodes):
+        path = os.path.join(out_dir, f"laser{i}_persona.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(with_id(data, f"laser{i}"), f, indent=2)
+        paths.append(path)
+    return paths
+
+
+def memory_kb(pid: int) -> tuple:
+    """
+    :return: (RSS, PSS) of the process in kB, PSS is 0 if the kernel doesn't report it
+    """
+    rss = pss = 0
+    with open(f"/proc/{pid}/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+
+def _watch_output(index: int, process, ready: queue.Queue):
+    """
+    Puts (index, whether the process reported ready) on the queue, then keeps reading so the process never blocks on
+    a full pipe.
+    """
+    is_ready = False
+    for line in process.stdout:
+        if not is_ready and line.startswith(READY_PREFIX):
+            is_ready = True
+            ready.put((index, True))
+    if not is_ready:
+        ready.put((index, False))
+
+
+def start(process_entries: list, timeout_s: float) -> tuple:
+    """
+    :param process_entries: One list of container entries per process
+    :return: (processes, seconds until all of them reported ready)
+    """
+    begin = time.perf_counter()
+    deadline = begin + timeout_s
+    processes = []
+    #readline can't time out, so the output is read on threads and the wait for it on the queue times out instead
+    ready = queue.Queue()
+    try:
+        for index, entries in enumerate(process_entries):
+            processes.append(subprocess.Popen([sys.executable, "-m", "components.container", *entries],
+                                              stdout=subprocess.PIPE, text=True))
+            threading.Thread(target=_watch_output, args=(index, processes[-1], ready), daemon=True).start()
+
+        for _ in processes:
+            try:
+                index, is_ready = ready.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                raise RuntimeError(f"The containers were not ready within {timeout_s} s") from None
+            if not is_ready:
+                raise RuntimeError(f"A container exited with {processes[index].wait()} before hosting its nodes")
+    except BaseException:
+        #The caller never gets these processes, so a container that hangs is not left behind
+        for process in processes:
+            process.kill()
+        for process in processes:
+            process.wait()
+        raise
+    return processes, time.perf_counter() - begin
+
+
+def stop(processes: list):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=5.0)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_mode(process_entries: list, settle_s: float, timeout_s: float) -> dict:
+    processes = []
+    try:
+        processes, startup_s = start(process_entries, timeout_s)
+        time.sleep(settle_s)
+        memory = [memory_kb(process.pid) for process in processes]
+    finally:
+        stop(processes)
+    return {"processes": len(process_entries), "startup_s": startup_s,
+            "rss_mb": sum(rss for rss, _ in memory) / 1024, "pss_mb": sum(pss for _, pss in memory) / 1024}
+
+
+def bench(persona_path: str, node_counts: list, settle_s: float, timeout_s: float) -> list:
+    results = []
+    print(f"{'nodes':>5} {'mode':>10} {'startup [s]':>12} {'RSS [MB]':>9} {'PSS [MB]':>9}")
+    with tempfile.TemporaryDirectory() as out_dir:
+        for nr_nodes in node_counts:
+            entries = [f"{path}={NODE_CLASS}" for path in write_personas(persona_path, nr_nodes, out_dir)]
+            for mode, process_entries in (("container", [entries]), ("processes", [[entry] for entry in entries])):
+                result = {"nodes": nr_nodes, "mode": mode, **run_mode(process_entries, settle_s, timeout_s)}
+                print(f"{nr_nodes:5} {mode:>10} {result['startup_s']:12.2f} {result['rss_mb']:9.1f} "
+                      f"{result['pss_mb']:9.1f}")
+                results.append(result)
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark one container against one process per node")
+    parser.add_argument("persona", nargs="?", default=None,
+                        help="Compiled persona JSON, the compiled IBeam455 persona of the source tree if omitted")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds to wait before reading the memory")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds before a start counts as failed")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    parsed = parser.parse_args(args)
+    try:
+        parsed.persona = parsed.persona or default_persona_path()
+    except FileNotFoundError as err:
+        parser.error(str(err))
+
+    results = bench(parsed.persona, sorted(parsed.nodes), parsed.settle, parsed.timeout)
+    if parsed.json is not None:
+        with open(parsed.json, "w", encoding="utf-8") as f:
+            json.dump({"persona": parsed.persona, "settle_s": parsed.settle, "results": results}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Latency and throughput of the laser services at increasing concurrency.
+
+Starts a SimulatedLaser in the same process - or uses a laser node that is already running with --external - and
+drives SetLaserPower, GetLaserPower and GetLaserTemperature with 1, 2, 4, ... concurrent callers. Every caller sends
+its next request as soon as the previous one is answered. Reports the p50/p99 latency and the requests per second of
+every service at every concurrency.
+
+Run in a sourced workspace:
+    python3 -m lasers.bench_services [persona json] [--concurrency 1 2 4 8] [--duration 2] [--delay 0.001] [--json out]
+"""
+import argparse
+import json
+import threading
+import time
+
+import rclpy
+from rclpy.executors import MultiThreadedExecutor
+from rclpy.node import Node
+
+from components.persona import Persona
+from components.router import ClientPool, call_service
+from interfaces.msg import LaserChannel
+from interfaces.srv import GetLaserPower, GetLaserTemperature, SetLaserPower
+from lasers.simulated_device import default_persona_path, with_channels
+from lasers.simulated_laser import SimulatedLaser
+from lasers.telemetry import percentile
+
+
+def run_level(client, make_request, concurrency: int, duration_s: float, timeout_s: float) -> dict:
+    """
+    :param make_request: Callable taking the index of a caller and returning a new request
+    :return: The statistics of concurrency callers calling the service for duration_s seconds
+    """
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    deadline = time.perf_counter() + duration_s
+
+    def caller(i):
+        while time.perf_counter() < deadline:
+            request = make_request(i)
+            start = time.perf_counter()
+            try:
+                call_service(client, request, timeout_s)
+            except TimeoutError:
+                errors[i] += 1
+                continue
+            latencies[i].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=caller, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    merged = sorted(latency for caller_latencies in latencies for latency in caller_latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": len(merged),
+        "errors": sum(errors),
+        "requests_per_s": len(merged) / elapsed,
+        "p50_ms": percentile(merged, 50) * 1e3,
+        "p99_ms": percentile(merged, 99) * 1e3,
+        "max_ms": (merged[-1] if merged else float("nan")) * 1e3,
+    }
+
+
+def bench(persona: Persona, levels, duration_s: float, max_age_s: float, timeout_s: float, laser=None) -> dict:
+    """
+    :param laser: A laser node to spin in this process, None if it runs elsewhere
+    :return: {service name: [statistics per concurrency]}
+    """
+    executors = []
+    threads = []
+
+    def spinInBackground(node, num_threads):
+        executor = MultiThreadedExecutor(num_threads=num_threads)
+        executor.add_node(node)
+        thread = threading.Thread(target=executor.spin, daemon=True)
+        thread.start()
+        executors.append(executor)
+        threads.append(thread)
+
+    if laser is not None:
+        #setPower callers block an executor thread each until their write is done
+        spinInBackground(laser, max(levels) + 2)
+
+    client_node = Node("laser_service_bench")
+    pool = ClientPool(client_node)
+    spinInBackground(client_node, 2)
+
+    nr_channels = persona.getDescriptor()["nr_channels"]
+    requests = {
+        #Callers alternate channels and powers, so writes actually change something
+        "setPower": lambda i: SetLaserPower.Request(laser_channels=[
+            LaserChannel(channel_nr=i % nr_channels + 1, output_power_w=0.01 * (i % 10))]),
+        "getPower": lambda i: GetLaserPower.Request(channels_nrs=[], max_age_s=max_age_s),
+        "getTemperature": lambda i: GetLaserTemperature.Request(max_age_s=max_age_s),
+    }
+
+    results = {}
+    try:
+        for name in requests:
+            client = pool.client(persona, name)
+            results[name] = []
+            for concurrency in levels:
+                stats = run_level(client, requests[name], concurrency, duration_s, timeout_s)
+                results[name].append(stats)
+                print(f"{name:>15} x{concurrency:<4} {stats['requests_per_s']:10.1f} req/s   "
+                      f"p50 {stats['p50_ms']:8.3f} ms   p99 {stats['p99_ms']:8.3f} ms   "
+                      f"max {stats['max_ms']:8.3f} ms   errors {stats['errors']}")
+    finally:
+        for executor in executors:
+            executor.shutdown()
+        for thread in threads:
+            thread.join(1.0)
+        client_node.destroy_node()
+        if laser is not None:
+            laser.destroy_node()
+
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the laser services at increasing concurrency")
+    parser.add_argument("persona", nargs="?", default=None,
+                        help="Compiled persona JSON, the compiled IBeam455 persona of the source tree if omitted")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per service and concurrency")
+    parser.add_argument("--channels", type=int, default=None, help="Number of channels of the simulated laser")
+    parser.add_argument("--delay", type=float, default=0.001, help="Response delay of the simulated laser in seconds")
+    parser.add_argument("--max-age", type=float, default=0.0, help="max_age_s of the get requests, 0 for the default")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Seconds before a request counts as an error")
+    parser.add_argument("--external", action="store_true", help="Benchmark a laser node that is already running")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    parsed, ros_args = parser.parse_known_args(args)
+
+    try:
+        persona = Persona(parsed.persona or default_persona_path())
+    except FileNotFoundError as err:
+        parser.error(str(err))
+    if parsed.channels is not None:
+        persona = with_channels(persona, parsed.channels)
+
+    rclpy.init(args=ros_args)
+    try:
+        laser = None if parsed.external else SimulatedLaser(persona, parsed.delay)
+        results = bench(persona, sorted(parsed.concurrency), parsed.duration, parsed.max_age, parsed.timeout, laser)
+    finally:
+        rclpy.try_shutdown()
+
+    if parsed.json is not None:
+        with open(parsed.json, "w", encoding="utf-8") as f:
+            json.dump({"persona": persona.getID(), "duration_s": parsed.duration, "delay_s": parsed.delay,
+                       "results": results}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,22 @@
+import time
 from abc import ABC,abstractmethod
+from typing import TYPE_CHECKING
+
+from rclpy.callback_groups import MutuallyExclusiveCallbackGroup, ReentrantCallbackGroup
+
 from components.component import DeviceProfile
 from components.persona import Persona
-from interfaces.srv import SetLaserPower
+from components.router import import_interface
+#Re-exported, they used to live here
+from lasers.telemetry import PowerCommandCoalescer, TelemetryCache, TelemetryRing
 
+#The generated interfaces are imported when the node is constructed, not when this module is
+if TYPE_CHECKING:
+    from interfaces.msg import LaserTelemetry
+    from interfaces.srv import GetLaserPower, GetLaserTemperature, SetLaserPower
 
-class LaserProfile(ABC,DeviceProfile):
+
+class LaserProfile(DeviceProfile,ABC):
     def __init__(self,persona: Persona):
         super().__init__(persona)
 
@@ -12,29 +24,190 @@ class LaserProfile(ABC,DeviceProfile):
         #For now we assume the power starts out as 0
         self.channel_powers = [0 for x in range(self.nr_channels)]
 
-        #TODO: add services for getChannelPower and getTemperature
+        #Requests to setPower are merged per tick and sent to the hardware as one write
+        self.declare_parameter("power_tick_s", 0.01)
+        self.power_coalescer = PowerCommandCoalescer(self._writePowers,
+                                                     self.get_parameter("power_tick_s").value)
+        self.power_coalescer.start()
+
+        #Power and temperature queries are served from memory, see TelemetryCache
+        self.declare_parameter("telemetry_min_interval_s", 0.05)
+        self.declare_parameter("telemetry_max_age_s", 0.5)
+        self.telemetry = TelemetryCache(self.get_parameter("telemetry_min_interval_s").value,
+                                        self.get_parameter("telemetry_max_age_s").value)
+
+        #Services and topics are created from the capabilities of the persona - getPower is served by onGetPower etc.
+        #Reentrant, so callers waiting for the same write don't block each other on a MultiThreadedExecutor
+        self.service_group = ReentrantCallbackGroup()
+        self._laser_channel_type = import_interface("interfaces/LaserChannel", "msg")
+        self.wireCapabilities({"setPower": self.setChannelPower}, callback_group=self.service_group, strict=True)
+
+        #Telemetry is sampled into a ring buffer and published raw and, for slow consumers, downsampled per window
+        self.declare_parameter("telemetry_rate_hz", 10.0)
+        self.declare_parameter("telemetry_buffer_size", 1000)
+        #0 disables the downsampled topic
+        self.declare_parameter("telemetry_window_s", 1.0)
+        telemetry_rate_hz = self.get_parameter("telemetry_rate_hz").value
+        if telemetry_rate_hz <= 0:
+            raise ValueError(f"telemetry_rate_hz must be positive, not {telemetry_rate_hz}")
+        self.telemetry_period_s = 1.0 / telemetry_rate_hz
+        self.telemetry_window_s = self.get_parameter("telemetry_window_s").value
+        self.telemetry_ring = TelemetryRing(self.get_parameter("telemetry_buffer_size").value)
+        self._telemetry_type = import_interface("interfaces/LaserTelemetry", "msg")
+
+        #Mutually exclusive, so samples enter the ring in order even when the device is slow
+        self.telemetry_group = MutuallyExclusiveCallbackGroup()
+        self.telemetry_pub = self.router.publisher("telemetry")
+        self.telemetry_timer = self.create_timer(self.telemetry_period_s, self.sampleTelemetry,
+                                                 callback_group=self.telemetry_group)
+
+        if self.telemetry_window_s > 0:
+            self._window_start_s = time.time()
+            self.downsampled_pub = self.router.publisher("telemetryDownsampled")
+            self.downsampled_timer = self.create_timer(self.telemetry_window_s, self.publishDownsampled,
+                                                       callback_group=self.telemetry_group)
 
     @property
-    def nr_channels(self) -> str:
-        #We use persona.getID() to ensure a single source of truth
-        return self._persona.getDescriptor()["nr_channels"]
+    def nr_channels(self) -> int:
+        #We use persona.getDescriptor() to ensure a single source of truth
+        return self.persona.getDescriptor()["nr_channels"]
 
     @abstractmethod
     def getChannelPower(self,channel_nr):
+        """
+        Reads the output power of a channel from the device - use the getPower service for cached reads.
+
+        :param channel_nr: 1-indexed channel number
+        :return: Output power in watts
+        """
         pass
 
     @abstractmethod
-    def setChannelPower(self,srv: SetLaserPower):
+    def writeChannelPowers(self, channel_powers: dict) -> bool:
+        """
+        Sets the output power of several channels in a single hardware write.
+
+        :param channel_powers: {channel_nr: output_power_w} with 1-indexed channel numbers
+        :return: True if the write succeeded
+        """
         pass
 
+    def onPersonaReloaded(self, diff, changed_routes: set):
+        if "telemetry" in changed_routes:
+            self.telemetry_pub = self.router.publisher("telemetry")
+        if "telemetryDownsampled" in changed_routes and self.telemetry_window_s > 0:
+            self.downsampled_pub = self.router.publisher("telemetryDownsampled")
+
+        if "nr_channels" in diff.descriptor:
+            old_nr_channels = len(self.channel_powers)
+            #Channels that were added start out at 0 like on construction
+            self.channel_powers = (self.channel_powers + [0] * self.nr_channels)[:self.nr_channels]
+            for channel_nr in range(1, max(old_nr_channels, self.nr_channels) + 1):
+                self.telemetry.invalidate(("power", channel_nr))
+            #Samples of a different number of channels can't be summarized together
+            self.telemetry_ring.clear()
+
+    def _writePowers(self, channel_powers: dict) -> bool:
+        is_success = self.writeChannelPowers(channel_powers)
+        for channel_nr, power in channel_powers.items():
+            #Cached readings from before the write are wrong either way
+            self.telemetry.invalidate(("power", channel_nr))
+            if is_success:
+                self.channel_powers[channel_nr - 1] = power
+        return is_success
+
+    def setChannelPower(self, request: "SetLaserPower.Request", response: "SetLaserPower.Response"):
+        """
+        Service callback of setPower - the request joins the current tick and is answered once its batch is written.
+        """
+        channel_powers = {laser_channel.channel_nr: laser_channel.output_power_w
+                          for laser_channel in request.laser_channels}
+
+        if not all(1 <= channel_nr <= self.nr_channels for channel_nr in channel_powers):
+            self.get_logger().warning(f"setPower got channels {list(channel_powers)}, but {self.id} has "
+                                      f"{self.nr_channels} channel(s)")
+            response.is_success = False
+            return response
+
+        response.is_success = self.power_coalescer.submit(channel_powers).result()
+        return response
+
+    def onGetPower(self, request: "GetLaserPower.Request", response: "GetLaserPower.Response"):
+        """
+        Service callback of getPower - all channels if none are requested.
+        """
+        channel_nrs = list(request.channels_nrs) or list(range(1, self.nr_channels + 1))
+        response.laser_channels = [
+            self._laser_channel_type(
+                channel_nr=channel_nr,
+                output_power_w=float(self.telemetry.get(("power", channel_nr),
+                                                        lambda channel_nr=channel_nr: self.getChannelPower(channel_nr),
+                                                        request.max_age_s)))
+            for channel_nr in channel_nrs if 1 <= channel_nr <= self.nr_channels
+        ]
+        return response
+
+    def onGetTemperature(self, request: "GetLaserTemperature.Request", response: "GetLaserTemperature.Response"):
+        """
+        Service callback of getTemperature.
+        """
+        response.T_celsius = int(round(self.telemetry.get(("temperature",), self.getTemperature, request.max_age_s)))
+        return response
+
+    def sampleTelemetry(self):
+        """
+        Timer callback - reads one sample into the ring buffer and publishes it on the telemetry topic.
+        """
+        #Readings younger than one period are reused, e.g. from a getPower request that came just before
+        channel_powers = [float(self.telemetry.get(("power", channel_nr),
+                                                   lambda channel_nr=channel_nr: self.getChannelPower(channel_nr),
+                                                   self.telemetry_period_s))
+                          for channel_nr in range(1, self.nr_channels + 1)]
+        t_celsius = float(self.telemetry.get(("temperature",), self.getTemperature, self.telemetry_period_s))
+
+        sample = (time.time(), channel_powers, t_celsius)
+        self.telemetry_ring.append(*sample)
+        self.telemetry_pub.publish(self._telemetryMessage(TelemetryRing.summarizeSamples([sample]), 0.0))
+
+    def publishDownsampled(self):
+        """
+        Timer callback - publishes the min, max and mean of the samples since the previous window.
+        """
+        window_end_s = time.time()
+        summary = self.telemetry_ring.summarize(self._window_start_s, window_end_s)
+        self._window_start_s = window_end_s
+        if summary is not None:
+            self.downsampled_pub.publish(self._telemetryMessage(summary, self.telemetry_window_s))
+
+    def _telemetryMessage(self, summary: dict, window_s: float) -> "LaserTelemetry":
+        return self._telemetry_type(channel_nrs=list(range(1, self.nr_channels + 1)), window_s=window_s, **summary)
+
+    def getPowerMetrics(self) -> dict:
+        return self.power_coalescer.metrics()
+
+    def getTelemetryMetrics(self) -> dict:
+        return self.telemetry.metrics()
+
+    def destroy_node(self):
+        self.power_coalescer.stop()
+        return super().destroy_node()
+
+    @abstractmethod
     def getTemperature(self):
+        """
+        Reads the temperature from the device - use the getTemperature service for cached reads.
+
+        :return: Temperature in celsius
+        """
         pass
 
 if __name__ == "__main__":
+    from interfaces.srv import SetLaserPower
+
     req = SetLaserPower.Request()
     # optionally: req.power_percent = 42.0
     print(req)
 
     # Or the response object:
     res = SetLaserPower.Response()
-    print(res)
\ No newline at end of file
+    print(res)
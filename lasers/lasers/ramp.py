@@ -0,0 +1,346 @@
+"""
+Ramps the output power of many lasers together, e.g. all 445 nm channels from 0 to 50 mW over 2 s.
+
+The target lasers are resolved from their personas with a Criterion. At every step of the RampProfile each laser gets
+one setPower request with all of its channels. The requests of a step are dispatched together without waiting for
+each other, and the responses arrive as futures. A laser never gets more than one request in flight, and never more
+than its rate limit - the max_command_rate_hz of its descriptor, or the default of the scheduler. A step a laser can't
+take in time is superseded by the next one, but the last step of the ramp is always sent. The report has the dispatch
+jitter of every request against its schedule, the time until its response and the steps that were skipped.
+
+The scheduler itself needs no ROS. SetPowerSender sends through a ClientPool of a spinning node.
+
+Run in a sourced workspace:
+    python3 -m lasers.ramp personas_dir '{"descriptor": {"wavelength": {"eq": 445}}}' --to 0.05 --duration 2
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+
+from components.persona import Criterion, PersonaRegistry
+from lasers.telemetry import percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_HZ = 50.0
+
+
+class RampProfile:
+
+    """
+    Setpoints (t_s, output_power_w) relative to the start of the ramp, in ascending time.
+    """
+
+    def __init__(self, points):
+        self.points = [(float(t_s), float(power_w)) for t_s, power_w in points]
+        if not self.points:
+            raise ValueError("A ramp needs at least one setpoint")
+        if any(t_s < 0 or power_w < 0 for t_s, power_w in self.points):
+            raise ValueError(f"Setpoints need a time and power of at least 0, not {self.points}")
+        if any(b[0] < a[0] for a, b in zip(self.points, self.points[1:])):
+            raise ValueError("The setpoints of a ramp must be in ascending time")
+
+    @classmethod
+    def linear(cls, start_w: float, end_w: float, duration_s: float, step_s: float = 0.05):
+        """
+        :return: Ramp from start_w to end_w in steps of about step_s, with both ends included
+        """
+        if duration_s < 0 or step_s <= 0:
+            raise ValueError(f"A ramp needs a duration of at least 0 and a positive step, not {duration_s}, {step_s}")
+        nr_steps = max(1, round(duration_s / step_s))
+        return cls((duration_s * k / nr_steps, start_w + (end_w - start_w) * k / nr_steps) for k in range(nr_steps + 1))
+
+    @property
+    def duration_s(self) -> float:
+        return self.points[-1][0]
+
+    def __len__(self):
+        return len(self.points)
+
+
+class RampCommand:
+
+    """
+    One request to one laser - times are seconds since the start of the ramp.
+    """
+
+    __slots__ = ("pers_id", "step", "scheduled_s", "sent_s", "done_s", "is_success", "error")
+
+    def __init__(self, pers_id, step: int, scheduled_s: float, sent_s: float):
+        self.pers_id = pers_id
+        self.step = step
+        self.scheduled_s = scheduled_s
+        self.sent_s = sent_s
+        self.done_s = None
+        self.is_success = None
+        #Exception the send or its future raised
+        self.error = None
+
+    @property
+    def jitter_s(self) -> float:
+        return self.sent_s - self.scheduled_s
+
+
+class RampReport:
+
+    def __init__(self, targets: list, nr_steps: int):
+        self.targets = targets
+        self.nr_steps = nr_steps
+        self.commands = []
+        #persona id -> number of steps that were superseded before they could be sent
+        self.skipped = {pers_id: 0 for pers_id in targets}
+        self.duration_s = 0.0
+
+    def summary(self) -> dict:
+        """
+        :return: Counts, and the p50/p99/max of the dispatch jitter and of the time until the response, in seconds
+        """
+        jitters = sorted(command.jitter_s for command in self.commands)
+        latencies = sorted(command.done_s - command.sent_s for command in self.commands if command.done_s is not None)
+        return {
+            "targets": len(self.targets),
+            "steps": self.nr_steps,
+            "commands": len(self.commands),
+            "failures": sum(command.is_success is not True for command in self.commands),
+            "errors": sum(command.error is not None for command in self.commands),
+            "skipped": sum(self.skipped.values()),
+            "duration_s": self.duration_s,
+            "jitter_p50_s": percentile(jitters, 50),
+            "jitter_p99_s": percentile(jitters, 99),
+            "jitter_max_s": jitters[-1] if jitters else float("nan"),
+            "latency_p50_s": percentile(latencies, 50),
+            "latency_p99_s": percentile(latencies, 99),
+            "latency_max_s": latencies[-1] if latencies else float("nan"),
+        }
+
+
+class _LaserState:
+
+    __slots__ = ("pers", "channel_nrs", "min_interval_s", "next_allowed_s", "in_flight", "pending")
+
+    def __init__(self, pers, channel_nrs: list, rate_hz: float):
+        self.pers = pers
+        self.channel_nrs = channel_nrs
+        self.min_interval_s = 1.0 / rate_hz
+        self.next_allowed_s = float("-inf")
+        self.in_flight = False
+        #(step, scheduled_s, power_w) waiting to be sent
+        self.pending = None
+
+
+class RampScheduler:
+
+    def __init__(self, personas, sender, default_rate_hz: float = DEFAULT_RATE_HZ, timeout_s: float = 5.0):
+        """
+        :param personas: PersonaRegistry or iterable of the personas of the lasers that may be ramped
+        :param sender: Object with prepare(persona), called once per target before the ramp starts, and
+            send(persona, {channel_nr: output_power_w}) returning a future whose result is True on success
+        :param default_rate_hz: Rate limit of the lasers whose descriptor has no max_command_rate_hz
+        :param timeout_s: Seconds to wait for the last responses after the last step
+        """
+        self.registry = personas if isinstance(personas, PersonaRegistry) else PersonaRegistry(personas)
+        self.sender = sender
+        self.default_rate_hz = default_rate_hz
+        self.timeout_s = timeout_s
+
+    def targets(self, criterion, channel_nrs=None) -> list:
+        """
+        :param channel_nrs: Channels to ramp, all channels of every laser if None
+        :return: Sorted list of (persona, channel numbers) of the lasers matching the criterion that can set power
+        """
+        crit = criterion if isinstance(criterion, Criterion) else Criterion(criterion)
+
+        targets = []
+        for pers_id in sorted(self.registry.queryIDs(crit)):
+            pers = self.registry.get(pers_id)
+            if "setPower" not in pers.getCapabilities():
+                continue
+            nr_channels = pers.getDescriptor().get("nr_channels", 1)
+            channels = [channel_nr for channel_nr in (channel_nrs or range(1, nr_channels + 1))
+                        if 1 <= channel_nr <= nr_channels]
+            if channels:
+                targets.append((pers, channels))
+        return targets
+
+    def _rate(self, pers) -> float:
+        rate_hz = pers.getDescriptor().get("max_command_rate_hz", None)
+        if rate_hz is None:
+            return self.default_rate_hz
+        if not isinstance(rate_hz, (int, float)) or rate_hz <= 0:
+            raise ValueError(f"max_command_rate_hz of {pers.getID()} must be a positive number, not {rate_hz}")
+        return float(rate_hz)
+
+    def run(self, criterion, profile: RampProfile, channel_nrs=None, lead_s: float = 0.01) -> RampReport:
+        """
+        Runs the ramp and returns once every laser answered its last request, or timeout_s after the last step.
+
+        :param lead_s: The ramp starts this long after the targets are prepared
+        :return: RampReport
+        """
+        states = [_LaserState(pers, channels, self._rate(pers)) for pers, channels in self.targets(criterion, channel_nrs)]
+        for state in states:
+            self.sender.prepare(state.pers)
+
+        report = RampReport([state.pers.getID() for state in states], len(profile))
+        #Reentrant, futures that are already done call back on the dispatching thread
+        condition = threading.Condition(threading.RLock())
+        start = time.perf_counter() + lead_s
+        step = 0
+
+        def elapsed():
+            return time.perf_counter() - start
+
+        def dispatch(state, now_s):
+            command_step, scheduled_s, power_w = state.pending
+            state.pending = None
+            state.in_flight = True
+            state.next_allowed_s = now_s + state.min_interval_s
+            command = RampCommand(state.pers.getID(), command_step, scheduled_s, now_s)
+            report.commands.append(command)
+
+            def done(future):
+                with condition:
+                    command.done_s = elapsed()
+                    try:
+                        command.is_success = bool(future.result())
+                    except Exception as err:
+                        logger.exception(f"Step {command_step} of {command.pers_id} failed")
+                        command.is_success = False
+                        command.error = err
+                    state.in_flight = False
+                    condition.notify()
+
+            try:
+                future = self.sender.send(state.pers, {channel_nr: power_w for channel_nr in state.channel_nrs})
+            except Exception as err:
+                logger.exception(f"Could not send step {command_step} to {command.pers_id}")
+                command.is_success = False
+                command.error = err
+                state.in_flight = False
+                return
+            future.add_done_callback(done)
+
+        with condition:
+            deadline_s = None
+            while True:
+                now_s = elapsed()
+                while step < len(profile) and profile.points[step][0] <= now_s:
+                    t_s, power_w = profile.points[step]
+                    for state in states:
+                        if state.pending is not None:
+                            report.skipped[state.pers.getID()] += 1
+                        state.pending = (step, t_s, power_w)
+                    step += 1
+
+                for state in states:
+                    if state.pending is not None and not state.in_flight and state.next_allowed_s <= now_s:
+                        dispatch(state, now_s)
+
+                busy = [state for state in states if state.pending is not None or state.in_flight]
+                if step == len(profile):
+                    if not busy:
+                        break
+                    deadline_s = now_s + self.timeout_s if deadline_s is None else deadline_s
+                    if now_s >= deadline_s:
+                        break
+
+                #Woken early by responses, which may free a laser with a pending step
+                wake_s = [profile.points[step][0]] if step < len(profile) else [deadline_s]
+                wake_s += [state.next_allowed_s for state in busy if state.pending is not None and not state.in_flight]
+                condition.wait(max(0.0, min(wake_s) - elapsed()))
+
+            report.duration_s = elapsed()
+        return report
+
+
+class SetPowerSender:
+
+    """
+    Sends the requests of a RampScheduler to the setPower capabilities of the lasers, through a ClientPool of a node
+    that is spun on another thread.
+    """
+
+    def __init__(self, pool):
+        from components.router import import_interface
+
+        self.pool = pool
+        self._laser_channel_type = import_interface("interfaces/LaserChannel", "msg")
+
+    def prepare(self, pers):
+        #Waits for the service once, so discovery doesn't count towards the jitter of the first step
+        self.pool.client(pers, "setPower")
+
+    def send(self, pers, channel_powers: dict):
+        client = self.pool.client(pers, "setPower")
+        request = client.srv_type.Request(laser_channels=[
+            self._laser_channel_type(channel_nr=channel_nr, output_power_w=float(power_w))
+            for channel_nr, power_w in channel_powers.items()])
+        return _ResultFuture(client.call_async(request), lambda response: response.is_success)
+
+
+class _ResultFuture:
+
+    """
+    Future of a service call whose result is mapped from the response.
+    """
+
+    def __init__(self, future, result):
+        self._future = future
+        self._result = result
+
+    def add_done_callback(self, callback):
+        self._future.add_done_callback(lambda _: callback(self))
+
+    def result(self):
+        return self._result(self._future.result())
+
+
+def main(args=None):
+    import rclpy
+    from rclpy.executors import MultiThreadedExecutor
+    from rclpy.node import Node
+
+    from components.discovery import decode_criteria
+    from components.loader import load_personas
+    from components.router import ClientPool
+
+    parser = argparse.ArgumentParser(description="Ramp the power of all lasers matching a criterion")
+    parser.add_argument("personas", help="Directory of the compiled personas of the lasers")
+    parser.add_argument("criteria", help="Criteria JSON, see components.discovery.encode_criteria")
+    parser.add_argument("--from", dest="start_w", type=float, default=0.0, help="Power at the start in watts")
+    parser.add_argument("--to", dest="end_w", type=float, required=True, help="Power at the end in watts")
+    parser.add_argument("--duration", type=float, default=2.0, help="Length of the ramp in seconds")
+    parser.add_argument("--step", type=float, default=0.05, help="Time between setpoints in seconds")
+    parser.add_argument("--channels", type=int, nargs="+", default=None, help="Channels to ramp, all if not given")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_HZ, help="Default rate limit per laser in Hz")
+    parser.add_argument("--json", default=None, help="Also write the summary to this file")
+    parsed, ros_args = parser.parse_known_args(args)
+
+    personas, _ = load_personas(parsed.personas, recursive=True)
+    profile = RampProfile.linear(parsed.start_w, parsed.end_w, parsed.duration, parsed.step)
+
+    rclpy.init(args=ros_args)
+    node = Node("power_ramp")
+    executor = MultiThreadedExecutor()
+    executor.add_node(node)
+    spinner = threading.Thread(target=executor.spin, daemon=True)
+    spinner.start()
+    try:
+        scheduler = RampScheduler(personas, SetPowerSender(ClientPool(node)), parsed.rate)
+        summary = scheduler.run(decode_criteria(parsed.criteria), profile, parsed.channels).summary()
+    finally:
+        executor.shutdown()
+        node.destroy_node()
+        rclpy.try_shutdown()
+
+    for key, value in summary.items():
+        print(f"{key:15} {value * 1e3:.3f} ms" if key.endswith("_s") else f"{key:15} {value}")
+    if parsed.json is not None:
+        with open(parsed.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
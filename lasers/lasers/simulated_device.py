@@ -0,0 +1,80 @@
+"""
+The device behind SimulatedLaser, without ROS - a laser on a serial line that answers after a fixed delay.
+
+Every device access takes response_delay_s and only one access is served at a time, like on the serial line of a real
+laser. The temperature rises with the total output power.
+"""
+import os
+import threading
+import time
+
+from components.persona import Persona
+
+#Build output of interfaces/profiles/profile_builder.py, it is not in a fresh checkout
+DEFAULT_PERSONA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "interfaces", "profiles",
+                                    "lasers", "IBeam455_persona.json")
+
+
+def default_persona_path() -> str:
+    """
+    :return: The compiled IBeam455 persona of the source tree
+    :raises FileNotFoundError: If it was not compiled yet
+    """
+    path = os.path.normpath(DEFAULT_PERSONA_PATH)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No persona given, and {path} is not compiled - pass the path of a compiled persona "
+                                f"JSON, or compile the profiles with python3 interfaces/profiles/profile_builder.py")
+    return path
+
+
+def with_channels(persona: Persona, nr_channels: int) -> Persona:
+    """
+    :return: A copy of persona with nr_channels channels
+    """
+    if nr_channels < 1:
+        raise ValueError(f"A laser needs at least one channel, not {nr_channels}")
+    data = persona.toData()
+    data["descriptor"]["nr_channels"] = nr_channels
+    return Persona.fromData(data)
+
+
+class SimulatedDevice:
+
+    def __init__(self, response_delay_s: float = 0.001, ambient_celsius: float = 25.0, celsius_per_w: float = 20.0):
+        """
+        :param response_delay_s: Time every read or write of the simulated device takes
+        :param ambient_celsius: Temperature with all channels off
+        :param celsius_per_w: Temperature rise per watt of total output power
+        """
+        self.response_delay_s = response_delay_s
+        self.ambient_celsius = ambient_celsius
+        self.celsius_per_w = celsius_per_w
+
+        #One access at a time, like a serial line
+        self._line = threading.Lock()
+        self._channel_powers = {}
+        self.reads = 0
+        self.writes = 0
+
+    def _access(self):
+        if self.response_delay_s > 0:
+            time.sleep(self.response_delay_s)
+
+    def getChannelPower(self, channel_nr) -> float:
+        with self._line:
+            self._access()
+            self.reads += 1
+            return self._channel_powers.get(channel_nr, 0.0)
+
+    def writeChannelPowers(self, channel_powers: dict) -> bool:
+        with self._line:
+            self._access()
+            self.writes += 1
+            self._channel_powers.update(channel_powers)
+            return True
+
+    def getTemperature(self) -> float:
+        with self._line:
+            self._access()
+            self.reads += 1
+            return self.ambient_celsius + self.celsius_per_w * sum(self._channel_powers.values())
@@ -0,0 +1,72 @@
+"""
+A LaserProfile without hardware, driven by a compiled persona - IBeam455_persona by default.
+
+The device is a SimulatedDevice, see lasers.simulated_device.
+
+Run in a sourced workspace:
+    python3 -m lasers.simulated_laser [persona json] [--channels N] [--delay S]
+"""
+import argparse
+
+import rclpy
+
+from components.component import spin_multithreaded
+from components.persona import Persona
+from lasers.lasernode import LaserProfile
+#Re-exported, they used to live here
+from lasers.simulated_device import DEFAULT_PERSONA_PATH, SimulatedDevice, default_persona_path, with_channels
+
+
+class SimulatedLaser(LaserProfile):
+
+    def __init__(self, persona: Persona, response_delay_s: float = 0.001, ambient_celsius: float = 25.0,
+                 celsius_per_w: float = 20.0):
+        """
+        :param response_delay_s: Time every read or write of the simulated device takes
+        :param ambient_celsius: Temperature with all channels off
+        :param celsius_per_w: Temperature rise per watt of total output power
+        """
+        self.device = SimulatedDevice(response_delay_s, ambient_celsius, celsius_per_w)
+        super().__init__(persona)
+
+    def isConnected(self) -> bool:
+        return True
+
+    def turnOn(self) -> bool:
+        return True
+
+    def getChannelPower(self, channel_nr):
+        return self.device.getChannelPower(channel_nr)
+
+    def writeChannelPowers(self, channel_powers: dict) -> bool:
+        return self.device.writeChannelPowers(channel_powers)
+
+    def getTemperature(self):
+        return self.device.getTemperature()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run a simulated laser node")
+    parser.add_argument("persona", nargs="?", default=None,
+                        help="Compiled persona JSON, the compiled IBeam455 persona of the source tree if omitted")
+    parser.add_argument("--channels", type=int, default=None, help="Override the number of channels of the persona")
+    parser.add_argument("--delay", type=float, default=0.001, help="Response delay of the device in seconds")
+    parser.add_argument("--threads", type=int, default=None, help="Number of executor threads")
+    parsed, ros_args = parser.parse_known_args(args)
+
+    try:
+        persona = Persona(parsed.persona or default_persona_path())
+    except FileNotFoundError as err:
+        parser.error(str(err))
+    if parsed.channels is not None:
+        persona = with_channels(persona, parsed.channels)
+
+    rclpy.init(args=ros_args)
+    try:
+        spin_multithreaded(SimulatedLaser(persona, parsed.delay), num_threads=parsed.threads)
+    finally:
+        rclpy.try_shutdown()
+
+
+if __name__ == "__main__":
+    main()
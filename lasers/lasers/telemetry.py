@@ -0,0 +1,320 @@
+"""
+The ROS-free parts of the laser node: batching of power commands, caching and buffering of telemetry, and the
+percentiles their reports and benchmarks are summarized with.
+
+Importing this module needs neither rclpy nor the generated interfaces, so the classes can be used and tested without ROS.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+def percentile(sorted_values: list, q: float) -> float:
+    """
+    :param sorted_values: Ascending values
+    :param q: Percentile between 0 and 100
+    :return: The nearest-rank percentile, nan if there are no values
+    """
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class PowerCommandCoalescer:
+
+    """
+    Merges power commands per channel and sends them to the hardware as one batched write per tick.
+
+    The first command after an idle period opens a window of tick_s seconds. Commands arriving within the window are
+    merged per channel - the last writer wins - and all of their callers are answered from the result of the one write.
+    Writes happen on the coalescer's own thread, so the driver is never called concurrently. Commands are only
+    accepted between start and stop.
+    """
+
+    def __init__(self, write_powers, tick_s: float = 0.01, latency_window: int = 1000):
+        """
+        :param write_powers: Callable taking {channel_nr: output_power_w} and returning True if the write succeeded
+        :param tick_s: Length of the window in which commands are merged
+        :param latency_window: Number of recent end-to-end latencies kept for the metrics
+        """
+        self._write_powers = write_powers
+        self.tick_s = tick_s
+
+        self._lock = threading.Lock()
+        self._has_pending = threading.Event()
+        #Set until start, so nothing is submitted without a thread to write it
+        self._stopped = threading.Event()
+        self._stopped.set()
+        self._thread = None
+
+        #channel_nr -> power of the latest command
+        self._pending = {}
+        #(future, submit time) of the callers waiting for the next write
+        self._waiting = []
+
+        self.requests = 0
+        self.writes = 0
+        self.failed_writes = 0
+        #Channel values that were overwritten by a later command before reaching the hardware
+        self.channels_overwritten = 0
+        #The exception of the most recent write that raised, None if none did
+        self.last_error = None
+        self._latencies = deque(maxlen=latency_window)
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="power_coalescer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops the thread after writing what is still pending - later submits are rejected.
+        """
+        with self._lock:
+            self._stopped.set()
+        self._has_pending.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._has_pending.wait()
+            #Sleeps out the window, unless we are stopped
+            self._stopped.wait(self.tick_s)
+            self.flush()
+
+    def submit(self, channel_powers: dict) -> Future:
+        """
+        :param channel_powers: {channel_nr: output_power_w}
+        :return: Future resolving to True once the batched write containing the command succeeded
+        """
+        future = Future()
+        with self._lock:
+            #Checked under the lock stop takes, so every accepted command is written by the final flush at the latest
+            if self._stopped.is_set():
+                raise RuntimeError("The power coalescer is not running")
+            self.requests += 1
+            for channel_nr, power in channel_powers.items():
+                if channel_nr in self._pending:
+                    self.channels_overwritten += 1
+                self._pending[channel_nr] = power
+            self._waiting.append((future, time.perf_counter()))
+            self._has_pending.set()
+        return future
+
+    def flush(self):
+        """
+        Writes the merged commands and answers every waiting caller - called by the thread once per window.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            waiting, self._waiting = self._waiting, []
+            self._has_pending.clear()
+
+        if not waiting:
+            return
+
+        try:
+            is_success = bool(self._write_powers(pending)) if pending else True
+        except Exception as err:
+            #Callers only get False, the reason goes to the log
+            logger.exception("Writing the channel powers %s failed", pending)
+            self.last_error = err
+            is_success = False
+
+        done = time.perf_counter()
+        with self._lock:
+            self.writes += 1
+            if not is_success:
+                self.failed_writes += 1
+            self._latencies.extend(done - submitted for _, submitted in waiting)
+
+        for future, _ in waiting:
+            future.set_result(is_success)
+
+    def metrics(self) -> dict:
+        """
+        :return: Request and write counts and the end-to-end latency percentiles (seconds) of the recent requests
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            metrics = {
+                "requests": self.requests,
+                "writes": self.writes,
+                "failed_writes": self.failed_writes,
+                #Requests that did not need a hardware write of their own
+                "requests_merged": self.requests - self.writes - len(self._waiting),
+                "channels_overwritten": self.channels_overwritten,
+            }
+
+        for name, quantile in (("latency_p50_s", 0.5), ("latency_p99_s", 0.99)):
+            metrics[name] = latencies[min(len(latencies) - 1, int(quantile * len(latencies)))] if latencies else 0.0
+        metrics["latency_max_s"] = latencies[-1] if latencies else 0.0
+        return metrics
+
+
+class TelemetryCache:
+
+    """
+    Serves device readings from memory and refreshes them from the device at a bounded rate.
+
+    A reading is fetched again only when it is older than the max-age of the request, and never more often than once
+    per min_interval_s - max-ages below that are raised to it. Concurrent requests for the same stale reading share a
+    single device query. A reading invalidated while it is being queried is not cached, the query may predate the change.
+    """
+
+    def __init__(self, min_interval_s: float = 0.05, default_max_age_s: float = 0.5):
+        self.min_interval_s = min_interval_s
+        self.default_max_age_s = default_max_age_s
+
+        self._lock = threading.Lock()
+        #key -> (value, time it was read)
+        self._readings = {}
+        #key -> Future of the device query in progress
+        self._inflight = {}
+
+        self.hits = 0
+        self.queries = 0
+        #Requests that joined a device query started by another request
+        self.collapsed = 0
+
+    def get(self, key, fetch, max_age_s: float = None):
+        """
+        :param key: Identifies the reading, e.g. ("power", 1)
+        :param fetch: Callable reading the value from the device
+        :param max_age_s: Oldest acceptable reading in seconds, the default max-age if None or not positive
+        :return: The reading
+        """
+        if max_age_s is None or max_age_s <= 0:
+            max_age_s = self.default_max_age_s
+        max_age_s = max(max_age_s, self.min_interval_s)
+
+        with self._lock:
+            reading = self._readings.get(key, None)
+            if reading is not None and time.monotonic() - reading[1] <= max_age_s:
+                self.hits += 1
+                return reading[0]
+
+            future = self._inflight.get(key, None)
+            is_owner = future is None
+            if is_owner:
+                future = self._inflight[key] = Future()
+                self.queries += 1
+            else:
+                self.collapsed += 1
+
+        if is_owner:
+            try:
+                value = fetch()
+            except Exception as err:
+                with self._lock:
+                    if self._inflight.get(key, None) is future:
+                        del self._inflight[key]
+                future.set_exception(err)
+                raise
+
+            with self._lock:
+                #Otherwise the reading was invalidated during the query
+                if self._inflight.get(key, None) is future:
+                    self._readings[key] = (value, time.monotonic())
+                    del self._inflight[key]
+            future.set_result(value)
+            return value
+
+        return future.result()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._readings.pop(key, None)
+            #The query in progress keeps answering its callers, but the next request queries again
+            self._inflight.pop(key, None)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "queries": self.queries, "collapsed": self.collapsed}
+
+
+class TelemetryRing:
+
+    """
+    Fixed-size ring buffer of the most recent telemetry samples - when it is full the oldest sample is dropped.
+
+    A sample is (stamp_s, per channel output power in watts, temperature in celsius).
+    """
+
+    def __init__(self, capacity: int = 1000):
+        if capacity < 1:
+            raise ValueError(f"The telemetry buffer must hold at least one sample, not {capacity}")
+        self._samples = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def append(self, stamp_s: float, channel_powers, t_celsius: float):
+        with self._lock:
+            self._samples.append((stamp_s, tuple(channel_powers), t_celsius))
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def latest(self):
+        """
+        :return: The newest sample, None if the buffer is empty
+        """
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def since(self, start_s: float, end_s: float = float("inf")) -> list:
+        """
+        :return: The samples with start_s < stamp_s <= end_s, oldest first
+        """
+        with self._lock:
+            window = []
+            #Newest first, so only the samples in the window are visited
+            for sample in reversed(self._samples):
+                if sample[0] <= start_s:
+                    break
+                if sample[0] <= end_s:
+                    window.append(sample)
+        window.reverse()
+        return window
+
+    def summarize(self, start_s: float, end_s: float = float("inf")):
+        """
+        Downsamples the samples with start_s < stamp_s <= end_s.
+
+        :return: Dict of sample_count, stamp_s of the newest sample and the min/max/mean of the power per channel and
+            of the temperature - named like the fields of LaserTelemetry. None if there are no samples in the window
+        """
+        return self.summarizeSamples(self.since(start_s, end_s))
+
+    @staticmethod
+    def summarizeSamples(window: list):
+        """
+        :return: The summary of the samples as returned by summarize, None if there are none
+        """
+        if not window:
+            return None
+
+        count = len(window)
+        powers = list(zip(*(sample[1] for sample in window)))
+        temperatures = [sample[2] for sample in window]
+        return {
+            "stamp_s": window[-1][0],
+            "sample_count": count,
+            "output_power_w_mean": [sum(channel) / count for channel in powers],
+            "output_power_w_min": [min(channel) for channel in powers],
+            "output_power_w_max": [max(channel) for channel in powers],
+            "t_celsius_mean": sum(temperatures) / count,
+            "t_celsius_min": min(temperatures),
+            "t_celsius_max": max(temperatures),
+        }
@@ -0,0 +1,44 @@
+import json
+import os
+import tempfile
+import unittest
+from lasers.bench_container import write_personas
+
+
+class TestWritePersonas(unittest.TestCase):
+
+    """
+    We show that the copies get their own id and channels, while strings that only share a prefix with the id are kept
+    """
+    def test_ids_and_channels(self):
+        data = {
+            "descriptor": {"id": "lazer", "type": "base/device/laser", "description": "lazer one", "tag": "lazerbeam"},
+            "capabilities": {
+                "setPower": {"type": "service", "request_channel": "lazer/setPower/request",
+                             "response_channel": "lazer/setPower/response", "description": "lazer/setPower"},
+                "telemetry": {"type": "topic", "topic_channel": "lazerbeam/telemetry"},
+            },
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            persona_path = os.path.join(tmp, "lazer_persona.json")
+            with open(persona_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            out_dir = os.path.join(tmp, "out")
+            os.mkdir(out_dir)
+
+            copies = []
+            for path in write_personas(persona_path, 2, out_dir):
+                with open(path, "r", encoding="utf-8") as f:
+                    copies.append(json.load(f))
+
+        self.assertEqual(["laser0", "laser1"], [copy["descriptor"]["id"] for copy in copies])
+        set_power = copies[1]["capabilities"]["setPower"]
+        self.assertEqual(("laser1/setPower/request", "laser1/setPower/response", "lazer/setPower"),
+                         (set_power["request_channel"], set_power["response_channel"], set_power["description"]))
+        self.assertEqual("lazerbeam/telemetry", copies[1]["capabilities"]["telemetry"]["topic_channel"])
+        self.assertEqual(("lazer one", "lazerbeam"), (copies[1]["descriptor"]["description"],
+                                                     copies[1]["descriptor"]["tag"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from components.persona import Persona
+from lasers.ramp import RampProfile, RampScheduler, logger
+
+
+def make_laser(i, wavelength=445, nr_channels=1, rate_hz=None):
+    descriptor = {"id": f"laser{i}", "vendor": "Toptica", "product": "IBeam Pro", "description": "Ramp test",
+                  "type": "base/device/laser", "wavelength": wavelength, "nr_channels": nr_channels,
+                  "TEM_modes": ["00"]}
+    if rate_hz is not None:
+        descriptor["max_command_rate_hz"] = rate_hz
+    return Persona.fromData({"descriptor": descriptor, "capabilities": {"setPower": {"type": "service"}}})
+
+
+class FakeSender:
+
+    """
+    Stands in for SetPowerSender - records every request, and answers it at once or after delay_s
+    """
+
+    def __init__(self, delay_s=0.0, is_success=True, error=None):
+        self.delay_s = delay_s
+        self.is_success = is_success
+        #Raised by send for the personas in error_ids
+        self.error = error
+        self.error_ids = set()
+        self.prepared = []
+        #persona id -> [(perf_counter at send, {channel_nr: output_power_w})]
+        self.sent = {}
+        self._timers = []
+
+    def prepare(self, pers):
+        self.prepared.append(pers.getID())
+
+    def send(self, pers, channel_powers):
+        self.sent.setdefault(pers.getID(), []).append((time.perf_counter(), dict(channel_powers)))
+        if pers.getID() in self.error_ids:
+            raise self.error
+        future = Future()
+        if self.delay_s <= 0:
+            future.set_result(self.is_success)
+        else:
+            timer = threading.Timer(self.delay_s, future.set_result, (self.is_success,))
+            self._timers.append(timer)
+            timer.start()
+        return future
+
+    def intervals(self, pers_id):
+        stamps = [stamp for stamp, _ in self.sent[pers_id]]
+        return [b - a for a, b in zip(stamps, stamps[1:])]
+
+
+class TestRampProfile(unittest.TestCase):
+
+    def test_linear(self):
+        profile = RampProfile.linear(0.0, 0.05, 2.0, 0.5)
+        self.assertEqual([(0.0, 0.0), (0.5, 0.0125), (1.0, 0.025), (1.5, 0.0375), (2.0, 0.05)],
+                         [(t_s, round(power_w, 9)) for t_s, power_w in profile.points])
+        self.assertEqual(2.0, profile.duration_s)
+        self.assertEqual(2, len(RampProfile.linear(0.0, 0.05, 0.0)))
+
+    def test_invalid(self):
+        for points in ([], [(0.0, -0.1)], [(0.5, 0.0), (0.2, 0.1)]):
+            with self.assertRaises(ValueError):
+                RampProfile(points)
+        with self.assertRaises(ValueError):
+            RampProfile.linear(0.0, 0.05, 1.0, 0.0)
+
+
+class TestRampScheduler(unittest.TestCase):
+
+    CRITERION = {"descriptor": {"wavelength": {"eq": 445}}}
+
+    def assertFinalSent(self, sender, report, profile, pers_id):
+        last = [command for command in report.commands if command.pers_id == pers_id][-1]
+        self.assertEqual(len(profile) - 1, last.step)
+        self.assertEqual(profile.points[-1][1], sender.sent[pers_id][-1][1][1])
+
+    def assertAccounted(self, report, pers_id):
+        #Every step is either sent or superseded by a later one
+        nr_commands = sum(command.pers_id == pers_id for command in report.commands)
+        self.assertEqual(report.nr_steps, nr_commands + report.skipped[pers_id])
+
+    def test_targets(self):
+        personas = [make_laser(0, nr_channels=2), make_laser(1, 488), make_laser(2, nr_channels=1)]
+        personas.append(Persona.fromData({"descriptor": make_laser(3).toData()["descriptor"],
+                                          "capabilities": {"getPower": {"type": "service"}}}))
+        scheduler = RampScheduler(personas, FakeSender())
+        targets = scheduler.targets(self.CRITERION, [2])
+        self.assertEqual([("laser0", [2])], [(pers.getID(), channels) for pers, channels in targets])
+        self.assertEqual(["laser0", "laser2"], [pers.getID() for pers, _ in scheduler.targets(self.CRITERION)])
+
+    """
+    We show that the default rate of the scheduler limits every laser whose descriptor sets none, and that the
+    superseded steps are skipped but the last one is sent
+    """
+    def test_fleet_rate_limit(self):
+        sender = FakeSender()
+        profile = RampProfile.linear(0.0, 0.05, 0.4, 0.01)
+        report = RampScheduler([make_laser(i) for i in range(3)], sender, default_rate_hz=10.0).run(
+            self.CRITERION, profile)
+
+        self.assertEqual(["laser0", "laser1", "laser2"], sender.prepared)
+        for pers_id in report.targets:
+            self.assertLessEqual(len(sender.sent[pers_id]), 6)
+            self.assertGreater(report.skipped[pers_id], 0)
+            self.assertTrue(all(interval >= 0.1 - 0.005 for interval in sender.intervals(pers_id)))
+            self.assertAccounted(report, pers_id)
+            self.assertFinalSent(sender, report, profile, pers_id)
+
+    def test_device_rate_limit(self):
+        sender = FakeSender()
+        profile = RampProfile.linear(0.0, 0.05, 0.4, 0.02)
+        personas = [make_laser(0, rate_hz=10), make_laser(1, rate_hz=1000)]
+        report = RampScheduler(personas, sender, default_rate_hz=1.0).run(self.CRITERION, profile)
+
+        self.assertLessEqual(len(sender.sent["laser0"]), 6)
+        self.assertTrue(all(interval >= 0.1 - 0.005 for interval in sender.intervals("laser0")))
+        #Fast enough for every step
+        self.assertEqual(len(profile), len(sender.sent["laser1"]))
+        self.assertEqual(0, report.skipped["laser1"])
+        for pers_id in report.targets:
+            self.assertAccounted(report, pers_id)
+            self.assertFinalSent(sender, report, profile, pers_id)
+
+        with self.assertRaises(ValueError):
+            RampScheduler([make_laser(0, rate_hz=0)], sender).run(self.CRITERION, profile)
+
+    """
+    We show that a laser never has two requests in flight, so a slow laser skips steps, and that the last step is
+    sent once the laser answers
+    """
+    def test_slow_responses(self):
+        sender = FakeSender(delay_s=0.15)
+        profile = RampProfile.linear(0.0, 0.05, 0.3, 0.01)
+        report = RampScheduler([make_laser(0, nr_channels=2)], sender, default_rate_hz=1000.0).run(
+            self.CRITERION, profile)
+
+        self.assertLessEqual(len(sender.sent["laser0"]), 4)
+        self.assertTrue(all(interval >= 0.15 - 0.005 for interval in sender.intervals("laser0")))
+        self.assertEqual({1: 0.05, 2: 0.05}, sender.sent["laser0"][-1][1])
+        self.assertAccounted(report, "laser0")
+        self.assertFinalSent(sender, report, profile, "laser0")
+        self.assertTrue(all(command.done_s - command.sent_s >= 0.15 - 0.005 for command in report.commands))
+
+    """
+    We show that the report has the jitter and latency of every request, and counts the failed ones
+    """
+    def test_report(self):
+        sender = FakeSender(delay_s=0.01, is_success=False)
+        profile = RampProfile.linear(0.0, 0.05, 0.1, 0.05)
+        report = RampScheduler([make_laser(0), make_laser(1)], sender, default_rate_hz=1000.0).run(
+            self.CRITERION, profile)
+        summary = report.summary()
+
+        self.assertEqual(2, summary["targets"])
+        self.assertEqual(3, summary["steps"])
+        self.assertEqual(len(report.commands), summary["commands"])
+        self.assertEqual(summary["commands"], summary["failures"])
+        self.assertEqual(6, summary["commands"] + summary["skipped"])
+        self.assertTrue(all(command.jitter_s >= 0 for command in report.commands))
+        self.assertLessEqual(summary["jitter_p50_s"], summary["jitter_p99_s"])
+        self.assertLessEqual(summary["jitter_p99_s"], summary["jitter_max_s"])
+        self.assertEqual(max(command.jitter_s for command in report.commands), summary["jitter_max_s"])
+        self.assertGreaterEqual(summary["latency_p50_s"], 0.01 - 0.005)
+        self.assertGreaterEqual(summary["duration_s"], profile.duration_s)
+
+    """
+    We show that a send that raises is logged and counted as a failed step, and the other lasers ramp on
+    """
+    def test_send_raises(self):
+        sender = FakeSender(error=OSError("No route to laser1"))
+        sender.error_ids.add("laser1")
+        profile = RampProfile.linear(0.0, 0.05, 0.1, 0.05)
+        with self.assertLogs(logger, "ERROR") as logs:
+            report = RampScheduler([make_laser(0), make_laser(1)], sender, default_rate_hz=1000.0).run(
+                self.CRITERION, profile)
+        self.assertIn("No route to laser1", "\n".join(logs.output))
+
+        failed = [command for command in report.commands if command.pers_id == "laser1"]
+        self.assertTrue(failed)
+        self.assertTrue(all(command.is_success is False and command.error is sender.error for command in failed))
+        summary = report.summary()
+        self.assertEqual(len(failed), summary["errors"])
+        self.assertEqual(len(failed), summary["failures"])
+        self.assertFinalSent(sender, report, profile, "laser0")
+        self.assertFinalSent(sender, report, profile, "laser1")
+
+    def test_no_targets(self):
+        report = RampScheduler([make_laser(0, 488)], FakeSender()).run(self.CRITERION, RampProfile([(0.0, 0.01)]))
+        self.assertEqual([], report.targets)
+        self.assertEqual(0, report.summary()["commands"])
+
+
+if __name__ == '__main__':
+    unittest.main()
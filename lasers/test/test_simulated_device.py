@@ -0,0 +1,68 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from components.persona import Persona
+from lasers import simulated_device
+from lasers.simulated_device import SimulatedDevice, default_persona_path, with_channels
+
+
+class TestSimulatedDevice(unittest.TestCase):
+
+    def test_powers_and_temperature(self):
+        device = SimulatedDevice(response_delay_s=0, ambient_celsius=20.0, celsius_per_w=100.0)
+        self.assertEqual(0.0, device.getChannelPower(1))
+        self.assertEqual(20.0, device.getTemperature())
+
+        self.assertTrue(device.writeChannelPowers({1: 0.05, 2: 0.02}))
+        self.assertTrue(device.writeChannelPowers({2: 0.03}))
+        self.assertEqual((0.05, 0.03), (device.getChannelPower(1), device.getChannelPower(2)))
+        self.assertAlmostEqual(28.0, device.getTemperature())
+        self.assertEqual((5, 2), (device.reads, device.writes))
+
+    """
+    We show that the device serves one access at a time, like a serial line, so concurrent accesses queue up
+    """
+    def test_one_access_at_a_time(self):
+        device = SimulatedDevice(response_delay_s=0.05)
+        threads = [threading.Thread(target=device.getChannelPower, args=(1,)) for _ in range(3)]
+        threads.append(threading.Thread(target=device.writeChannelPowers, args=({1: 0.01},)))
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.perf_counter() - start, 4 * 0.05 - 0.005)
+        self.assertEqual((3, 1), (device.reads, device.writes))
+
+
+class TestPersonaHelpers(unittest.TestCase):
+
+    def test_with_channels(self):
+        persona = Persona.fromData({"descriptor": {"id": "laser0", "type": "base/device/laser", "nr_channels": 2},
+                                    "capabilities": {}})
+        self.assertEqual(4, with_channels(persona, 4).getDescriptor()["nr_channels"])
+        self.assertEqual(2, persona.getDescriptor()["nr_channels"])
+        with self.assertRaises(ValueError):
+            with_channels(persona, 0)
+
+    """
+    We show that a missing default persona, a build output, is reported with how to get one
+    """
+    def test_default_persona_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            missing = os.path.join(tmp, "IBeam455_persona.json")
+            with mock.patch.object(simulated_device, "DEFAULT_PERSONA_PATH", missing):
+                with self.assertRaises(FileNotFoundError) as err:
+                    default_persona_path()
+                self.assertIn("profile_builder.py", str(err.exception))
+
+                with open(missing, "w", encoding="utf-8") as f:
+                    f.write("{}")
+                self.assertEqual(missing, default_persona_path())
+
+
+if __name__ == '__main__':
+    unittest.main()
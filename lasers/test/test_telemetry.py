@@ -0,0 +1,236 @@
+import math
+import threading
+import time
+import unittest
+from lasers.telemetry import PowerCommandCoalescer, TelemetryCache, TelemetryRing, logger, percentile
+
+
+def wait_until(condition, timeout_s=5.0):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the condition")
+        time.sleep(0.001)
+
+
+class RecordingWriter:
+
+    def __init__(self, is_success=True, error=None):
+        self.writes = []
+        self.is_success = is_success
+        self.error = error
+
+    def __call__(self, channel_powers):
+        self.writes.append(dict(channel_powers))
+        if self.error is not None:
+            raise self.error
+        return self.is_success
+
+
+class TestPowerCommandCoalescer(unittest.TestCase):
+
+    def setUp(self):
+        self.writer = RecordingWriter()
+        #Long enough that every command of a test lands in the first window
+        self.coalescer = PowerCommandCoalescer(self.writer, tick_s=0.2)
+        self.coalescer.start()
+
+    def tearDown(self):
+        self.coalescer.stop()
+
+    """
+    We show that the commands of one window become one write, where the last command per channel wins
+    """
+    def test_merged_write(self):
+        futures = [self.coalescer.submit({1: 0.1}), self.coalescer.submit({1: 0.2, 2: 0.3}),
+                   self.coalescer.submit({2: 0.4})]
+        self.assertEqual([True, True, True], [future.result(timeout=5) for future in futures])
+        self.assertEqual([{1: 0.2, 2: 0.4}], self.writer.writes)
+
+        metrics = self.coalescer.metrics()
+        self.assertEqual(3, metrics["requests"])
+        self.assertEqual(1, metrics["writes"])
+        self.assertEqual(2, metrics["requests_merged"])
+        self.assertEqual(2, metrics["channels_overwritten"])
+
+    def test_one_write_per_window(self):
+        self.coalescer.submit({1: 0.1}).result(timeout=5)
+        self.coalescer.submit({1: 0.2}).result(timeout=5)
+        self.assertEqual([{1: 0.1}, {1: 0.2}], self.writer.writes)
+        self.assertEqual(0, self.coalescer.metrics()["requests_merged"])
+
+    def test_failed_write(self):
+        self.writer.is_success = False
+        self.assertFalse(self.coalescer.submit({1: 0.1}).result(timeout=5))
+        self.assertEqual(1, self.coalescer.metrics()["failed_writes"])
+
+    """
+    We show that an exception of the driver reaches the log and answers the callers with False
+    """
+    def test_write_raises(self):
+        self.writer.error = OSError("Serial port closed")
+        with self.assertLogs(logger, "ERROR") as logs:
+            self.assertFalse(self.coalescer.submit({1: 0.1}).result(timeout=5))
+        self.assertIn("Serial port closed", "\n".join(logs.output))
+        self.assertIs(self.writer.error, self.coalescer.last_error)
+
+    """
+    We show that stop writes what is pending, and that later commands are rejected instead of never being answered
+    """
+    def test_stop(self):
+        coalescer = PowerCommandCoalescer(self.writer, tick_s=60.0)
+        with self.assertRaises(RuntimeError):
+            coalescer.submit({1: 0.1})
+
+        coalescer.start()
+        future = coalescer.submit({1: 0.1})
+        coalescer.stop()
+        self.assertTrue(future.result(timeout=0))
+        with self.assertRaises(RuntimeError):
+            coalescer.submit({1: 0.2})
+
+
+class TestTelemetryCache(unittest.TestCase):
+
+    def test_max_age_clamp(self):
+        cache = TelemetryCache(min_interval_s=60.0, default_max_age_s=60.0)
+        reads = []
+        fetch = lambda: reads.append(1) or len(reads)
+        self.assertEqual(1, cache.get("power", fetch, 0.000001))
+        #Raised to min_interval_s, so still fresh
+        self.assertEqual(1, cache.get("power", fetch, 0.000001))
+        #Not positive falls back to the default max-age
+        self.assertEqual(1, cache.get("power", fetch, 0))
+        self.assertEqual({"hits": 2, "queries": 1, "collapsed": 0}, cache.metrics())
+
+        cache = TelemetryCache(min_interval_s=0.0, default_max_age_s=60.0)
+        cache.get("power", fetch, 0.001)
+        time.sleep(0.01)
+        self.assertEqual(3, cache.get("power", fetch, 0.001))
+
+    def startQuery(self, cache, key, fetch, nr_waiters):
+        """
+        Starts a query blocked in fetch, and nr_waiters requests that join it
+        :return: List of the threads, each appends its (value or exception) to results
+        """
+        results = []
+
+        def request():
+            try:
+                results.append(cache.get(key, fetch, 60.0))
+            except Exception as err:
+                results.append(err)
+
+        threads = [threading.Thread(target=request)]
+        threads[0].start()
+        wait_until(lambda: key in cache._inflight)
+        for _ in range(nr_waiters):
+            threads.append(threading.Thread(target=request))
+            threads[-1].start()
+        wait_until(lambda: cache.collapsed == nr_waiters)
+        return threads, results
+
+    def test_collapsed_fetch(self):
+        cache = TelemetryCache()
+        release = threading.Event()
+        reads = []
+
+        def fetch():
+            reads.append(1)
+            release.wait(5)
+            return 42.0
+
+        threads, results = self.startQuery(cache, "temperature", fetch, 3)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([42.0] * 4, results)
+        self.assertEqual(1, len(reads))
+
+    def test_exception_reaches_waiters(self):
+        cache = TelemetryCache()
+        release = threading.Event()
+
+        def fetch():
+            release.wait(5)
+            raise OSError("No answer")
+
+        threads, results = self.startQuery(cache, "temperature", fetch, 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(3, len(results))
+        self.assertTrue(all(isinstance(result, OSError) for result in results))
+        self.assertNotIn("temperature", cache._inflight)
+
+    """
+    We show that a reading invalidated while it is queried, e.g. by a power write, is not cached
+    """
+    def test_invalidate_during_fetch(self):
+        cache = TelemetryCache(min_interval_s=0.0, default_max_age_s=60.0)
+        release = threading.Event()
+        reads = []
+
+        def fetch():
+            reads.append(1)
+            if len(reads) == 1:
+                release.wait(5)
+                return 0.1
+            return 0.5
+
+        threads, results = self.startQuery(cache, ("power", 1), fetch, 0)
+        cache.invalidate(("power", 1))
+        release.set()
+        threads[0].join()
+        self.assertEqual([0.1], results)
+        self.assertEqual(0.5, cache.get(("power", 1), fetch, 60.0))
+        self.assertEqual(2, len(reads))
+
+
+class TestTelemetryRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = TelemetryRing(capacity=4)
+        for i in range(6):
+            self.ring.append(float(i), [0.1 * i, 1.0], 20.0 + i)
+
+    def test_capacity(self):
+        self.assertEqual(4, len(self.ring))
+        self.assertEqual([2.0, 3.0, 4.0, 5.0], [sample[0] for sample in self.ring.since(float("-inf"))])
+        self.assertEqual(5.0, self.ring.latest()[0])
+        with self.assertRaises(ValueError):
+            TelemetryRing(0)
+
+    """
+    We show that a window excludes its start and includes its end, so consecutive windows never share a sample
+    """
+    def test_window_bounds(self):
+        self.assertEqual([3.0, 4.0], [sample[0] for sample in self.ring.since(2.0, 4.0)])
+        self.assertEqual([5.0], [sample[0] for sample in self.ring.since(4.0)])
+        self.assertEqual([], self.ring.since(5.0))
+        self.assertIsNone(self.ring.summarize(5.0))
+        self.assertIsNone(TelemetryRing.summarizeSamples([]))
+
+    def test_summarize(self):
+        summary = self.ring.summarize(2.0, 5.0)
+        self.assertEqual(5.0, summary["stamp_s"])
+        self.assertEqual(3, summary["sample_count"])
+        self.assertEqual([0.3, 1.0], [round(value, 9) for value in summary["output_power_w_min"]])
+        self.assertEqual([0.5, 1.0], [round(value, 9) for value in summary["output_power_w_max"]])
+        self.assertEqual([0.4, 1.0], [round(value, 9) for value in summary["output_power_w_mean"]])
+        self.assertEqual((23.0, 25.0, 24.0), (summary["t_celsius_min"], summary["t_celsius_max"],
+                                              summary["t_celsius_mean"]))
+
+
+class TestPercentile(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual((50.0, 99.0, 100.0, 1.0), (percentile(values, 50), percentile(values, 99),
+                                                     percentile(values, 100), percentile(values, 0)))
+        self.assertEqual(7.0, percentile([7.0], 99))
+        self.assertTrue(math.isnan(percentile([], 50)))
+
+
+if __name__ == '__main__':
+    unittest.main()